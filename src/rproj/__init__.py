@@ -1,6 +1,3 @@
-import toml
-from rproj.utils import log
-
 RPROJ_VERSION = "0.4.1"
 FILE_EXTENSION = ".rproj"
 PROJECT_DATA_PATH = "./projects.json"
\ No newline at end of file
@@ -1,3 +1,4 @@
+import sys
 import argparse
 
 
@@ -35,27 +36,9 @@ class Command:
         self.args = args
 
 
-def get_args():
-    """
-    Parse and return command-line arguments for the rproj CLI.\n
-    ---
-
-    This function sets up the argument parser.\n
-    Each subcommand may have its own set of arguments, including positional and
-    optional arguments. Aliases are also provided for some subcommands.
-    Returns:
-        argparse.Namespace: Parsed command-line arguments.
-    """
-
-    # Create the main argument parser
-    parser = argparse.ArgumentParser(
-        prog="rproj", description="Create, manage, and view your projects"
-    )
-
-    subparsers = parser.add_subparsers(dest="command", required=True)
-
-    # List of commands
-    commands = [
+def get_commands() -> list[Command]:
+    """Returns every rproj command along with its aliases and arguments."""
+    return [
         Command(
             "create",
             "Create a new project",
@@ -81,24 +64,83 @@ def get_args():
             ],
         ),
         Command("add", "Add an existing project file", ["a"], ["directory"]),
+        Command(
+            "scan",
+            "Add every project file below a directory",
+            [],
+            [
+                "root",
+                ("--max-depth", {"type": int, "default": 6}),
+                ("--ignore", {"nargs": "+"}),
+                ("--jobs", {"type": int}),
+            ],
+        ),
         Command("delete", "Delete a project", ["d", "del", "rm", "remove"], ["name"]),
         Command(
             "list",
             "List all projects",
             ["l", "li", "all"],
-            [("--tags", {"nargs": "+"})],
+            [
+                ("--tags", {"nargs": "+"}),
+                (
+                    "--sort",
+                    {"choices": ["name", "directory", "modified", "size", "frecency"]},
+                ),
+                ("--limit", {"type": int}),
+                ("--offset", {"type": int, "default": 0}),
+                ("--lang", {}),
+            ],
         ),
         Command(
-            "search", "Search for a project", ["s", "find", "fetch", "info"], ["name"]
+            "search",
+            "Search for a project",
+            ["s", "find", "fetch", "info"],
+            [
+                ("name", {"nargs": "?"}),
+                ("--fuzzy", {"action": "store_true"}),
+                ("--text", {"nargs": "+"}),
+            ],
         ),
         Command("code", "Open project in VSC", ["vsc"], ["name"]),
         Command("file", "Open project in file explorer", ["explorer"], ["name"]),
         Command("debug", "Debug the project", [], ["operation"]),
+        Command(
+            "daemon",
+            "Keep projects in memory to answer dir, list and search",
+            [],
+            [
+                ("--stop", {"action": "store_true"}),
+                ("--status", {"action": "store_true"}),
+            ],
+        ),
         Command("dir", "Print dir of project", [], ["name"]),
+        Command(
+            "jump",
+            "Print dir of the most used project matching a query",
+            ["j"],
+            [("query", {"nargs": "+"})],
+        ),
+        Command(
+            "pick",
+            "Pick a project interactively",
+            [],
+            [("--then", {"choices": ["code", "dir", "run", "terminal"]})],
+        ),
         Command(
             "terminal", "Open terminal in project", ["ter"], ["name", "--type", "-t"]
         ),
-        Command("run", "Run the project", ["r"], ["name", "-t"]),
+        Command(
+            "run",
+            "Run the project, or every project with the given tags",
+            ["r"],
+            [
+                ("name", {"nargs": "?"}),
+                "-t",
+                ("--tags", {"nargs": "+"}),
+                ("--headless", {"action": "store_true"}),
+                ("--jobs", {"type": int}),
+            ],
+        ),
         Command(
             "tree",
             "Print project tree",
@@ -106,8 +148,14 @@ def get_args():
             [
                 "name",
                 ("--ignore", {"nargs": "+"}),
-                ("--max-depth", {"type": int}),
+                ("--max-depth", {"type": int, "default": 5}),
+                ("--max-entries", {"type": int}),
+                ("--max-per-dir", {"type": int}),
+                ("--no-cache", {"action": "store_true"}),
+                ("--refresh", {"action": "store_true"}),
                 ("--use-regex", {"action": "store_true"}),
+                ("--jobs", {"type": int, "default": 1}),
+                ("--format", {"choices": ["text", "json", "ndjson"]}),
             ],
         ),
         Command(
@@ -115,10 +163,11 @@ def get_args():
             "Add or manage tags for a project",
             ["t"],
             [
-                "name",
+                ("name", {"nargs": "?"}),
                 ("--add", {"nargs": "+"}),
                 ("--remove", {"nargs": "+"}),
                 ("--list", {"action": "store_true"}),
+                ("--stats", {"action": "store_true"}),
             ],
         ),
         Command(
@@ -132,12 +181,74 @@ def get_args():
                 ("--list", {"action": "store_true"}),
             ],
         ),
+        Command("sync", "Sync the registry with the project files", [], []),
+        Command(
+            "completion",
+            "Print the shell completion script",
+            [],
+            [("shell", {"choices": ["bash", "zsh", "fish"]})],
+        ),
+        Command(
+            "stats",
+            "Show the size, languages and line counts of projects",
+            [],
+            [
+                ("name", {"nargs": "?"}),
+                ("--all", {"action": "store_true"}),
+                ("--tags", {"nargs": "+"}),
+                ("--refresh", {"action": "store_true"}),
+                ("--jobs", {"type": int}),
+            ],
+        ),
     ]
 
-    # Add each command to the parser
-    for cmd in commands:
+
+def get_args(argv: list[str] = None):
+    """
+    Parse and return command-line arguments for the rproj CLI.\n
+    ---
+
+    This function sets up the argument parser.\n
+    Each subcommand may have its own set of arguments, including positional and
+    optional arguments. Aliases are also provided for some subcommands.
+    Only the subcommand being run is added to the parser, unless it isn't known
+    yet (e.g. for `--help`), which keeps startup fast.
+    Args:
+        argv (list[str], optional): The arguments to parse. Defaults to sys.argv.
+    Returns:
+        argparse.Namespace: Parsed command-line arguments.
+    """
+
+    # Global options, accepted before or after the command
+    global_parser = argparse.ArgumentParser(add_help=False)
+    output_group = global_parser.add_mutually_exclusive_group()
+    for flag, output_format in [("--json", "json"), ("--ndjson", "ndjson")]:
+        output_group.add_argument(
+            flag,
+            dest="output_format",
+            action="store_const",
+            const=output_format,
+            default=argparse.SUPPRESS,  # Don't let the command reset it
+            help=f"Print machine-readable {output_format.upper()} output",
+        )
+
+    # Create the main argument parser
+    parser = argparse.ArgumentParser(
+        prog="rproj",
+        description="Create, manage, and view your projects",
+        parents=[global_parser],
+    )
+
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    # Add the requested command to the parser, or all of them if it's unknown
+    argv = sys.argv[1:] if argv is None else argv
+    commands = get_commands()
+    requested = next((arg for arg in argv if not arg.startswith("-")), None)
+    selected = [cmd for cmd in commands if requested in (cmd.name, *cmd.aliases)]
+    for cmd in selected or commands:
         parser_cmd = subparsers.add_parser(
-            cmd.name, aliases=cmd.aliases, help=cmd.help_text
+            cmd.name, aliases=cmd.aliases, help=cmd.help_text, parents=[global_parser]
         )
 
         # Add arguments for the command
@@ -150,4 +261,7 @@ def get_args():
                 else:
                     raise ValueError(f"Invalid argument format: {arg}")
 
-    return parser.parse_args()
+    args = parser.parse_args(argv)
+    if not hasattr(args, "output_format"):
+        args.output_format = None
+    return args
@@ -1,15 +1,34 @@
 import os
-from rproj.utils import log
+import sys
+import argparse
+from rproj.utils import log, console
 from rproj import FILE_EXTENSION
 from rproj.utils.file import RProjFile
-from rproj.utils.tree import print_project_structure
-from rproj.utils.info import search_project, list_projects
-from rproj.utils.projects import add_project_to_projects, PROJECT_DATA_PATH
-from rproj.utils.launching import launch_vsc, launch_file_explorer, launch_terminal
+from rproj.utils.info import (
+    search_project,
+    list_projects,
+    load_projects,
+    fuzzy_search_projects,
+    text_search_projects,
+    print_tag_stats,
+    iter_projects,
+    filter_by_tags,
+    get_project_index,
+)
+from rproj.utils.config import get_backend, get_tree_cache_size
+from rproj.utils.catalog import open_catalog
+from rproj.utils.completion import completion_script, write_completion_cache
+from rproj.utils.frecency import record_access
+from rproj.utils.projects import (
+    add_project_to_projects,
+    load_project_paths,
+    PROJECT_DATA_PATH,
+)
 from rproj.utils.checks import (
     check_project_exists,
     check_directory_exists,
     check_project_already_exists,
+    check_project_exists_or_closest,
 )
 
 
@@ -23,19 +42,20 @@ def handle_create(args):
     RProjFile(args.name, args.directory, description, github, run_cmd).create()
 
 
-@check_project_exists
+@check_project_exists(exact=True)
 def handle_update(args):
     """Updates the project with the given name."""
     log.info("Updating project...")
-    project = search_project(args.name)
-    if args.project_name:
-        project.update_field("project_name", args.project_name)
-    if args.description:
-        project.update_field("description", " ".join(args.description))
-    if args.github:
-        project.update_field("github", args.github)
-    if args.run:
-        project.update_field("run_cmd", args.run)
+    project = search_project(args.name, exact=True)
+    with project.transaction():
+        if args.project_name:
+            project.update_field("project_name", args.project_name)
+        if args.description:
+            project.update_field("description", " ".join(args.description))
+        if args.github:
+            project.update_field("github", args.github)
+        if args.run:
+            project.update_field("run_cmd", args.run)
 
 
 @check_directory_exists
@@ -49,71 +69,271 @@ def handle_add(args):
         log.err("Project file not found")
         return
 
-    if search_project(project.project_name):
+    if search_project(project.project_name, exact=True):
         log.err("Project name already exists")
         return
 
     add_project_to_projects(project)  # Update projects.json
 
 
-@check_project_exists
+def handle_scan(args):
+    """Adds every project file found below a directory to the projects.json file."""
+    from rproj.utils.scan import scan_projects
+
+    if not os.path.isdir(args.root):
+        log.err("Directory not found")
+        return
+    if args.jobs is not None and args.jobs < 1:
+        log.err("--jobs must be at least 1")
+        return
+    if args.max_depth < 0:
+        log.err("--max-depth can't be negative")
+        return
+
+    log.info(f"Scanning {os.path.abspath(args.root)} for projects...")
+    records = scan_projects(args.root, args.max_depth, args.ignore, args.jobs)
+    if console.get_output_format():
+        console.print_records(records)
+        return
+
+    statuses = [record["status"] for record in records]
+    log.info(
+        f"Found {len(records)} project file(s): added {statuses.count('added')},"
+        f" {statuses.count('registered')} already registered,"
+        f" skipped {len(records) - statuses.count('added') - statuses.count('registered')}"
+    )
+
+
+@check_project_exists(exact=True)
 def handle_delete(args):
     """Deletes the project with the given name."""
     log.info("Deleting project...")
-    search_project(args.name).delete()
+    search_project(args.name, exact=True).delete()
 
 
-@check_project_exists
 def handle_search(args):
-    """Searches for the project with the given name."""
+    """Searches for the project with the given name, or by text."""
+    if args.text:
+        log.info("Searching projects...")
+        results = text_search_projects(" ".join(args.text))
+        if console.get_output_format():
+            print_ranked_records(results)
+            return
+        for i, (score, project) in enumerate(results, 1):
+            console.print(f"{project.list_view(i)} [dim]({score:.1f})[/]")
+        if not results:
+            log.err("No projects found")
+        return
+
+    if not args.name:
+        log.err("Please provide a name to search for")
+        return
+
+    if args.fuzzy:
+        log.info("Searching projects...")
+        results = fuzzy_search_projects(args.name)
+        if console.get_output_format():
+            print_ranked_records(results)
+            return
+        for i, (score, project) in enumerate(results, 1):
+            console.print(f"{project.list_view(i)} [dim]({score:.0%})[/]")
+        return
+
+    project = search_project(args.name)
+    if not project:
+        log.err("Project not found")
+        return
     log.info("Searching project...")
-    search_project(args.name).print_details()
+    project.print_details()
 
 
-@check_project_exists
+def print_ranked_records(results: list[tuple[float, RProjFile]]):
+    """Prints search results as records, each with its score."""
+    console.print_records(
+        {"score": score, **project.as_dict()} for score, project in results
+    )
+
+
+@check_project_exists_or_closest
 def handle_code(args):
     """Opens the project in Visual Studio Code."""
     # TODO Add support for other editors
+    from rproj.utils.launching import launch_vsc
+
     log.info("Opening project in VSC...")
-    launch_vsc(search_project(args.name).directory)
+    project = search_project(args.name)
+    record_access(project.directory)
+    launch_vsc(project.directory)
 
 
 @check_project_exists
 def handle_file_explorer(args):
     """Opens the project in the file explorer."""
+    from rproj.utils.launching import launch_file_explorer
+
     log.info("Opening project in file explorer...")
     launch_file_explorer(search_project(args.name).directory)
 
 
-@check_project_exists
+@check_project_exists_or_closest
 def handle_dir(args):
     """Prints the directory of the project."""
     # Prints the directory of the project
     # ex: cd "$(python ./src dir ...)"
     project = search_project(args.name)
     if project and os.path.isdir(project.directory):
+        record_access(project.directory)
         print(project.directory)
 
 
+def handle_jump(args):
+    """Prints the directory of the most frecent project matching the query."""
+    from rproj.utils.frecency import jump_target
+
+    project = jump_target(" ".join(args.query))
+    if not project:
+        log.err("Project not found")
+        return
+    if not os.path.isdir(project.directory):
+        log.err(f"Directory not found: {console.escape(project.directory)}")
+        return
+    record_access(project.directory)
+    print(project.directory)
+
+
+def handle_pick(args):
+    """Lets the user pick a project as they type, then opens, prints or runs it."""
+    from rproj.utils.picker import pick_project
+
+    if not (sys.stdin.isatty() and sys.stderr.isatty()):
+        log.err("Picking a project needs a terminal")
+        return
+    projects = load_projects()
+    if not projects:
+        log.err("No projects found")
+        return
+
+    project = pick_project(projects)
+    if not project:
+        return
+    if not args.then:
+        print(project.project_name)
+        return
+
+    then = {
+        "code": handle_code,
+        "dir": handle_dir,
+        "run": handle_run,
+        "terminal": handle_terminal,
+    }[args.then]
+    then(
+        argparse.Namespace(
+            name=project.project_name,
+            type=None,
+            t=None,
+            tags=None,
+            headless=False,
+            jobs=None,
+        )
+    )
+
+
 @check_project_exists
 def handle_terminal(args):
     """Opens the project in the terminal."""
+    from rproj.utils.launching import launch_terminal
+
     log.info("Opening project in terminal...")
     terminal_type = args.type or args.t or "ps"
-    launch_terminal(search_project(args.name).directory, terminal_type)
+    project = search_project(args.name)
+    record_access(project.directory)
+    launch_terminal(project.directory, terminal_type)
 
 
-@check_project_exists
 def handle_run(args):
-    """Runs the project."""
+    """Runs the project, or every project with the given tags."""
+    if args.tags or args.headless:
+        run_projects_headless(args)
+    elif not args.name:
+        log.err("Please provide a name or --tags")
+    else:
+        run_project(args)
+
+
+def run_projects_headless(args):
+    """Runs the projects as subprocesses of rproj, printing their output and exit codes."""
+    from rproj.utils.runner import run_projects
+
+    if args.jobs is not None and args.jobs < 1:
+        log.err("--jobs must be at least 1")
+        return
+    if args.tags:
+        try:
+            projects = list(filter_by_tags(iter_projects(), args.tags))
+        except ValueError as e:
+            log.err(e)
+            return
+        if args.name:
+            projects = [
+                project for project in projects if project.project_name == args.name
+            ]
+    else:
+        project = search_project(args.name)
+        projects = [project] if project else []
+    if not projects:
+        log.err("Project not found")
+        return
+    if not args.headless:
+        # Without --headless each project gets a terminal, like a single run
+        for project in projects:
+            run_project(argparse.Namespace(name=project.project_name, t=args.t))
+        return
+
+    runnable = []
+    for project in projects:
+        if project.run_cmd and os.path.isdir(project.directory):
+            runnable.append(project)
+        else:
+            log.warn(
+                f"Skipping {console.escape(project.project_name)}, it has no run command or directory"
+            )
+    if not runnable:
+        return
+
+    for project in runnable:
+        record_access(project.directory)
+    log.info(f"Running {len(runnable)} project(s)...")
+    # Keep stdout for the records in the machine-readable output format
+    out = sys.stderr if console.get_output_format() else None
+    records = run_projects(runnable, args.jobs, out)
+    if console.get_output_format():
+        console.print_records(records)
+        return
+
+    width = max(len(record["project_name"]) for record in records)
+    for record in records:
+        seconds = "" if record["seconds"] is None else f" in {record['seconds']:.1f}s"
+        code = "" if record["code"] is None else f" with code {record['code']}"
+        report = log.info if record["status"] == "ok" else log.warn
+        report(
+            f"{record['project_name'].ljust(width)}  {record['status']}{code}{seconds}"
+        )
+
+
+@check_project_exists_or_closest
+def run_project(args):
+    """Runs the project in a terminal."""
+    from rproj.utils.launching import launch_terminal
+
     log.info("Running project...")
     project = search_project(args.name)
     if not project.run_cmd:
         log.err("No run command found in project")
         return
 
+    record_access(project.directory)
     launch_terminal(
-        search_project(args.name).directory,
+        project.directory,
         args.t or "ps",
         command=project.run_cmd,
     )
@@ -125,81 +345,233 @@ def handle_debug(args):
         log.info(
             f"Project data at {PROJECT_DATA_PATH}\n      Dir: {PROJECT_DATA_PATH.removesuffix('projects.json')}"
         )
+    elif args.operation == "catalog":
+        catalog = open_catalog()
+        problems = catalog.check(load_project_paths())
+        for problem in problems:
+            log.warn(problem)
+        log.info(f"Catalog at {catalog.path}: {len(problems)} problem(s) found")
+    elif args.operation == "startup":
+        from rproj.utils.benchmarks import bench_startup
+
+        bench_startup()
+    elif args.operation == "load":
+        from rproj.utils.benchmarks import bench_load
+
+        bench_load()
+    elif args.operation == "tree":
+        from rproj.utils.benchmarks import bench_tree
+
+        bench_tree()
+    elif args.operation == "daemon":
+        from rproj.utils.benchmarks import bench_daemon
+
+        bench_daemon()
+    elif args.operation == "pick":
+        from rproj.utils.benchmarks import bench_pick
+
+        bench_pick()
+    elif args.operation == "frecency":
+        from rproj.utils.benchmarks import bench_frecency
+
+        bench_frecency()
+
+
+def handle_daemon(args):
+    """Runs the daemon in the foreground, or stops it or prints its status."""
+    from rproj.utils.daemon import SOCKET_PATH, daemon_status, start_daemon, stop_daemon
+
+    if args.stop:
+        if stop_daemon():
+            log.info("Stopping the daemon...")
+        else:
+            log.err("The daemon isn't running")
+    elif args.status:
+        status = daemon_status()
+        if status:
+            log.info(
+                f"Daemon {status['pid']} is serving {status['projects']} project(s)"
+                f" on {SOCKET_PATH}"
+            )
+        else:
+            log.info("The daemon isn't running")
+    else:
+        start_daemon()
 
 
 @check_project_exists
 def handle_tree(args):
     """Prints the project tree."""
+    from rproj.utils.ignore import IgnoreMatcher
+    from rproj.utils.snapshots import TreeSnapshot, evict_snapshots
+    from rproj.utils.tree import print_project_structure
+
+    if args.format:
+        console.set_output_format(None if args.format == "text" else args.format)
+
     log.info("Printing project tree...")
     project = search_project(args.name)
     if not project or not os.path.isdir(project.directory):
         log.err("Project directory not found")
         return
 
-    git_ignore_path = os.path.join(project.directory, ".gitignore")
-
-    ignore = []
-    if os.path.exists(git_ignore_path):
-        with open(git_ignore_path, "r") as f:
-            ignore = [
-                line.strip() for line in f if line.strip() and not line.startswith("#")
-            ]
-    if args.ignore:
-        if isinstance(args.ignore, str):
-            ignore.append(args.ignore)
-        elif isinstance(args.ignore, list):
-            ignore.extend(args.ignore)
-        else:
-            log.err("Invalid ignore argument type")
+    if args.jobs < 1:
+        log.err("--jobs must be at least 1")
+        return
+    for option in ("max_depth", "max_entries", "max_per_dir"):
+        if (getattr(args, option) or 0) < 0:
+            log.err(f"--{option.replace('_', '-')} can't be negative")
             return
-    ignore.append(".git")  # Always ignore
 
+    ignore = IgnoreMatcher.for_project(args.ignore, args.use_regex)
+    snapshot = None
+    if not get_tree_cache_size():
+        evict_snapshots(0)  # Kept while the cache was turned on
+    elif not args.no_cache:
+        snapshot = TreeSnapshot.open(project.directory, refresh=args.refresh)
     print_project_structure(
-        project.directory, max_depth=5, ignore=ignore, use_regex=args.use_regex
+        project.directory,
+        max_depth=args.max_depth,
+        ignore=ignore,
+        jobs=args.jobs,
+        max_entries=args.max_entries,
+        max_per_dir=args.max_per_dir,
+        snapshot=snapshot,
     )
+    if snapshot:
+        try:
+            snapshot.save()
+        except OSError as error:
+            log.warn(f"Could not save tree snapshot: {error}")
 
 
-@check_project_exists
 def handle_tag(args):
-    """Handles tags for the project."""
-    project = search_project(args.name)
+    """Handles tags for the project, or prints how often each tag is used."""
+    if args.stats:
+        print_tag_stats()
+        return
+    if not args.name:
+        log.err("Please provide a project name")
+        return
+    handle_project_tags(args)
+
+
+@check_project_exists(exact=True)
+def handle_project_tags(args):
+    """Adds, removes or lists the tags of the project."""
+    project = search_project(args.name, exact=True)
 
     if not any([args.add, args.remove, args.list]):
         project.print_tags()
 
-    if args.add:
-        for tag in args.add:
-            print(f"Adding tag: {tag}")
-            project.add_tag(tag)
-    if args.remove:
-        for tag in args.remove:
-            print(f"Removing tag: {tag}")
-            project.remove_tag(tag)
+    with project.transaction():
+        if args.add:
+            for tag in args.add:
+                log.info(f"Adding tag: {console.escape(tag)}")
+                project.add_tag(tag)
+        if args.remove:
+            for tag in args.remove:
+                log.info(f"Removing tag: {console.escape(tag)}")
+                project.remove_tag(tag)
     if args.list:
         project.print_tags()
 
 
 def handle_list(args):
+    if args.offset < 0 or (args.limit is not None and args.limit < 0):
+        log.err("Limit and offset can't be negative")
+        return
     log.info("Listing projects...")
-    list_projects(args.tags)
+    list_projects(args.tags, args.sort, args.limit, args.offset, args.lang)
 
 
-@check_project_exists
+@check_project_exists(exact=True)
 def handle_note(args):
     """Handles notes for the project."""
-    project = search_project(args.name)
+    project = search_project(args.name, exact=True)
 
     if not any([args.add, args.remove, args.list]):
         project.print_notes()
 
-    if args.add:
-        note = " ".join(args.add)
-        print(f"Adding note: {note}")
-        project.add_note(note)
-    if args.remove:
-        print(
-            f"Removing notes with indexes: {', '.join((str(i) for i in args.remove))}"
-        )
-        project.remove_notes(args.remove)
+    with project.transaction():
+        if args.add:
+            note = " ".join(args.add)
+            log.info(f"Adding note: {console.escape(note)}")
+            project.add_note(note)
+        if args.remove:
+            log.info(
+                f"Removing notes with indexes: {', '.join((str(i) for i in args.remove))}"
+            )
+            project.remove_notes(args.remove)
     if args.list:
         project.print_notes()
+
+
+def handle_sync(args):
+    """Syncs the registry with the project files on disk."""
+    log.info("Syncing projects...")
+    project_paths = load_project_paths()
+    if get_backend() == "sqlite":
+        problems = open_catalog().sync()
+    else:
+        load_projects()  # Re-parses every changed project file
+        problems = open_catalog().check(project_paths)
+
+    for problem in problems:
+        log.warn(problem)
+    write_completion_cache(open_catalog())
+    log.info(f"Synced {len(project_paths)} project(s)")
+
+
+def handle_completion(args):
+    """Prints the completion script of a shell, refreshing the names and tags it reads."""
+    get_project_index()  # Brings the catalog up to date
+    write_completion_cache(open_catalog())
+    # Not print, which strips [[ ]] as markup
+    sys.stdout.write(completion_script(args.shell))
+
+
+def handle_stats(args):
+    """Prints the size, languages and line counts of one, all or the tagged projects."""
+    from rproj.utils.stats import collect_stats, format_stats
+
+    if args.jobs is not None and args.jobs < 1:
+        log.err("--jobs must be at least 1")
+        return
+
+    if args.all or args.tags:
+        projects = iter_projects()
+        if args.tags:
+            try:
+                projects = filter_by_tags(projects, args.tags)
+            except ValueError as e:
+                log.err(e)
+                return
+        projects = list(projects)
+    elif args.name:
+        project = search_project(args.name)
+        if not project:
+            log.err("Project not found")
+            return
+        projects = [project]
+    else:
+        log.err("Please provide a project name, --all or --tags")
+        return
+
+    log.info(f"Computing stats of {len(projects)} project(s)...")
+    results = collect_stats(
+        [project.directory for project in projects], args.refresh, args.jobs
+    )
+    if console.get_output_format():
+        console.print_records(
+            {"project_name": project.project_name, **summary}
+            for project, summary in zip(projects, results)
+        )
+        return
+
+    console.print(
+        "\n\n".join(
+            format_stats(project.project_name, summary)
+            for project, summary in zip(projects, results)
+        )
+    )
@@ -0,0 +1,440 @@
+import os
+import sys
+import subprocess
+from typing import Iterator
+from rproj.utils import log
+
+# Cold-start budget for importing rproj.main, excluding interpreter startup
+STARTUP_BUDGET_MS = 30
+# Modules that scripting commands like `dir` should never need to import
+HEAVY_MODULES = ["rich", "toml", "sqlite3"]
+
+
+def parse_importtime(output: str) -> dict[str, tuple[int, int]]:
+    """
+    Parses the output of `python -X importtime`.
+
+    Args:
+        output (str): The stderr of a `python -X importtime` run.
+    Returns:
+        dict[str, tuple[int, int]]: The self and cumulative import time in
+            microseconds, keyed by module name.
+    """
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def bench_startup(runs: int = 5) -> bool:
+    """
+    Measures how long importing rproj.main takes in a fresh interpreter.\n
+    ---
+    The best of `runs` runs is compared against STARTUP_BUDGET_MS, and any heavy
+    module that gets imported at startup is reported.
+    Args:
+        runs (int): The number of interpreters to start. Defaults to 5.
+    Returns:
+        bool: True if startup is within the budget.
+    """
+    package_root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+    env = dict(os.environ, PYTHONPATH=package_root)
+
+    best = None
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import rproj.main"],
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        times = parse_importtime(result.stderr)
+        if best is None or times["rproj.main"][1] < best["rproj.main"][1]:
+            best = times
+
+    total_ms = best["rproj.main"][1] / 1000
+    slowest = sorted(best.items(), key=lambda item: item[1][0], reverse=True)[:10]
+    for name, (self_us, _) in slowest:
+        log.info(f"{self_us / 1000:7.2f} ms  {name}")
+
+    for name in HEAVY_MODULES:
+        if name in best:
+            log.warn(f"{name} is imported at startup")
+
+    within_budget = total_ms <= STARTUP_BUDGET_MS
+    report = log.info if within_budget else log.err
+    report(f"Startup took {total_ms:.2f} ms (budget {STARTUP_BUDGET_MS} ms)")
+    return within_budget
+
+
+def bench_load(count: int = 2000, workers: int = None) -> None:
+    """
+    Compares serial and parallel loading of a synthetic registry.\n
+    ---
+    Creates `count` projects in a temporary directory and loads them with a cold
+    catalog, first with one thread and then with the configured thread pool.
+    Args:
+        count (int): The number of synthetic projects. Defaults to 2000.
+        workers (int, optional): The size of the thread pool. Defaults to the
+            `workers` config value.
+    """
+    import time
+    import tempfile
+    from rproj.utils.file import RProjFile
+    from rproj.utils.catalog import Catalog
+    from rproj.utils.config import get_workers
+    from rproj.utils.info import load_project_files
+
+    workers = workers or get_workers()
+    with tempfile.TemporaryDirectory(prefix="rproj-bench-") as root:
+        project_paths = []
+        for i in range(count):
+            directory = os.path.join(root, f"project-{i}")
+            os.makedirs(directory)
+            project = RProjFile(
+                f"project-{i}",
+                directory,
+                description=f"Synthetic project {i}",
+                tags=["bench", f"group-{i % 10}"],
+                notes=[],
+            )
+            project.write()
+            project_paths.append(project.path)
+
+        for label, pool_size in [("serial", 1), ("parallel", workers)]:
+            catalog = Catalog(os.path.join(root, f"catalog-{label}.json"))
+            start = time.perf_counter()
+            projects, unreadable = load_project_files(project_paths, catalog, pool_size)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            log.info(
+                f"{label:>8} ({pool_size} thread(s)): loaded {len(projects)} project(s)"
+                f" in {elapsed_ms:.1f} ms, {len(unreadable)} unreadable"
+            )
+
+
+def _walk_listdir(root_dir: str, depth: int = 0) -> Iterator[tuple[str, int]]:
+    """The previous recursive walker, listing with `os.listdir` and `os.path.isdir`."""
+    for item in sorted(os.listdir(root_dir)):
+        item_path = os.path.join(root_dir, item)
+        yield item_path, depth
+        if os.path.isdir(item_path):
+            yield from _walk_listdir(item_path, depth + 1)
+
+
+def bench_tree(count: int = 200_000, nesting: int = 1500, jobs: int = None) -> None:
+    """
+    Compares the tree walker against the previous `os.listdir` based one.\n
+    ---
+    Creates a synthetic tree of about `count` entries in a temporary directory
+    (20 x 20 directories of files) and walks it with both walkers and with the
+    walker reading ahead on `jobs` threads, then walks a chain of `nesting`
+    directories, which is deeper than the recursion limit.
+    Args:
+        count (int): The number of entries in the synthetic tree. Defaults to 200,000.
+        nesting (int): The depth of the nested chain. Defaults to 1500.
+        jobs (int, optional): The number of threads reading ahead. Defaults to
+            the `workers` config value.
+    """
+    import time
+    import tempfile
+    from rproj.utils.config import get_workers
+    from rproj.utils.tree import walk_project_structure
+
+    jobs = jobs or get_workers()
+    fan_out = 20
+    files_per_dir = max(count // (fan_out * fan_out) - 1, 0)
+    with tempfile.TemporaryDirectory(prefix="rproj-bench-") as root:
+        wide = os.path.join(root, "wide")
+        for i in range(fan_out):
+            for j in range(fan_out):
+                directory = os.path.join(wide, f"dir-{i}", f"dir-{j}")
+                os.makedirs(directory)
+                for k in range(files_per_dir):
+                    open(os.path.join(directory, f"file-{k}.txt"), "w").close()
+
+        walkers = [
+            ("listdir", lambda: _walk_listdir(wide)),
+            ("scandir", lambda: walk_project_structure(wide, max_depth=count)),
+            (
+                f"{jobs} jobs",
+                lambda: walk_project_structure(wide, max_depth=count, jobs=jobs),
+            ),
+        ]
+        for label, walk in walkers:
+            start = time.perf_counter()
+            entries = sum(1 for _ in walk())
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            log.info(f"{label:>8}: walked {entries} entries in {elapsed_ms:.1f} ms")
+
+        # Both os.makedirs and the temporary directory's cleanup recurse, so the
+        # chain is created and removed one directory at a time
+        chain = [os.path.join(root, "deep")]
+        for _ in range(nesting):
+            chain.append(os.path.join(chain[-1], "d"))
+        for directory in chain:
+            os.mkdir(directory)
+        try:
+            entries = sum(
+                1 for _ in walk_project_structure(chain[0], max_depth=nesting)
+            )
+            log.info(f"  nested: walked {entries} directories deep")
+        except RecursionError:
+            log.err("  nested: hit the recursion limit")
+        for directory in reversed(chain):
+            os.rmdir(directory)
+
+
+def bench_daemon(count: int = 2000, runs: int = 10) -> bool:
+    """
+    Compares commands run in process with the same commands forwarded to `rproj daemon`.\n
+    ---
+    Registers `count` synthetic projects in a temporary data directory, starts a
+    daemon for it and runs `dir`, `list` and `search` both ways, checking that
+    the output is the same. The round trip is the time the daemon takes to answer
+    over its socket, without starting a client interpreter.
+    Args:
+        count (int): The number of synthetic projects. Defaults to 2000.
+        runs (int): The number of runs of each command, of which the best is kept.
+            Defaults to 10.
+    Returns:
+        bool: True if every forwarded command printed the same as in process.
+    """
+    import time
+    import tempfile
+    from rproj.utils.file import RProjFile
+    from rproj.utils.daemon import _request, daemon_status, stop_daemon
+
+    package_root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+    commands = [
+        ["dir", f"project-{count // 2}"],
+        ["list", "--limit", "50"],
+        ["search", f"project-{count // 3}"],
+    ]
+    ok = True
+    with tempfile.TemporaryDirectory(prefix="rproj-bench-") as root:
+        data_dir = os.path.join(root, "data")
+        os.makedirs(data_dir)
+        socket_path = os.path.join(data_dir, "daemon.sock")
+        env = dict(os.environ, PYTHONPATH=package_root, RPROJ_DATA_DIR=data_dir)
+        for i in range(count):
+            directory = os.path.join(root, "projects", f"project-{i}")
+            os.makedirs(directory)
+            RProjFile(f"project-{i}", directory, tags=[f"group-{i % 10}"]).write()
+        subprocess.run(
+            [
+                sys.executable,
+                "-m",
+                "rproj.main",
+                "scan",
+                os.path.join(root, "projects"),
+            ],
+            env=env,
+            capture_output=True,
+            check=True,
+        )
+
+        def best_of(command: list[str], use_daemon: bool) -> tuple[float, str]:
+            best, output = None, None
+            for _ in range(runs):
+                start = time.perf_counter()
+                result = subprocess.run(
+                    [sys.executable, "-m", "rproj.main", *command],
+                    env=dict(env, RPROJ_USE_DAEMON=str(int(use_daemon))),
+                    capture_output=True,
+                    text=True,
+                )
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                best = elapsed_ms if best is None else min(best, elapsed_ms)
+                output = result.stdout
+            return best, output
+
+        daemon = subprocess.Popen(
+            [sys.executable, "-m", "rproj.main", "daemon"],
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            deadline = time.perf_counter() + 30
+            while not daemon_status(socket_path):
+                if time.perf_counter() > deadline or daemon.poll() is not None:
+                    log.err("The daemon didn't start")
+                    return False
+                time.sleep(0.05)
+
+            rproj_env = {
+                key: value for key, value in env.items() if key.startswith("RPROJ_")
+            }
+            for command in commands:
+                in_process_ms, expected = best_of(command, False)
+                forwarded_ms, output = best_of(command, True)
+                round_trip_ms = None
+                for _ in range(runs):
+                    start = time.perf_counter()
+                    _request(
+                        {
+                            "op": "run",
+                            "argv": command,
+                            "env": rproj_env,
+                            "tty": [False, False],
+                        },
+                        socket_path,
+                    )
+                    elapsed_ms = (time.perf_counter() - start) * 1000
+                    round_trip_ms = min(round_trip_ms or elapsed_ms, elapsed_ms)
+
+                same = output == expected
+                ok = ok and same
+                report = log.info if same else log.err
+                report(
+                    f"{' '.join(command)}: {in_process_ms:.1f} ms in process,"
+                    f" {forwarded_ms:.1f} ms forwarded ({round_trip_ms:.1f} ms round trip)"
+                    + ("" if same else ", output differs")
+                )
+        finally:
+            stop_daemon(socket_path)
+            daemon.wait(timeout=10)
+    return ok
+
+
+# Time allowed to update the picker after a keystroke, one frame at 60 Hz
+PICK_BUDGET_MS = 16
+
+
+def bench_pick(count: int = 10_000) -> bool:
+    """
+    Measures how long the picker takes to update after each keystroke.\n
+    ---
+    Types, deletes and retypes queries against `count` synthetic projects, timing
+    the filtering, ranking and drawing of every frame, without a terminal.
+    Args:
+        count (int): The number of synthetic projects. Defaults to 10,000.
+    Returns:
+        bool: True if the slowest update is within PICK_BUDGET_MS.
+    """
+    import time
+    import random
+    from rproj.utils.file import RProjFile
+    from rproj.utils.picker import ProjectFilter, render
+
+    rng = random.Random(0)
+    words = [
+        "api",
+        "web",
+        "service",
+        "data",
+        "ml",
+        "infra",
+        "client",
+        "tool",
+        "docs",
+        "bot",
+    ]
+    projects = [
+        RProjFile(
+            f"{rng.choice(words)}-{rng.choice(words)}-{i}",
+            f"/projects/{i}",
+            description=" ".join(rng.choices(words, k=6)),
+            tags=rng.sample(words, 2),
+        )
+        for i in range(count)
+    ]
+    start = time.perf_counter()
+    project_filter = ProjectFilter(projects)
+    setup_ms = (time.perf_counter() - start) * 1000
+
+    # Keystrokes as the query after each of them, with deletions and a retyped word
+    queries = []
+    for text in ["service api 12", "data", "infra too", "zz", "web-client", "x"]:
+        queries += [text[:i] for i in range(1, len(text) + 1)]
+        queries += [text[:i] for i in range(len(text) - 1, -1, -1)]
+
+    times = []
+    for query in queries:
+        start = time.perf_counter()
+        shown, matched = project_filter.rank(query)
+        render(query, shown, matched, count, 0, 120)
+        times.append((time.perf_counter() - start) * 1000)
+
+    times.sort()
+    slowest = times[-1]
+    within_budget = slowest <= PICK_BUDGET_MS
+    log.info(f"Indexed {count} project(s) in {setup_ms:.1f} ms")
+    report = log.info if within_budget else log.err
+    report(
+        f"{len(times)} keystrokes: median {times[len(times) // 2]:.2f} ms,"
+        f" slowest {slowest:.2f} ms (budget {PICK_BUDGET_MS} ms)"
+    )
+    return within_budget
+
+
+def bench_frecency(count: int = 20_000, projects: int = 2000) -> bool:
+    """
+    Logs project accesses and measures recording and scoring them.\n
+    ---
+    Records `count` accesses spread over `projects` synthetic directories in a
+    temporary log, so the log gets compacted several times, then checks that it
+    stayed within COMPACT_SIZE and that no access was lost.
+    Args:
+        count (int): The number of accesses. Defaults to 20,000.
+        projects (int): The number of directories accessed. Defaults to 2000.
+    Returns:
+        bool: True if the log stayed bounded and every access was counted.
+    """
+    import time
+    import random
+    import tempfile
+    from rproj.utils import frecency
+
+    rng = random.Random(0)
+    # A few projects get most of the accesses, like real use
+    directories = [
+        f"/projects/{int(rng.paretovariate(1.2)) % projects}" for _ in range(count)
+    ]
+    saved = (
+        frecency.ACCESS_LOG_PATH,
+        frecency.FRECENCY_PATH,
+        frecency.FRECENCY_LOCK_PATH,
+    )
+    with tempfile.TemporaryDirectory(prefix="rproj-bench-") as root:
+        frecency.ACCESS_LOG_PATH = os.path.join(root, "access.log")
+        frecency.FRECENCY_PATH = os.path.join(root, "frecency.json")
+        frecency.FRECENCY_LOCK_PATH = os.path.join(root, "frecency.json.lock")
+        try:
+            largest = 0
+            start = time.perf_counter()
+            for directory in directories:
+                frecency.record_access(directory)
+                largest = max(largest, os.path.getsize(frecency.ACCESS_LOG_PATH))
+            record_ms = (time.perf_counter() - start) * 1000
+
+            start = time.perf_counter()
+            scores = frecency.load_scores()
+            score_ms = (time.perf_counter() - start) * 1000
+            counted = sum(
+                rank for rank, _ in frecency._fold_log(frecency._read_table()).values()
+            )
+        finally:
+            (
+                frecency.ACCESS_LOG_PATH,
+                frecency.FRECENCY_PATH,
+                frecency.FRECENCY_LOCK_PATH,
+            ) = saved
+
+    # Ageing only starts past MAX_TOTAL_RANK, so below it every access is counted
+    expected = min(count, frecency.MAX_TOTAL_RANK)
+    ok = largest <= frecency.COMPACT_SIZE + 4096 and (
+        count > expected or counted == expected
+    )
+    log.info(
+        f"Recorded {count} accesses in {record_ms:.0f} ms ({record_ms * 1000 / count:.0f} µs each)"
+    )
+    report = log.info if ok else log.err
+    report(
+        f"Scored {len(scores)} project(s) in {score_ms:.1f} ms, counted {counted:.0f} access(es),"
+        f" largest log {largest / 1024:.0f} KiB (compacted past {frecency.COMPACT_SIZE // 1024} KiB)"
+    )
+    return ok
@@ -0,0 +1,392 @@
+import os
+import sys
+import json
+import uuid
+from rproj.utils import log
+from rproj.utils.search import index_keys, INDEX_VERSION
+from rproj.utils.config import get_backend
+from rproj.utils.fs import locked, write_atomic
+from rproj.utils.projects import PROJECT_DATA_PATH
+
+CATALOG_VERSION = 1
+CATALOG_PATH = os.path.join(os.path.dirname(PROJECT_DATA_PATH), "catalog.json")
+# Held while the catalog is written, so concurrent changes aren't lost
+CATALOG_LOCK_PATH = f"{CATALOG_PATH}.lock"
+
+# Bumped whenever a project is written or removed, so in-memory indexes
+# built from the catalog know when they have to be rebuilt
+generation = 0
+# Whether the catalog is kept open between commands, see `set_resident`
+_resident = False
+_resident_catalog: "Catalog" = None
+
+
+class Catalog:
+    """
+    Catalog is a cache of already parsed project files, stored next to the
+    projects.json file. Each entry is keyed by the path of the `.rproj` file and
+    holds the file's mtime and size along with the data from `RProjFile.as_dict`.\n
+    ---
+    An entry is only trusted while the file on disk still has the same mtime and
+    size, so editing a `.rproj` file by hand simply causes it to be parsed again.\n
+    The catalog also maintains search indexes (see `rproj.utils.search`) in a
+    separate file, which is only read when searching or changing an entry. Both
+    files share a stamp, and the index is rebuilt from the entries if they differ.\n
+    Changes are written with `update_catalog` and `remove_from_catalog`, which
+    open the catalog under its lock. Any other save only caches parsed files, so
+    it's dropped if another process saved the catalog since it was opened,
+    instead of writing over that process's changes.
+    Attributes:
+        path (str): The path to the catalog file.
+        entries (dict): The cached entries, keyed by project file path.
+        stamp (str): Identifies the saved version of the catalog.
+        dirty (bool): Whether the catalog has unsaved changes.
+        file_id (tuple): The inode, size and mtime of the catalog file when it
+            was read, or None if there was no file.
+    """
+
+    def __init__(
+        self, path: str = CATALOG_PATH, entries: dict = None, stamp: str = None
+    ) -> None:
+        self.path = path
+        self.entries = entries if entries is not None else {}
+        self.stamp = stamp
+        self.dirty = False
+        self.file_id: tuple = None
+        self._postings: dict = None
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @property
+    def index_path(self) -> str:
+        """The path to the search index file, next to the catalog file."""
+        return f"{os.path.splitext(self.path)[0]}-index.json"
+
+    @property
+    def lock_path(self) -> str:
+        """The path to the lock file held while the catalog is written."""
+        return f"{self.path}.lock"
+
+    @staticmethod
+    def open(path: str = CATALOG_PATH) -> "Catalog":
+        """Opens the catalog file, starting with an empty catalog if it is unusable."""
+        catalog = Catalog(path)
+        if not os.path.exists(path):
+            return catalog
+
+        try:
+            with open(path, "r") as file:
+                catalog.file_id = _file_id(os.fstat(file.fileno()))
+                data = json.loads(file.read())
+        except (OSError, json.JSONDecodeError):
+            log.warn("Could not read catalog file, rebuilding it")
+            return catalog
+
+        if isinstance(data, dict) and data.get("version") == CATALOG_VERSION:
+            catalog.entries = data.get("projects", {})
+            catalog.stamp = data.get("stamp")
+        return catalog
+
+    def changed_on_disk(self) -> bool:
+        """Checks if another process saved the catalog since it was read."""
+        try:
+            return _file_id(os.stat(self.path)) != self.file_id
+        except FileNotFoundError:
+            return self.file_id is not None
+
+    def save(self):
+        """Writes the catalog to disk if it has changed."""
+        if not self.dirty:
+            return False
+
+        with locked(self.lock_path):
+            if self.changed_on_disk():
+                return False  # Only cached parses, see the class docstring
+            self._save()
+        return True
+
+    def _save(self):
+        """Writes the catalog and its search index, see `save`."""
+        self.stamp = uuid.uuid4().hex
+        if self._postings is not None:
+            self._write(
+                self.index_path,
+                {
+                    "version": INDEX_VERSION,
+                    "stamp": self.stamp,
+                    "postings": self._postings,
+                },
+            )
+        self._write(
+            self.path,
+            {"version": CATALOG_VERSION, "stamp": self.stamp, "projects": self.entries},
+        )
+        self.file_id = _file_id(os.stat(self.path))
+        self.dirty = False
+
+    def _write(self, path: str, data: dict):
+        """Writes data as JSON through a temporary file, so readers never see half of it."""
+        write_atomic(path, json.dumps(data), durable=False)  # Can be rebuilt
+
+    def load_postings(self) -> dict:
+        """
+        Loads the search index, rebuilding it if it doesn't match the catalog.
+
+        Returns:
+            dict: The paths and weights of each key, keyed by kind and key.
+        """
+        if self._postings is not None:
+            return self._postings
+
+        try:
+            with open(self.index_path, "r") as file:
+                data = json.loads(file.read())
+            if (
+                self.stamp
+                and data.get("stamp") == self.stamp
+                and data.get("version") == INDEX_VERSION
+            ):
+                self._postings = data["postings"]
+                return self._postings
+        except (OSError, json.JSONDecodeError, KeyError, AttributeError):
+            pass
+
+        self._postings = {}
+        for path, entry in self.entries.items():
+            self._index(path, entry["data"])
+        self.dirty = True
+        return self._postings
+
+    def _index(self, path: str, data: dict):
+        """Adds the index keys of the project data to the search index."""
+        for kind, keys in index_keys(data).items():
+            postings = self._postings.setdefault(kind, {})
+            for key, weight in keys.items():
+                postings.setdefault(key, {})[path] = weight
+
+    def _unindex(self, path: str, data: dict):
+        """Removes the index keys of the project data from the search index."""
+        for kind, keys in index_keys(data).items():
+            postings = self._postings.get(kind, {})
+            for key in keys:
+                paths = postings.get(key, {})
+                paths.pop(path, None)
+                if not paths:
+                    postings.pop(key, None)
+
+    def key_counts(self, kind: str) -> dict[str, int]:
+        """Returns the number of projects with each key of a kind, e.g. each tag."""
+        postings = self.load_postings().get(kind, {})
+        return {key: len(paths) for key, paths in postings.items()}
+
+    def project_names(self) -> list[str]:
+        """Returns the names of all cataloged projects."""
+        return [
+            entry["data"]["info"]["project_name"] for entry in self.entries.values()
+        ]
+
+    def lookup(self, kind: str, keys: list[str]) -> list[tuple[str, str, float]]:
+        """
+        Looks keys up in the search index.
+
+        Args:
+            kind (str): The kind of index, e.g. "trigram".
+            keys (list[str]): The keys to look up.
+        Returns:
+            list[tuple[str, str, float]]: A (key, path, weight) tuple per match.
+        """
+        postings = self.load_postings().get(kind, {})
+        return [
+            (key, path, weight)
+            for key in keys
+            for path, weight in postings.get(key, {}).items()
+        ]
+
+    def get(self, path: str, stat: os.stat_result = None) -> dict | None:
+        """
+        Returns the cached project data for the given path.
+
+        Args:
+            path (str): The path to the project file.
+            stat (os.stat_result, optional): The stat of the project file, if the
+                caller already has it.
+        Returns:
+            dict | None: The cached data, or None if there is no entry or the
+                file has changed since it was cached.
+        """
+        entry = self.entries.get(path)
+        if entry is None:
+            return None
+
+        if stat is None:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                return None
+
+        if entry["mtime"] != stat.st_mtime_ns or entry["size"] != stat.st_size:
+            return None
+
+        return entry["data"]
+
+    def put(self, project, stat: os.stat_result = None, path: str = None):
+        """
+        Stores the project in the catalog, stamped with its file's mtime and size.
+
+        Args:
+            project (RProjFile): The project to store.
+            stat (os.stat_result, optional): The stat of the project file.
+            path (str, optional): The registered path of the project file.
+                Defaults to the project's own path.
+        """
+        path = path or project.path
+        if stat is None:
+            stat = os.stat(path)
+
+        self.load_postings()
+        if path in self.entries:
+            self._unindex(path, self.entries[path]["data"])
+
+        data = project.as_dict()
+        self.entries[path] = {
+            "mtime": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "data": data,
+        }
+        self._index(path, data)
+        self.dirty = True
+
+    def remove(self, path: str):
+        """Removes the entry for the given path, if there is one."""
+        if path in self.entries:
+            self.load_postings()
+            self._unindex(path, self.entries.pop(path)["data"])
+            self.dirty = True
+
+    def check(self, project_paths: list[str]) -> list[str]:
+        """
+        Compares the catalog against the registry and the files on disk.
+
+        Args:
+            project_paths (list[str]): The project paths from projects.json.
+        Returns:
+            list[str]: A description of every inconsistency found.
+        """
+        problems = []
+        registered = set(project_paths)
+
+        for path in project_paths:
+            if path not in self.entries:
+                problems.append(f"Not cataloged: {path}")
+            elif not os.path.exists(path):
+                problems.append(f"Project file missing: {path}")
+            elif self.get(path) is None:
+                problems.append(f"Stale entry: {path}")
+
+        for path in self.entries:
+            if path not in registered:
+                problems.append(f"Not registered: {path}")
+
+        return problems
+
+
+def _file_id(stat: os.stat_result) -> tuple:
+    """Identifies a version of a file that is replaced atomically when written."""
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+def get_generation() -> int:
+    """Returns a counter that changes whenever a project is written or removed."""
+    return generation
+
+
+def set_resident(resident: bool):
+    """
+    Keeps the catalog and the projects loaded from it in memory between commands.\n
+    ---
+    Used by `rproj daemon`, which calls `invalidate` whenever another process
+    changes the registry.
+    Args:
+        resident (bool): Whether to keep them in memory.
+    """
+    global _resident
+    _resident = resident
+    invalidate()
+
+
+def is_resident() -> bool:
+    """Checks if the catalog and projects are kept in memory, see `set_resident`."""
+    return _resident
+
+
+def invalidate():
+    """Forgets the catalog and the indexes built from it, so they're loaded again."""
+    global generation, _resident_catalog
+    generation += 1
+    _resident_catalog = None
+    database = sys.modules.get(
+        "rproj.utils.database"
+    )  # Only imported by the sqlite backend
+    if database:
+        database.close_databases()
+
+
+def open_catalog():
+    """Opens the catalog of the configured backend, either a Catalog or a Database."""
+    global _resident_catalog
+    if get_backend() == "sqlite":
+        from rproj.utils.database import Database
+
+        return Database.open()
+    if not _resident:
+        return Catalog.open()
+    if _resident_catalog is None:
+        _resident_catalog = Catalog.open()
+    return _resident_catalog
+
+
+def update_catalog(*projects):
+    """Updates the catalog entries for one or more projects and saves the catalog once."""
+    global generation
+    generation += 1
+
+    with locked(CATALOG_LOCK_PATH):
+        catalog = _open_latest_catalog()
+        for project in projects:
+            catalog.put(project)
+        catalog.save()
+        _refresh_completion(catalog)
+
+
+def remove_from_catalog(project):
+    """Removes a single project from the catalog and saves the catalog."""
+    global generation
+    generation += 1
+
+    with locked(CATALOG_LOCK_PATH):
+        catalog = _open_latest_catalog()
+        catalog.remove(project.path)
+        catalog.save()
+        _refresh_completion(catalog)
+
+
+def _open_latest_catalog():
+    """Opens the catalog like `open_catalog`, reading it again if another process saved it."""
+    global _resident_catalog
+    catalog = open_catalog()
+    if isinstance(catalog, Catalog) and catalog.changed_on_disk():
+        catalog = Catalog.open()
+        if _resident:
+            _resident_catalog = catalog
+    return catalog
+
+
+def _refresh_completion(catalog):
+    """Rewrites the completion cache after a change, see `write_completion_cache`."""
+    from rproj.utils.completion import write_completion_cache
+
+    try:
+        write_completion_cache(catalog)
+    except OSError:
+        pass  # Completion only goes stale
@@ -1,8 +1,9 @@
 import os
 import argparse
 from rproj.utils import log
-from rproj.utils.info import search_project
-
+from rproj.utils.console import escape
+from rproj.utils.search import closest_match
+from rproj.utils.info import search_project, fuzzy_search_projects
 
 # Not needed for now because argparse will handle this - I hope
 # def check_args_exist(req_args: list):
@@ -45,15 +46,18 @@ def check_directory_exists(func):
     return wrapper
 
 
-def check_project_exists(func):
+def check_project_exists(func=None, *, exact: bool = False):
     """
     Decorator to check if a project exists.\n
     ---
     This decorator takes a function and ensures that the project specified in the
     command-line arguments exists. If the project does not exist, it logs an error
-    message and prevents the wrapped function from being executed.
+    message and prevents the wrapped function from being executed. Commands that
+    change or delete the project pass `exact=True`, so a casing or a prefix of its
+    name is never enough to pick it.
     Args:
         func (Callable): The function to be wrapped by the decorator.
+        exact (bool): Only accept the exact name of the project. Defaults to False.
     Returns:
         Callable: The wrapped function that includes the project existence check.
     Example:
@@ -61,14 +65,68 @@ def check_project_exists(func):
         @check_project_exists
         def some_function(cmd_args):
             # Function logic here
+
+        @check_project_exists(exact=True)
+        def some_destructive_function(cmd_args):
+            # Function logic here
         ```
     """
+    if func is None:
+        return lambda func: check_project_exists(func, exact=exact)
 
     def wrapper(cmd_args: argparse.Namespace, *args, **kwargs):
-        project = search_project(cmd_args.name)
+        project = search_project(cmd_args.name, exact=exact)
         if not project:
+            close = exact and search_project(cmd_args.name)
+            if close:
+                log.err(
+                    f"Project not found, did you mean {escape(close.project_name)}?"
+                )
+            else:
+                log.err("Project not found")
+            return
+        return func(cmd_args, *args, **kwargs)
+
+    return wrapper
+
+
+def check_project_exists_or_closest(func):
+    """
+    Decorator to check if a project exists, falling back to the closest match.\n
+    ---
+    Works like `check_project_exists`, but when no project has the given name the
+    fuzzy search is tried. If one project is clearly the closest match, its name
+    replaces the one in the command-line arguments. Otherwise the closest matches
+    are suggested and the wrapped function is not executed.
+    Args:
+        func (Callable): The function to be wrapped by the decorator.
+    Returns:
+        Callable: The wrapped function that includes the project existence check.
+    Example:
+        ```
+        @check_project_exists_or_closest
+        def some_function(cmd_args):
+            # Function logic here
+        ```
+    """
+
+    def wrapper(cmd_args: argparse.Namespace, *args, **kwargs):
+        if search_project(cmd_args.name):
+            return func(cmd_args, *args, **kwargs)
+
+        results = fuzzy_search_projects(cmd_args.name)
+        project = closest_match(results)
+        if project is None:
             log.err("Project not found")
+            if results:
+                names = ", ".join(project.project_name for _, project in results)
+                log.err(f"Did you mean: {escape(names)}?")
             return
+
+        log.warn(
+            f"Project not found, using closest match {escape(project.project_name)}"
+        )
+        cmd_args.name = project.project_name
         return func(cmd_args, *args, **kwargs)
 
     return wrapper
@@ -95,7 +153,7 @@ def check_project_already_exists(func):
     """
 
     def wrapper(cmd_args: argparse.Namespace, *args, **kwargs):
-        project = search_project(cmd_args.name)
+        project = search_project(cmd_args.name, exact=True)
         if project:
             log.err("Project name already exists")
             return
@@ -0,0 +1,263 @@
+import os
+import shlex
+from typing import NamedTuple
+from rproj.utils.config import DATA_DIR
+from rproj.utils.fs import write_atomic
+
+# Project names and tags, one per line, read by the completion scripts
+COMPLETION_DIR = os.path.join(DATA_DIR, "completion")
+NAMES_PATH = os.path.join(COMPLETION_DIR, "names")
+TAGS_PATH = os.path.join(COMPLETION_DIR, "tags")
+# Options that take tags, besides --tags, by command
+TAG_OPTIONS = {"tag": ["--add", "--remove"]}
+GLOBAL_OPTIONS = ["--json", "--ndjson"]
+
+
+def write_completion_cache(catalog):
+    """
+    Writes the project names and tags for the completion scripts.\n
+    ---
+    The scripts read these files on every TAB, so completing never starts
+    Python. They're rewritten from the catalog whenever a project is written or
+    removed, which only takes the names and tags already in it.
+    Args:
+        catalog (Catalog | Database): The catalog, after the change was saved.
+    """
+    names = sorted(set(catalog.project_names()), key=str.casefold)
+    tags = sorted(catalog.key_counts("tag"), key=str.casefold)
+    os.makedirs(COMPLETION_DIR, exist_ok=True)
+    for path, words in [(NAMES_PATH, names), (TAGS_PATH, tags)]:
+        words = [word for word in words if "\n" not in word]
+        write_atomic(path, "".join(f"{word}\n" for word in words), durable=False)
+
+
+class CommandSpec(NamedTuple):
+    """
+    What a command accepts, for the completion scripts.
+    Attributes:
+        names (list[str]): The name and aliases of the command.
+        options (list[str]): The options of the command.
+        tag_options (list[str]): The options that take tags.
+        takes_name (bool): Whether the first argument is an existing project.
+        choices (dict): The values accepted by options, keyed by option, or by
+            None for the first argument.
+    """
+
+    names: list[str]
+    options: list[str]
+    tag_options: list[str]
+    takes_name: bool
+    choices: dict
+
+
+def get_command_specs() -> list[CommandSpec]:
+    """Gets what each command in `COMMAND_HANDLERS` accepts, from its arguments in `get_commands`."""
+    from rproj.cli import get_commands
+    from rproj.main import COMMAND_HANDLERS
+
+    specs = []
+    for command in get_commands():
+        names = [
+            name
+            for name in (command.name, *command.aliases)
+            if name in COMMAND_HANDLERS
+        ]
+        if not names:
+            continue
+        args = [(arg, {}) if isinstance(arg, str) else arg for arg in command.args]
+        options = [arg for arg, _ in args if arg.startswith("-")]
+        tag_options = [option for option in options if option == "--tags"]
+        tag_options += TAG_OPTIONS.get(command.name, [])
+        choices = {
+            (arg if arg.startswith("-") else None): kwargs["choices"]
+            for arg, kwargs in args
+            if "choices" in kwargs
+        }
+        # `create` takes the name of a new project
+        takes_name = command.name != "create" and any(arg == "name" for arg, _ in args)
+        specs.append(CommandSpec(names, options, tag_options, takes_name, choices))
+    return specs
+
+
+def _bash_words(words: list[str]) -> str:
+    """Quotes words as one newline separated bash string."""
+    return (
+        "$'"
+        + "\\n".join(word.replace("\\", "\\\\").replace("'", "\\'") for word in words)
+        + "'"
+    )
+
+
+def bash_script() -> str:
+    """Generates the bash completion script."""
+    names, tags = shlex.quote(NAMES_PATH), shlex.quote(TAGS_PATH)
+    specs = get_command_specs()
+    commands = [name for spec in specs for name in spec.names]
+    lines = [
+        "# rproj completion for bash, generated by `rproj completion bash`",
+        '# Load it with `eval "$(rproj completion bash)"` in ~/.bashrc',
+        "_rproj_cache() {",
+        '    [[ -r "$1" ]] && printf "%s" "$(< "$1")"',
+        "}",
+        "",
+        "_rproj() {",
+        '    local cur="${COMP_WORDS[COMP_CWORD]}" prev="${COMP_WORDS[COMP_CWORD-1]}"',
+        '    local command="" words="" i',
+        "    for ((i = 1; i < COMP_CWORD; i++)); do",
+        '        if [[ "${COMP_WORDS[i]}" != -* ]]; then',
+        '            command="${COMP_WORDS[i]}"',
+        "            break",
+        "        fi",
+        "    done",
+        "",
+        '    case "$command" in',
+        f'        "") words={_bash_words(commands + GLOBAL_OPTIONS)} ;;',
+    ]
+    for spec in specs:
+        branches = []
+        if spec.tag_options:
+            condition = " || ".join(
+                f'"$prev" == {option}' for option in spec.tag_options
+            )
+            branches.append((f"[[ {condition} ]]", f'words="$(_rproj_cache {tags})"'))
+        for option, values in spec.choices.items():
+            condition = (
+                '"$prev" == "$command"' if option is None else f'"$prev" == {option}'
+            )
+            branches.append((f"[[ {condition} ]]", f"words={_bash_words(values)}"))
+        branches.append(
+            (
+                '[[ "$cur" == -* ]]',
+                f"words={_bash_words(spec.options + GLOBAL_OPTIONS)}",
+            )
+        )
+        if spec.takes_name:
+            branches.append(
+                ('[[ "$prev" == "$command" ]]', f'words="$(_rproj_cache {names})"')
+            )
+        lines.append(f"        {'|'.join(spec.names)})")
+        for i, (condition, action) in enumerate(branches):
+            lines.append(f"            {'if' if i == 0 else 'elif'} {condition}; then")
+            lines.append(f"                {action}")
+        lines += ["            fi ;;"]
+    lines += [
+        "    esac",
+        "",
+        "    local IFS=$'\\n'",
+        '    COMPREPLY=($(compgen -W "$words" -- "$cur"))',
+        "}",
+        "",
+        "complete -o default -F _rproj rproj",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def zsh_script() -> str:
+    """Generates the zsh completion script."""
+    names, tags = shlex.quote(NAMES_PATH), shlex.quote(TAGS_PATH)
+    specs = get_command_specs()
+    commands = [name for spec in specs for name in spec.names]
+    lines = [
+        "#compdef rproj",
+        "# rproj completion for zsh, generated by `rproj completion zsh`",
+        '# Load it with `eval "$(rproj completion zsh)"` in ~/.zshrc, after compinit',
+        "_rproj_cache() {",
+        "    reply=()",
+        '    [[ -r $1 ]] && reply=(${(f)"$(<$1)"})',
+        "}",
+        "",
+        "_rproj() {",
+        "    local command i prev=${words[CURRENT-1]} cur=${words[CURRENT]}",
+        "    local -a reply",
+        "    for (( i = 2; i < CURRENT; i++ )); do",
+        "        if [[ ${words[i]} != -* ]]; then",
+        "            command=${words[i]}",
+        "            break",
+        "        fi",
+        "    done",
+        "",
+        "    case $command in",
+        f"        '') compadd -- {shlex.join(commands + GLOBAL_OPTIONS)} ;;",
+    ]
+    for spec in specs:
+        branches = []
+        if spec.tag_options:
+            condition = " || ".join(f"$prev == {option}" for option in spec.tag_options)
+            branches.append(
+                (f"[[ {condition} ]]", f"_rproj_cache {tags}; compadd -a reply")
+            )
+        for option, values in spec.choices.items():
+            condition = (
+                '$prev == "$command"' if option is None else f"$prev == {option}"
+            )
+            branches.append((f"[[ {condition} ]]", f"compadd -- {shlex.join(values)}"))
+        branches.append(
+            (
+                "[[ $cur == -* ]]",
+                f"compadd -- {shlex.join(spec.options + GLOBAL_OPTIONS)}",
+            )
+        )
+        if spec.takes_name:
+            branches.append(
+                ('[[ $prev == "$command" ]]', f"_rproj_cache {names}; compadd -a reply")
+            )
+        lines.append(f"        {'|'.join(spec.names)})")
+        for i, (condition, action) in enumerate(branches):
+            lines.append(f"            {'if' if i == 0 else 'elif'} {condition}; then")
+            lines.append(f"                {action}")
+        lines += ["            else", "                _files", "            fi ;;"]
+    lines += [
+        "        *) _files ;;",
+        "    esac",
+        "}",
+        "",
+        "compdef _rproj rproj",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def fish_script() -> str:
+    """Generates the fish completion script."""
+    names, tags = shlex.quote(NAMES_PATH), shlex.quote(TAGS_PATH)
+    specs = get_command_specs()
+    commands = [name for spec in specs for name in spec.names]
+    lines = [
+        "# rproj completion for fish, generated by `rproj completion fish`",
+        "# Save it as ~/.config/fish/completions/rproj.fish",
+        f"complete -c rproj -n __fish_use_subcommand -f -a {shlex.quote(' '.join(commands))}",
+    ]
+    for option in GLOBAL_OPTIONS:
+        lines.append(f"complete -c rproj -l {option[2:]}")
+    for spec in specs:
+        seen = shlex.quote(f"__fish_seen_subcommand_from {' '.join(spec.names)}")
+        if spec.takes_name:
+            lines.append(
+                f'complete -c rproj -n {seen} -f -a "(cat {names} 2>/dev/null)"'
+            )
+        if None in spec.choices:
+            lines.append(
+                f"complete -c rproj -n {seen} -f -a {shlex.quote(' '.join(spec.choices[None]))}"
+            )
+        for option in spec.options:
+            flag = f"-l {option[2:]}" if option.startswith("--") else f"-s {option[1:]}"
+            values = ""
+            if option in spec.tag_options:
+                values = f' -x -a "(cat {tags} 2>/dev/null)"'
+            elif option in spec.choices:
+                values = f" -x -a {shlex.quote(' '.join(spec.choices[option]))}"
+            lines.append(f"complete -c rproj -n {seen} {flag}{values}")
+    return "\n".join(lines) + "\n"
+
+
+def completion_script(shell: str) -> str:
+    """
+    Generates the completion script of a shell.\n
+    ---
+    Commands and options are written into the script, while project names and
+    tags are read from the files written by `write_completion_cache`.
+    Args:
+        shell (str): "bash", "zsh" or "fish".
+    Returns:
+        str: The script.
+    """
+    return {"bash": bash_script, "zsh": zsh_script, "fish": fish_script}[shell]()
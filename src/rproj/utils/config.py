@@ -0,0 +1,91 @@
+import os
+import json
+from appdirs import user_data_dir
+from rproj.utils import log
+
+
+def get_data_dir():
+    """Get the rproj data directory from `RPROJ_DATA_DIR`, or using appdirs."""
+    data_dir = os.environ.get("RPROJ_DATA_DIR") or user_data_dir(
+        appname="rproj", appauthor="JadenLabs"
+    )
+    os.makedirs(data_dir, exist_ok=True)
+    return data_dir
+
+
+DATA_DIR = get_data_dir()
+CONFIG_PATH = os.path.join(DATA_DIR, "config.json")
+
+DEFAULT_CONFIG = {
+    "backend": "json",  # "json" or "sqlite"
+    "workers": 8,  # Threads used to read project files
+    "tree_cache_mb": 0,  # Total size of the cached tree snapshots, 0 to not keep any
+    "use_daemon": True,  # Forward commands to `rproj daemon` when it's running
+}
+
+_config: dict = None
+
+
+def load_config() -> dict:
+    """Load the config file, falling back to the defaults for missing keys."""
+    global _config
+    if _config is not None:
+        return _config
+
+    _config = dict(DEFAULT_CONFIG)
+    if os.path.exists(CONFIG_PATH):
+        try:
+            with open(CONFIG_PATH, "r") as file:
+                _config.update(json.loads(file.read()))
+        except (OSError, json.JSONDecodeError, ValueError):
+            log.warn(f"Could not read config file at {CONFIG_PATH}, using defaults")
+
+    return _config
+
+
+def get_config(key: str):
+    """
+    Get a config value.\n
+    ---
+    The environment variable `RPROJ_<KEY>` takes precedence over the config file.
+    Args:
+        key (str): The name of the config value.
+    Returns:
+        The value from the environment, the config file, or the defaults.
+    """
+    env_value = os.environ.get(f"RPROJ_{key.upper()}")
+    if env_value is not None:
+        return env_value
+    return load_config().get(key)
+
+
+def get_backend() -> str:
+    """Get the storage backend for the registry, either "json" or "sqlite"."""
+    backend = str(get_config("backend")).lower()
+    if backend not in ("json", "sqlite"):
+        log.warn(f"Unknown backend {backend}, using json")
+        return "json"
+    return backend
+
+
+def get_workers() -> int:
+    """Get the number of threads used to read project files, at least 1."""
+    try:
+        return max(1, int(get_config("workers")))
+    except (TypeError, ValueError):
+        log.warn(f"Invalid workers value {get_config('workers')}, using 1")
+        return 1
+
+
+def get_tree_cache_size() -> int:
+    """Get the maximum total size of the cached tree snapshots in bytes."""
+    try:
+        return max(0, int(float(get_config("tree_cache_mb")) * 1_000_000))
+    except (TypeError, ValueError):
+        log.warn(f"Invalid tree_cache_mb value {get_config('tree_cache_mb')}, using 0")
+        return 0
+
+
+def get_use_daemon() -> bool:
+    """Get whether commands are forwarded to a running `rproj daemon`."""
+    return str(get_config("use_daemon")).lower() not in ("0", "false", "no", "off")
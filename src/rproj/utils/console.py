@@ -0,0 +1,119 @@
+import re
+import sys
+from typing import Iterable
+
+# Same tag syntax as rich markup, e.g. [bright_blue], [/] or [/red]
+MARKUP_TAG = re.compile(r"(\\*)\[([a-z#/@][^[]*?)]")
+# Number of records written at once by print_records
+RECORD_BATCH_SIZE = 200
+
+_output_format: str = None
+
+
+def set_output_format(output_format: str | None):
+    """Sets the machine-readable output format, "json" or "ndjson", or None for text."""
+    global _output_format
+    _output_format = output_format
+
+
+def get_output_format() -> str | None:
+    """Gets the machine-readable output format, or None when printing text."""
+    return _output_format
+
+
+def escape(text: str) -> str:
+    """
+    Escapes text so it's printed as is instead of read as markup, like `rich.markup.escape`.\n
+    ---
+    Every project field, path or other user text that ends up in a string with
+    markup has to go through this, or e.g. a "[wip]" note would be dropped.
+    """
+
+    def replace(match: re.Match) -> str:
+        backslashes, tag = match.groups()
+        return f"{backslashes}{backslashes}\\[{tag}]"
+
+    text = MARKUP_TAG.sub(replace, str(text))
+    if text.endswith("\\") and not text.endswith("\\\\"):
+        text += "\\"  # Would escape the tag that follows
+    return text
+
+
+def strip_markup(text: str) -> str:
+    """Removes rich markup tags from the text, unescaping the ones escaped by `escape`."""
+
+    def replace(match: re.Match) -> str:
+        backslashes, tag = match.groups()
+        kept, escaped = divmod(len(backslashes), 2)
+        return "\\" * kept + (f"[{tag}]" if escaped else "")
+
+    return MARKUP_TAG.sub(replace, text)
+
+
+def is_terminal(file=None) -> bool:
+    """Checks if the file (stdout by default) is an interactive terminal."""
+    file = file or sys.stdout
+    return hasattr(file, "isatty") and file.isatty()
+
+
+def print(*objects, sep: str = " ", end: str = "\n", file=None, flush: bool = False):
+    """
+    Prints objects that may contain rich markup.\n
+    ---
+    When the output is a terminal this hands off to `rich.print`. Otherwise the
+    markup is stripped and the text is written directly, so scripts piping rproj's
+    output don't pay for importing and rendering with rich. The same happens
+    whenever a machine-readable output format is set.
+    Args:
+        objects: The objects to print.
+        sep (str): The separator between objects. Defaults to " ".
+        end (str): The string written after the objects. Defaults to "\\n".
+        file: The file to write to. Defaults to stdout.
+        flush (bool): Whether to flush the file. Defaults to False.
+    """
+    if is_terminal(file) and not _output_format:
+        from rich import print as rich_print
+
+        return rich_print(*objects, sep=sep, end=end, file=file, flush=flush)
+
+    text = sep.join(strip_markup(str(obj)) for obj in objects)
+    (file or sys.stdout).write(text + end)
+    if flush:
+        (file or sys.stdout).flush()
+
+
+def print_records(records: Iterable[dict], file=None):
+    """
+    Prints records in the machine-readable output format.\n
+    ---
+    "ndjson" prints one JSON object per line, "json" prints a single JSON array.
+    Both are written as the records come in, a batch at a time, so long lists
+    can be consumed while they're still being printed.
+    Args:
+        records (Iterable[dict]): The records to print.
+        file: The file to write to. Defaults to stdout.
+    """
+    import json
+
+    file = file or sys.stdout
+    batch = []
+    written = 0
+
+    def flush():
+        nonlocal written
+        if _output_format == "ndjson":
+            file.write("\n".join(batch) + "\n")
+        else:
+            file.write(("[\n" if not written else ",\n") + ",\n".join(batch))
+        written += len(batch)
+        batch.clear()
+
+    for record in records:
+        batch.append(json.dumps(record))
+        if len(batch) >= RECORD_BATCH_SIZE:
+            flush()
+    if batch:
+        flush()
+
+    if _output_format == "json":
+        file.write("\n]\n" if written else "[]\n")
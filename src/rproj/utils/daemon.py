@@ -0,0 +1,359 @@
+import os
+import sys
+import json
+import time
+from rproj.utils.config import DATA_DIR, get_use_daemon
+
+SOCKET_PATH = os.path.join(DATA_DIR, "daemon.sock")
+# Commands run by the daemon, which only read the registry and print (`dir` and
+# `jump` also log the access). The rest change the registry or start programs,
+# so they always run in the calling process
+FORWARDED_COMMANDS = {
+    "dir",
+    "jump",
+    "j",
+    "list",
+    "l",
+    "li",
+    "all",
+    "search",
+    "s",
+    "find",
+    "fetch",
+    "info",
+}
+# Seconds between checks of the project files for changes
+POLL_INTERVAL = 1.0
+# Seconds a client may take to connect or to send its request
+CONNECT_TIMEOUT = 1.0
+REQUEST_TIMEOUT = 5.0
+# Bytes read from the socket at once
+RECEIVE_SIZE = 64 * 1024
+
+
+def _receive(connection: "socket.socket") -> bytes:
+    """Reads from a socket until the other side stops writing."""
+    chunks = []
+    while chunk := connection.recv(RECEIVE_SIZE):
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def _rproj_env() -> dict[str, str]:
+    """Gets the `RPROJ_` environment variables, which change how commands behave."""
+    return {
+        key: value
+        for key, value in os.environ.items()
+        if key.startswith("RPROJ_") and key != "RPROJ_USE_DAEMON"
+    }
+
+
+def _is_terminal(file) -> bool:
+    return hasattr(file, "isatty") and file.isatty()
+
+
+def _request(message: dict, socket_path: str = SOCKET_PATH) -> dict | None:
+    """Sends a message to the daemon, returning its reply or None if it isn't running."""
+    import socket
+
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.settimeout(CONNECT_TIMEOUT)
+        client.connect(socket_path)
+        client.settimeout(None)  # Long listings take as long as they take
+        client.sendall(json.dumps(message).encode("utf-8"))
+        client.shutdown(socket.SHUT_WR)
+        return json.loads(_receive(client))
+    except (OSError, ValueError):
+        return None  # Not running, a stale socket, or it went away mid-request
+    finally:
+        client.close()
+
+
+def forward(argv: list[str], socket_path: str = SOCKET_PATH) -> int | None:
+    """
+    Runs a command in `rproj daemon` if it's running, printing its output.\n
+    ---
+    Only the commands in `FORWARDED_COMMANDS` are forwarded, and only while the
+    daemon runs with the same `RPROJ_` environment variables, since they change
+    where the registry is and how it's read. They only read, so a command is
+    simply run again in this process if the daemon goes away mid-request.
+    This module is imported on every run, so `socket` is only imported once a
+    command is forwarded.
+    Args:
+        argv (list[str]): The command line arguments, without the program name.
+        socket_path (str): The socket of the daemon. Defaults to `SOCKET_PATH`.
+    Returns:
+        int | None: The exit code of the command, or None if it has to run in
+            this process instead.
+    """
+    command = next((arg for arg in argv if not arg.startswith("-")), None)
+    if command not in FORWARDED_COMMANDS or not get_use_daemon():
+        return None
+
+    try:
+        columns = os.get_terminal_size(sys.stdout.fileno()).columns
+    except (OSError, ValueError, AttributeError):
+        columns = None
+    reply = _request(
+        {
+            "op": "run",
+            "argv": argv,
+            "env": _rproj_env(),
+            "tty": [_is_terminal(sys.stdout), _is_terminal(sys.stderr)],
+            "columns": os.environ.get("COLUMNS") or columns,
+        },
+        socket_path,
+    )
+    if reply is None or reply.get("fallback"):
+        return None
+
+    sys.stderr.write(reply["stderr"])
+    sys.stdout.write(reply["stdout"])
+    sys.stdout.flush()
+    return reply["code"]
+
+
+def stop_daemon(socket_path: str = SOCKET_PATH) -> bool:
+    """Asks the daemon to exit, returning False if it isn't running."""
+    return _request({"op": "stop"}, socket_path) is not None
+
+
+def daemon_status(socket_path: str = SOCKET_PATH) -> dict | None:
+    """Gets the pid and project count of the daemon, or None if it isn't running."""
+    return _request({"op": "status"}, socket_path)
+
+
+def _stamp(paths: list[str]) -> list:
+    """Gets the mtime and size of each file, or None for files that can't be found."""
+    stamps = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            stamps.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            stamps.append(None)
+    return stamps
+
+
+class _Capture:
+    """
+    Collects what a command prints, standing in for stdout or stderr.\n
+    ---
+    It reports itself as a terminal when the client's stream is one, so output
+    keeps the colors and layout it would have had in the client.
+    """
+
+    def __init__(self, tty: bool):
+        self.tty = tty
+        self.parts = []
+
+    def write(self, text: str) -> int:
+        self.parts.append(text)
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def isatty(self) -> bool:
+        return self.tty
+
+    def getvalue(self) -> str:
+        return "".join(self.parts)
+
+
+class Daemon:
+    """
+    Runs forwarded commands with the projects kept in memory.\n
+    ---
+    Commands run one at a time, in this process, with their output captured and
+    sent back to the client. Before each command the registry files (projects.json,
+    the catalog, the database and the stats) are stat-ed, since every change made
+    through rproj rewrites at least one of them. The project files themselves
+    are stat-ed to catch hand edits, before a command once `POLL_INTERVAL`
+    seconds have passed since they last were, and every `POLL_INTERVAL` seconds
+    while idle. Either change drops the in-memory projects, which are then
+    loaded again from the catalog, parsing only the files that changed.
+    Attributes:
+        socket_path (str): The socket the daemon listens on.
+        running (bool): Whether to keep accepting requests.
+        last_poll (float): When the project files were last stat-ed, as
+            `time.monotonic()`.
+    """
+
+    def __init__(self, socket_path: str = SOCKET_PATH):
+        from rproj.utils.catalog import CATALOG_PATH
+        from rproj.utils.database import DATABASE_PATH
+        from rproj.utils.projects import PROJECT_DATA_PATH
+        from rproj.utils.stats import STATS_PATH
+
+        self.socket_path = socket_path
+        self.running = True
+        self.registry_files = [
+            PROJECT_DATA_PATH,
+            CATALOG_PATH,
+            DATABASE_PATH,
+            f"{DATABASE_PATH}-wal",
+            STATS_PATH,
+        ]
+        self.registry_stamp = None
+        self.project_paths: list[str] = []
+        self.project_stamp = None
+        self.last_poll = time.monotonic()
+        self.env = _rproj_env()
+
+    def refresh(self, check_projects: bool = False):
+        """
+        Loads the projects again if the registry changed.
+
+        Args:
+            check_projects (bool): Whether to also check every project file.
+                Defaults to False.
+        """
+        from rproj.utils.catalog import invalidate
+        from rproj.utils.info import get_project_index
+        from rproj.utils.stats import clear_stats_cache
+
+        registry_stamp = _stamp(self.registry_files)
+        if check_projects:
+            self.last_poll = time.monotonic()
+        if registry_stamp == self.registry_stamp and (
+            not check_projects or _stamp(self.project_paths) == self.project_stamp
+        ):
+            return
+
+        # Stamped before loading, so changes made while loading aren't missed
+        self.registry_stamp = registry_stamp
+        invalidate()
+        clear_stats_cache()
+        self.project_paths = [project.path for project in get_project_index().projects]
+        self.project_stamp = _stamp(self.project_paths)
+
+    def run_command(self, request: dict) -> dict:
+        """Runs a forwarded command, returning its output and exit code."""
+        import traceback
+        from rproj.main import run
+        from rproj.utils import console
+
+        if request.get("env") != self.env:
+            return {"fallback": True}
+        # A busy daemon never idles, so hand edits are also checked for here
+        self.refresh(check_projects=time.monotonic() - self.last_poll >= POLL_INTERVAL)
+
+        stdout, stderr = _Capture(request["tty"][0]), _Capture(request["tty"][1])
+        saved = sys.stdout, sys.stderr, os.environ.get("COLUMNS")
+        sys.stdout, sys.stderr = stdout, stderr
+        if request.get("columns"):
+            os.environ["COLUMNS"] = str(request["columns"])  # Read by rich
+        code = 0
+        try:
+            run(request["argv"])
+        except SystemExit as e:  # e.g. argparse errors and --help
+            code = e.code if isinstance(e.code, int) else int(e.code is not None)
+        except Exception:
+            traceback.print_exc()
+            code = 1
+        finally:
+            sys.stdout, sys.stderr, columns = saved
+            if columns is None:
+                os.environ.pop("COLUMNS", None)
+            else:
+                os.environ["COLUMNS"] = columns
+            console.set_output_format(None)
+        return {"stdout": stdout.getvalue(), "stderr": stderr.getvalue(), "code": code}
+
+    def handle(self, connection: "socket.socket"):
+        """Reads one request from a client and replies to it."""
+        connection.settimeout(REQUEST_TIMEOUT)
+        request = json.loads(_receive(connection))
+        op = request.get("op")
+        if op == "run":
+            reply = self.run_command(request)
+        elif op == "status":
+            reply = {"pid": os.getpid(), "projects": len(self.project_paths)}
+        elif op == "stop":
+            self.running = False
+            reply = {}
+        else:
+            reply = {"fallback": True}
+        connection.settimeout(None)
+        connection.sendall(json.dumps(reply).encode("utf-8"))
+
+    def serve(self):
+        """Listens for requests until stopped, removing the socket on exit."""
+        import signal
+        import socket
+        from rproj.utils import log
+        from rproj.utils.catalog import set_resident
+
+        set_resident(True)
+        self.refresh(check_projects=True)  # Load everything before the first request
+
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        umask = os.umask(0o177)  # Only this user may connect
+        try:
+            server.bind(self.socket_path)
+        finally:
+            os.umask(umask)
+        server.listen(16)
+        server.settimeout(POLL_INTERVAL)
+
+        def stop(*_):
+            self.running = False  # Exits after the current request, or the next timeout
+
+        signal.signal(signal.SIGTERM, stop)
+        log.info(
+            f"Daemon listening on {self.socket_path} with {len(self.project_paths)} project(s)"
+        )
+
+        try:
+            while self.running:
+                try:
+                    connection, _ = server.accept()
+                except socket.timeout:
+                    self.refresh(check_projects=True)
+                    continue
+                with connection:
+                    try:
+                        self.handle(connection)
+                    except (OSError, ValueError) as error:
+                        log.warn(f"Dropped a request: {error}")
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.close()
+            try:
+                os.remove(self.socket_path)
+            except OSError:
+                pass
+            log.info("Daemon stopped")
+
+
+def start_daemon(socket_path: str = SOCKET_PATH) -> bool:
+    """
+    Runs the daemon in this process until it's stopped.
+
+    Args:
+        socket_path (str): The socket to listen on. Defaults to `SOCKET_PATH`.
+    Returns:
+        bool: False if it can't start, e.g. because another daemon is running.
+    """
+    import socket
+    from rproj.utils import log
+
+    if not hasattr(socket, "AF_UNIX"):
+        log.err(
+            "The daemon needs Unix domain sockets, which this platform doesn't have"
+        )
+        return False
+    if daemon_status(socket_path):
+        log.err(f"A daemon is already listening on {socket_path}")
+        return False
+    if os.path.exists(socket_path):
+        os.remove(socket_path)  # Left behind by a daemon that was killed
+
+    Daemon(socket_path).serve()
+    return True
@@ -0,0 +1,514 @@
+import os
+import json
+import sqlite3
+from typing import Iterator
+from rproj.utils import log
+from rproj.utils.file import RProjFile
+from rproj.utils.search import index_keys
+from rproj.utils.config import DATA_DIR
+from rproj.utils.fs import locked
+from rproj.utils.projects import (
+    PROJECT_DATA_PATH,
+    REGISTRY_LOCK_PATH,
+    load_project_data_file,
+    read_project_paths,
+    write_project_paths,
+)
+
+DATABASE_PATH = os.path.join(DATA_DIR, "projects.db")
+SCHEMA_VERSION = 5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS projects (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    directory TEXT NOT NULL,
+    description TEXT NOT NULL DEFAULT '',
+    github TEXT NOT NULL DEFAULT '',
+    run_cmd TEXT NOT NULL DEFAULT '',
+    rproj_version TEXT NOT NULL DEFAULT '',
+    extra TEXT NOT NULL DEFAULT '{}',
+    mtime INTEGER NOT NULL DEFAULT 0,
+    size INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS projects_name ON projects (name);
+CREATE INDEX IF NOT EXISTS projects_name_nocase ON projects (name COLLATE NOCASE);
+
+CREATE TABLE IF NOT EXISTS tags (
+    project_id INTEGER NOT NULL REFERENCES projects (id) ON DELETE CASCADE,
+    tag TEXT NOT NULL,
+    position INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (project_id, tag)
+);
+CREATE INDEX IF NOT EXISTS tags_tag ON tags (tag);
+
+CREATE TABLE IF NOT EXISTS notes (
+    project_id INTEGER NOT NULL REFERENCES projects (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    note TEXT NOT NULL,
+    PRIMARY KEY (project_id, position)
+);
+
+CREATE TABLE IF NOT EXISTS postings (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    project_id INTEGER NOT NULL REFERENCES projects (id) ON DELETE CASCADE,
+    weight REAL NOT NULL,
+    PRIMARY KEY (kind, key, project_id)
+);
+CREATE INDEX IF NOT EXISTS postings_project ON postings (project_id);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# Open databases, keyed by process and path, see `Database.open`
+_databases: dict[tuple[int, str], "Database"] = {}
+
+PROJECT_COLUMNS = (
+    "id, path, name, directory, description, github, run_cmd, rproj_version, extra"
+)
+
+
+class Database:
+    """
+    Database is the SQLite storage backend for the project registry. It stores a
+    row per registered project along with its tags and notes, so lookups by name
+    or tag are indexed queries instead of a parse of every `.rproj` file.\n
+    ---
+    The `.rproj` files stay the source of truth, and projects.json stays the
+    registry, so switching backends keeps every project. Writes made through
+    rproj update the rows directly, `sync_registry` adds and removes rows when
+    projects.json changes, and `sync` re-imports any file that changed on disk.
+    It implements the same methods as `Catalog` and `ProjectIndex`, so it can
+    stand in for both when the sqlite backend is selected.
+    Attributes:
+        path (str): The path to the database file.
+        connection (sqlite3.Connection): The open database connection.
+    """
+
+    def __init__(self, path: str = DATABASE_PATH) -> None:
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("PRAGMA foreign_keys=ON")
+        self.connection.executescript(SCHEMA)
+        self._projects: list[RProjFile] = None
+        self._migrate()
+
+    def _migrate(self):
+        """Fills in tables added since the database was created."""
+        (version,) = self.connection.execute("PRAGMA user_version").fetchone()
+        if version >= SCHEMA_VERSION:
+            return
+        if version < 5:
+            self._migrate_registry()
+
+        # Version 2 added the search index, versions 3 and 4 its "text" and "tag" keys
+        for project_id, project in zip(self._ids(), self.projects):
+            self._index(project_id, project)
+        self.connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.save()
+
+    def _migrate_registry(self):
+        """
+        Version 5 keeps the order of tags, and made projects.json the registry.\n
+        ---
+        The tags of every project are read again from its file, since their order
+        was lost. Projects that were only registered in the database are added
+        to projects.json, so `sync_registry` doesn't remove them.
+        """
+        columns = {row[1] for row in self.connection.execute("PRAGMA table_info(tags)")}
+        if "position" not in columns:
+            self.connection.execute(
+                "ALTER TABLE tags ADD COLUMN position INTEGER NOT NULL DEFAULT 0"
+            )
+        for path in self.paths():
+            try:
+                self.put(RProjFile.load(path), path=path)
+            except Exception:
+                pass  # The stored row is still better than none
+
+        with locked(REGISTRY_LOCK_PATH):
+            registered = []
+            if os.path.exists(PROJECT_DATA_PATH):
+                registered = load_project_data_file()
+            known = set(registered)
+            missing = [path for path in self.paths() if path not in known]
+            if missing:
+                write_project_paths(registered + missing)
+
+    def _ids(self) -> list[int]:
+        """Returns the ids of all projects in registry order."""
+        return [
+            row[0]
+            for row in self.connection.execute("SELECT id FROM projects ORDER BY id")
+        ]
+
+    def _index(self, project_id: int, project):
+        """Replaces the search index keys of a project."""
+        self.connection.execute(
+            "DELETE FROM postings WHERE project_id = ?", (project_id,)
+        )
+        self.connection.executemany(
+            "INSERT INTO postings (kind, key, project_id, weight) VALUES (?, ?, ?, ?)",
+            [
+                (kind, key, project_id, weight)
+                for kind, keys in index_keys(project.as_dict()).items()
+                for key, weight in keys.items()
+            ],
+        )
+
+    @staticmethod
+    def open(path: str = DATABASE_PATH) -> "Database":
+        """
+        Opens the database, bringing it in line with projects.json.\n
+        ---
+        The connection is kept for the rest of the process, so the schema and
+        migrations only run on the first call of each command. It's keyed by
+        process too, since a connection can't be shared with a forked child.
+        Args:
+            path (str): The database file. Defaults to `DATABASE_PATH`.
+        Returns:
+            Database: The open database.
+        """
+        key = (os.getpid(), os.path.abspath(path))
+        database = _databases.get(key)
+        if database is None:
+            database = Database(path)
+            _databases[key] = database
+        database.sync_registry()
+        return database
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM projects").fetchone()[0]
+
+    def sync_registry(self):
+        """
+        Adds and removes rows to match projects.json, if it changed since the last sync.\n
+        ---
+        projects.json is the registry on both backends, so this picks up projects
+        added or removed with the json backend. While it's unchanged, this costs
+        a stat and a query.
+        """
+        try:
+            stat = os.stat(PROJECT_DATA_PATH)
+        except OSError:
+            return
+        stamp = f"{stat.st_ino}:{stat.st_size}:{stat.st_mtime_ns}"
+        row = self.connection.execute(
+            "SELECT value FROM meta WHERE key = 'registry_stamp'"
+        ).fetchone()
+        if row and row[0] == stamp:
+            return
+
+        # Under the lock, so the file and the rows aren't changed in between
+        with locked(REGISTRY_LOCK_PATH):
+            try:
+                project_paths = read_project_paths()
+            except (OSError, json.JSONDecodeError):
+                return  # Left for `load_project_data_file` to back up and reset
+            registered = set(project_paths)
+            stored = set(self.paths())
+            for path in stored - registered:
+                self.remove(path)
+            added = 0
+            for path in project_paths:
+                if path in stored:
+                    continue
+                try:
+                    self.put(RProjFile.load(path), path=path)
+                    added += 1
+                except Exception as e:
+                    log.warn(f"Could not import {path}: {e}")
+            self.connection.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('registry_stamp', ?)",
+                (stamp,),
+            )
+            self.save()
+
+        if added:
+            log.info(f"Imported {added} project(s) into {self.path}")
+
+    def save(self):
+        """Commits pending changes."""
+        self.connection.commit()
+        return True
+
+    def paths(self) -> list[str]:
+        """Returns the paths of all registered project files in registry order."""
+        rows = self.connection.execute("SELECT path FROM projects ORDER BY id")
+        return [row[0] for row in rows]
+
+    def get(self, path: str, stat: os.stat_result = None) -> dict | None:
+        """Returns the stored project data for the path if the file is unchanged."""
+        row = self.connection.execute(
+            f"SELECT {PROJECT_COLUMNS}, mtime, size FROM projects WHERE path = ?",
+            (path,),
+        ).fetchone()
+        if row is None:
+            return None
+
+        if stat is None:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                return None
+
+        if row[-2] != stat.st_mtime_ns or row[-1] != stat.st_size:
+            return None
+
+        return self._load_rows([row[:-2]])[0].as_dict()
+
+    def put(self, project, stat: os.stat_result = None, path: str = None):
+        """Inserts or replaces the row, tags and notes of a project."""
+        path = path or project.path
+        if stat is None:
+            stat = os.stat(path)
+
+        self.connection.execute(
+            """
+            INSERT INTO projects (path, name, directory, description, github,
+                run_cmd, rproj_version, extra, mtime, size)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (path) DO UPDATE SET
+                name = excluded.name, directory = excluded.directory,
+                description = excluded.description, github = excluded.github,
+                run_cmd = excluded.run_cmd, rproj_version = excluded.rproj_version,
+                extra = excluded.extra, mtime = excluded.mtime, size = excluded.size
+            """,
+            (
+                path,
+                project.project_name,
+                project.directory,
+                project.description,
+                project.github,
+                project.run_cmd,
+                project.rproj_version,
+                json.dumps(project.kwargs),
+                stat.st_mtime_ns,
+                stat.st_size,
+            ),
+        )
+        (project_id,) = self.connection.execute(
+            "SELECT id FROM projects WHERE path = ?", (path,)
+        ).fetchone()
+
+        self.connection.execute("DELETE FROM tags WHERE project_id = ?", (project_id,))
+        self.connection.executemany(
+            "INSERT OR IGNORE INTO tags (project_id, tag, position) VALUES (?, ?, ?)",
+            [(project_id, tag, i) for i, tag in enumerate(project.tags)],
+        )
+        self.connection.execute("DELETE FROM notes WHERE project_id = ?", (project_id,))
+        self.connection.executemany(
+            "INSERT INTO notes (project_id, position, note) VALUES (?, ?, ?)",
+            [(project_id, i, note) for i, note in enumerate(project.notes)],
+        )
+        self._index(project_id, project)
+        self._projects = None
+
+    def remove(self, path: str):
+        """Removes a project and its tags and notes."""
+        self.connection.execute("DELETE FROM projects WHERE path = ?", (path,))
+        self._projects = None
+
+    def sync(self) -> list[str]:
+        """
+        Re-imports every project file that changed since it was stored.
+
+        Returns:
+            list[str]: A description of every project that could not be synced.
+        """
+        problems = []
+        rows = self.connection.execute("SELECT path, mtime, size FROM projects")
+        for path, mtime, size in rows.fetchall():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                problems.append(f"Project file missing: {path}")
+                continue
+
+            if stat.st_mtime_ns == mtime and stat.st_size == size:
+                continue
+
+            try:
+                self.put(RProjFile.load(path), stat, path)
+            except Exception as e:
+                problems.append(f"Could not read {path}: {e}")
+
+        self.save()
+        return problems
+
+    def check(self, project_paths: list[str] = None) -> list[str]:
+        """Compares the stored rows against the project files on disk."""
+        problems = []
+        for path in project_paths or self.paths():
+            if not os.path.exists(path):
+                problems.append(f"Project file missing: {path}")
+            elif self.get(path) is None:
+                problems.append(f"Stale entry: {path}")
+        return problems
+
+    @property
+    def projects(self) -> list[RProjFile]:
+        """All projects in registry order, loaded once per process."""
+        if self._projects is None:
+            rows = self.connection.execute(
+                f"SELECT {PROJECT_COLUMNS} FROM projects ORDER BY id"
+            ).fetchall()
+            self._projects = self._load_rows(rows)
+        return self._projects
+
+    def iter_projects(self, batch_size: int = 500) -> Iterator[RProjFile]:
+        """Yields all projects in registry order, fetching them a batch at a time."""
+        cursor = self.connection.execute(
+            f"SELECT {PROJECT_COLUMNS} FROM projects ORDER BY id"
+        )
+        while rows := cursor.fetchmany(batch_size):
+            yield from self._load_rows(rows)
+
+    def find(self, name: str, exact: bool = False) -> RProjFile | None:
+        """
+        Finds a project by name, the same way as `ProjectIndex.find`.
+
+        Args:
+            name (str): The name, or the start of the name, of the project.
+            exact (bool): Only accept an exact match. Defaults to False.
+        Returns:
+            RProjFile | None: The project, or None if there is no unambiguous match.
+        """
+        queries = [("name = ?", name)]
+        if not exact:
+            escaped = name.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            queries += [
+                ("name = ? COLLATE NOCASE", name),
+                ("name LIKE ? ESCAPE '\\'", f"{escaped}%"),
+            ]
+
+        for condition, value in queries:
+            rows = self.connection.execute(
+                f"SELECT {PROJECT_COLUMNS} FROM projects WHERE {condition} LIMIT 2",
+                (value,),
+            ).fetchall()
+            if len(rows) == 1:
+                return self._load_rows(rows)[0]
+            elif rows:
+                return None  # Ambiguous
+
+        return None
+
+    def lookup(self, kind: str, keys: list[str]) -> list[tuple[str, str, float]]:
+        """Looks keys up in the search index, the same way as `Catalog.lookup`."""
+        if not keys:
+            return []
+        placeholders = ", ".join("?" for _ in keys)
+        return self.connection.execute(
+            f"""
+            SELECT key, path, weight FROM postings
+            JOIN projects ON projects.id = postings.project_id
+            WHERE kind = ? AND key IN ({placeholders})
+            """,
+            [kind, *keys],
+        ).fetchall()
+
+    def project_names(self) -> list[str]:
+        """Returns the names of all projects, the same way as `Catalog.project_names`."""
+        return [
+            row[0]
+            for row in self.connection.execute("SELECT name FROM projects ORDER BY id")
+        ]
+
+    def key_counts(self, kind: str) -> dict[str, int]:
+        """Returns the number of projects with each key of a kind, the same way as `Catalog.key_counts`."""
+        rows = self.connection.execute(
+            "SELECT key, COUNT(*) FROM postings WHERE kind = ? GROUP BY key", (kind,)
+        )
+        return dict(rows.fetchall())
+
+    def projects_at(self, paths: list[str]) -> list[RProjFile]:
+        """Returns the projects stored for the given paths, in registry order."""
+        paths = list(paths)
+        rows = []
+        for start in range(0, len(paths), 500):  # Stay below SQLite's variable limit
+            batch = paths[start : start + 500]
+            placeholders = ", ".join("?" for _ in batch)
+            rows += self.connection.execute(
+                f"SELECT {PROJECT_COLUMNS} FROM projects WHERE path IN ({placeholders})",
+                batch,
+            ).fetchall()
+        rows.sort(key=lambda row: row[0])
+        return self._load_rows(rows)
+
+    def _load_rows(self, rows: list[tuple]) -> list[RProjFile]:
+        """Builds RProjFile objects from project rows, fetching their tags and notes."""
+        if not rows:
+            return []
+
+        ids = [row[0] for row in rows]
+        tags = {project_id: [] for project_id in ids}
+        notes = {project_id: [] for project_id in ids}
+
+        # Fetch in one query when loading everything, otherwise per batch of ids
+        if len(ids) > 500:
+            tag_rows = self.connection.execute(
+                "SELECT project_id, tag FROM tags ORDER BY project_id, position"
+            )
+            note_rows = self.connection.execute(
+                "SELECT project_id, note FROM notes ORDER BY project_id, position"
+            )
+        else:
+            placeholders = ", ".join("?" for _ in ids)
+            tag_rows = self.connection.execute(
+                f"""SELECT project_id, tag FROM tags WHERE project_id IN ({placeholders})
+                ORDER BY project_id, position""",
+                ids,
+            )
+            note_rows = self.connection.execute(
+                f"""SELECT project_id, note FROM notes WHERE project_id IN ({placeholders})
+                ORDER BY project_id, position""",
+                ids,
+            )
+        for project_id, tag in tag_rows:
+            if project_id in tags:
+                tags[project_id].append(tag)
+        for project_id, note in note_rows:
+            if project_id in notes:
+                notes[project_id].append(note)
+
+        projects = []
+        for (
+            project_id,
+            path,
+            name,
+            directory,
+            description,
+            github,
+            run_cmd,
+            version,
+            extra,
+        ) in rows:
+            projects.append(
+                RProjFile(
+                    name,
+                    directory,
+                    description,
+                    github,
+                    run_cmd,
+                    notes[project_id],
+                    tags[project_id],
+                    version,
+                    **(json.loads(extra) if extra != "{}" else {}),
+                )
+            )
+        return projects
+
+
+def close_databases():
+    """Closes the databases opened by `Database.open`, so they're opened again."""
+    for database in _databases.values():
+        database.connection.close()
+    _databases.clear()
@@ -1,9 +1,32 @@
 import os
-import toml
-from rich import print
+from contextlib import contextmanager
+from rproj.utils import log
+from rproj.utils.fs import locked, write_atomic
+from rproj.utils.console import print, print_records, get_output_format, escape
 from rproj import FILE_EXTENSION, RPROJ_VERSION
+from rproj.utils.catalog import update_catalog
+from rproj.utils.config import DATA_DIR
 from rproj.utils.projects import add_project_to_projects, remove_project_from_projects
 
+# Lock files of the project files being changed, see `RProjFile.lock_path`
+LOCK_DIR = os.path.join(DATA_DIR, "locks")
+# The fields stored in a project file
+DATA_FIELDS = (
+    "project_name",
+    "description",
+    "github",
+    "run_cmd",
+    "notes",
+    "tags",
+    "rproj_version",
+    "kwargs",
+)
+
+
+def file_stamp(stat: os.stat_result) -> tuple:
+    """Identifies a version of a file, changing whenever it's replaced or written."""
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns, stat.st_ctime_ns)
+
 
 class RProjFile:
     """
@@ -32,30 +55,50 @@ class RProjFile:
         Returns:
             RRprojFile: An instance of the RProjFile class with the loaded data.
         """
+        import toml
+
         with open(path, "r") as file:
             # Check if the file exists and is not empty
             if not os.path.exists(path):
                 raise ValueError("File does not exist")
+            stat = os.fstat(file.fileno())
             data_raw = file.read()
             if data_raw == "":
                 raise ValueError("File is empty")
 
-            # Parse the TOML data and load it into a dictionary of kwargs
-            data = toml.loads(data_raw)
-            kwargs = {}
-            for key, value in data.items():
-                if isinstance(value, dict):
-                    for k, v in value.items():
-                        kwargs[k] = v
-                elif isinstance(value, list):
-                    kwargs[key] = value
-                else:
-                    kwargs[key] = value
+            # Parse the TOML data and load it into an RProjFile
+            project = RProjFile.from_dict(toml.loads(data_raw))
+            project._loaded_stamp = file_stamp(stat)
+            return project
+
+    @staticmethod
+    def from_dict(data: dict) -> "RProjFile":
+        """Creates an RProjFile object from data shaped like `as_dict`.
+
+        Args:
+            data (dict): The project data, e.g. parsed from a project file.
+
+        Raises:
+            ValueError: If the data contains no valid fields.
+
+        Returns:
+            RProjFile: An instance of the RProjFile class with the given data.
+        """
+        # Load the data into a dictionary of kwargs
+        kwargs = {}
+        for key, value in data.items():
+            if isinstance(value, dict):
+                for k, v in value.items():
+                    kwargs[k] = v
+            elif isinstance(value, list):
+                kwargs[key] = value
+            else:
+                kwargs[key] = value
 
-            if kwargs == {}:
-                raise ValueError("No valid data found")
+        if kwargs == {}:
+            raise ValueError("No valid data found")
 
-            return RProjFile(**kwargs)
+        return RProjFile(**kwargs)
 
     def __init__(
         self,
@@ -75,32 +118,125 @@ class RProjFile:
         self.description = description
         self.github = github
         self.run_cmd = run_cmd
-        self.notes = notes
-        self.tags = tags
+        self.notes = list(notes)  # Copied so the defaults are never shared
+        self.tags = list(tags)
         self.rproj_version = rproj_version
         self.kwargs = kwargs
+        self._transaction_depth = 0
+        self._changed = False
+        # Identifies the version of the file the fields were read from or written to
+        self._loaded_stamp = None
 
         # Remove "path" from kwargs if it exists
         # This is to prevent overwriting the path attribute
         if "path" in kwargs:
             del kwargs["path"]
 
-    def create(self):
-        """Creates a new project file with the specified attributes."""
-        # Load data into TOML format
-        data_str = toml.dumps(self.as_dict())
+    @property
+    def read_from_file(self) -> bool:
+        """Whether the fields were parsed from the project file, not the catalog."""
+        return self._loaded_stamp is not None
+
+    def write(self):
+        """Writes the project file with the current attributes, replacing it atomically."""
+        import toml
+
+        write_atomic(self.path, toml.dumps(self.as_dict()))
+        try:
+            self._loaded_stamp = file_stamp(os.stat(self.path))
+        except OSError:
+            self._loaded_stamp = None
+
+    @property
+    def lock_path(self) -> str:
+        """The lock file held while the project file is changed, kept out of the project directory."""
+        import hashlib
 
-        # Write to project file
-        with open(self.path, "w") as file:
-            file.write(data_str)
+        os.makedirs(LOCK_DIR, exist_ok=True)
+        name = hashlib.sha1(self.path.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(LOCK_DIR, f"{name}.lock")
 
+    def reload(self):
+        """
+        Reloads the fields from the project file, keeping them if it can't be read.\n
+        ---
+        Nothing is read if the file is still the one the fields came from in this
+        process. Every write replaces the file, so another write always changes
+        its inode or ctime even within the same mtime tick.
+        """
+        try:
+            if self._loaded_stamp and self._loaded_stamp == file_stamp(
+                os.stat(self.path)
+            ):
+                return
+            current = RProjFile.load(self.path)
+        except (OSError, ValueError):
+            return
+        for field in DATA_FIELDS:
+            setattr(self, field, getattr(current, field))
+        self._loaded_stamp = current._loaded_stamp
+
+    def save(self):
+        """Writes the project file and updates its cached copy in the catalog."""
+        with locked(self.lock_path):
+            self.write()
+            update_catalog(self)
+        self._changed = False
+
+    @contextmanager
+    def transaction(self):
+        """
+        Groups changes to the project into a single write.\n
+        ---
+        Changes made with `update_field` (and the methods that use it) inside the
+        block are written once when it ends, along with the catalog. If the block
+        raises, the changes are undone and nothing is written. Nested
+        transactions are part of the outermost one.
+        The project file is locked for the duration of the block and reloaded
+        when it starts, so concurrent rproj processes changing the same project
+        don't overwrite each other's changes.
+        Usage:
+            with project.transaction():
+                project.add_tag("a")
+                project.add_tag("b")
+        """
+        if self._transaction_depth:
+            self._transaction_depth += 1
+            try:
+                yield self
+            finally:
+                self._transaction_depth -= 1
+            return
+
+        with locked(self.lock_path):
+            self.reload()
+            saved = {
+                key: list(value) if isinstance(value, list) else value
+                for key, value in vars(self).items()
+            }
+            self._transaction_depth = 1
+            try:
+                yield self
+            except BaseException:
+                vars(self).update(saved)
+                raise
+            else:
+                if self._changed:
+                    self.save()
+            finally:
+                self._transaction_depth = 0
+
+    def create(self):
+        """Creates a new project file with the specified attributes."""
+        self.write()
         add_project_to_projects(self)  # update projects.json
 
         return True
 
     def update_field(self, field: str, value):
         """
-        Updates the value of a specified field in the object and writes the changes.
+        Updates the value of a specified field in the object and writes the
+        changes, or leaves them to the end of the current `transaction`.
 
         Args:
             field (str): The name of the attribute to update.
@@ -113,12 +249,9 @@ class RProjFile:
 
         if hasattr(self, field):
             setattr(self, field, value)
-            # Update the project file
-            data_str = toml.dumps(self.as_dict())
-
-            with open(self.path, "w") as file:
-                file.write(data_str)
-
+            self._changed = True
+            if not self._transaction_depth:
+                self.save()
             return True
         else:
             raise AttributeError(f"{field} is not a valid attribute")
@@ -144,12 +277,16 @@ class RProjFile:
             self.tags.remove(tag)
             self.update_field("tags", self.tags)
         else:
-            print(f"Tag '{tag}' not found in project tags.")
+            log.warn(f"Tag '{escape(tag)}' not found in project tags.")
 
     def print_tags(self) -> str:
         """Prints the tags of the project."""
-        if self.tags:
-            tags_str = ", ".join(self.tags)
+        if get_output_format():
+            print_records(
+                [{"info": {"project_name": self.project_name, "tags": self.tags}}]
+            )
+        elif self.tags:
+            tags_str = escape(", ".join(self.tags))
             print(f"[bright_blue]Tags:[/] {tags_str}")
         else:
             print(f"[bright_blue]Tags:[/] None")
@@ -160,7 +297,7 @@ class RProjFile:
             self.notes.append(note)
             self.update_field("notes", self.notes)
         else:
-            print(f"Note '{note}' already exists in project notes.")
+            log.warn(f"Note '{escape(note)}' already exists in project notes.")
 
     def remove_notes(self, indexes: list[int]):
         """Removes a note from the project file."""
@@ -169,55 +306,75 @@ class RProjFile:
             if index - 1 < len(self.notes):
                 self.notes[index - 1] = None  # Mark for deletion
             else:
-                print(f"Note at index {index} not found in project notes.")
+                log.warn(f"Note at index {index} not found in project notes.")
 
         new_notes = [note for note in self.notes if note is not None]
         self.update_field("notes", new_notes)
 
     def notes_as_str(self, indent: str = 0) -> str:
-        """Returns the notes of the project as a formatted string."""
+        """Returns the notes of the project as a string with markup."""
         if self.notes:
-            note_lines = [f"{' ' * indent}{i}. {note}" for i, note in enumerate(self.notes, 1)]
+            note_lines = [
+                f"{' ' * indent}{i}. {escape(note)}"
+                for i, note in enumerate(self.notes, 1)
+            ]
             return "\n".join(note_lines)
         return None
 
     def print_notes(self):
         """Prints the notes of the project."""
-        if self.notes:
+        if get_output_format():
+            print_records(
+                [{"info": {"project_name": self.project_name, "notes": self.notes}}]
+            )
+        elif self.notes:
             print(f"[bright_blue]Notes:[/]\n{self.notes_as_str()}")
         else:
             print(f"[bright_blue]Notes:[/] None")
 
     def print_details(self):
         """Prints formatted details of the project."""
+        if get_output_format():
+            print_records([self.as_dict()])
+            return
+
         lines = [
-            f"[bright_blue]Project Name:[/] {self.project_name}",
+            f"[bright_blue]Project Name:[/] {escape(self.project_name)}",
             (
-                f"[bright_blue]Description:[/] [bright_black]{self.description}[/]"
+                f"[bright_blue]Description:[/] [bright_black]{escape(self.description)}[/]"
                 if self.description
                 else ""
             ),
-            f"[bright_blue]Tags:[/] {', '.join(self.tags)}" if self.tags else "",
+            (
+                f"[bright_blue]Tags:[/] {escape(', '.join(self.tags))}"
+                if self.tags
+                else ""
+            ),
             f"[bright_blue]Notes:[/] \n{self.notes_as_str(2)}" if self.notes else "",
-            f"[bright_blue]Directory:[/] [yellow]{self.directory}[/]",
-            f"[bright_blue]GitHub:[/] {self.github}" if self.github else "",
-            f"[bright_blue]Run Command:[/] {self.run_cmd}" if self.run_cmd else "",
+            f"[bright_blue]Directory:[/] [yellow]{escape(self.directory)}[/]",
+            f"[bright_blue]GitHub:[/] {escape(self.github)}" if self.github else "",
+            (
+                f"[bright_blue]Run Command:[/] {escape(self.run_cmd)}"
+                if self.run_cmd
+                else ""
+            ),
         ]
         print("\n".join(line for line in lines if line))
 
     def list_view(self, i: int = None):
-        """Returns a formatted string for listing the projects."""
+        """Returns a string with markup for listing the projects."""
         prefix = f"{i}. " if i is not None else "- "
         empty_prefix = " " * len(prefix)
 
         details = []
         if self.description:
-            details.append(f"- [dim]{self.description}[/]")
+            details.append(f"- [dim]{escape(self.description)}[/]")
         if self.github:
-            details.append(f"\n{empty_prefix}[dim]github:[/] {self.github}")
+            details.append(f"\n{empty_prefix}[dim]github:[/] {escape(self.github)}")
         details_str = "".join(details)
 
-        return f"{prefix}[bright_blue]{self.project_name}[/] @ [yellow]{self.directory}[/] {details_str}".strip()
+        name, directory = escape(self.project_name), escape(self.directory)
+        return f"{prefix}[bright_blue]{name}[/] @ [yellow]{directory}[/] {details_str}".strip()
 
     def as_dict(self):
         """Converts the object attributes into a dictionary format."""
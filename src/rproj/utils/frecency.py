@@ -0,0 +1,158 @@
+import os
+import json
+import time
+from rproj.utils.config import DATA_DIR
+from rproj.utils.fs import locked, write_atomic
+
+# Bumped whenever the score table format changes, so old tables get rebuilt
+FRECENCY_VERSION = 1
+# One "<unix time>\t<project directory>" line per project opened, appended to
+ACCESS_LOG_PATH = os.path.join(DATA_DIR, "access.log")
+# The rank and last access of every project, folded from the log, keyed by directory
+FRECENCY_PATH = os.path.join(DATA_DIR, "frecency.json")
+FRECENCY_LOCK_PATH = f"{FRECENCY_PATH}.lock"
+# The log is folded into the table once it grows past this many bytes
+COMPACT_SIZE = 64 * 1024
+# Once the ranks add up to more than this, they're scaled down and the projects
+# that fall below 1 are forgotten, so old habits fade out
+MAX_TOTAL_RANK = 10_000
+# Score multipliers by seconds since the last access, checked in order
+RECENCY_WEIGHTS = [
+    (60 * 60, 4.0),
+    (24 * 60 * 60, 2.0),
+    (7 * 24 * 60 * 60, 0.5),
+]
+OLD_WEIGHT = 0.25
+
+
+def record_access(directory: str):
+    """
+    Logs that a project was opened, folding the log into the score table once
+    it's grown past `COMPACT_SIZE`.\n
+    ---
+    A line is only appended, so opening a project costs one small write. Failing
+    to log never stops the project from opening.
+    Args:
+        directory (str): The project directory.
+    """
+    if "\n" in directory:
+        return
+    try:
+        with locked(FRECENCY_LOCK_PATH):
+            with open(ACCESS_LOG_PATH, "a") as file:
+                file.write(f"{int(time.time())}\t{directory}\n")
+                size = file.tell()
+            if size > COMPACT_SIZE:
+                compact()
+    except OSError:
+        pass
+
+
+def _read_table() -> dict[str, list]:
+    """Reads the score table, as [rank, last access] by directory."""
+    try:
+        with open(FRECENCY_PATH, "r") as file:
+            data = json.loads(file.read())
+        if data.get("version") == FRECENCY_VERSION:
+            return data["projects"]
+    except (OSError, json.JSONDecodeError, KeyError, AttributeError):
+        pass
+    return {}
+
+
+def _fold_log(table: dict[str, list]) -> dict[str, list]:
+    """Adds the accesses in the log to a score table, ageing the ranks if they grew too large."""
+    try:
+        with open(ACCESS_LOG_PATH, "r") as file:
+            lines = file.read().splitlines()
+    except OSError:
+        return table
+
+    for line in lines:
+        accessed, _, directory = line.partition("\t")
+        try:
+            accessed = int(accessed)
+        except ValueError:
+            continue  # A line cut short by a crash
+        entry = table.setdefault(directory, [0, accessed])
+        entry[0] += 1
+        entry[1] = max(entry[1], accessed)
+
+    total = sum(rank for rank, _ in table.values())
+    if total > MAX_TOTAL_RANK:
+        factor = 0.9 * MAX_TOTAL_RANK / total
+        table = {
+            directory: [rank * factor, accessed]
+            for directory, (rank, accessed) in table.items()
+            if rank * factor >= 1
+        }
+    return table
+
+
+def compact():
+    """Folds the access log into the score table and empties the log."""
+    with locked(FRECENCY_LOCK_PATH):
+        table = _fold_log(_read_table())
+        data = {"version": FRECENCY_VERSION, "projects": table}
+        write_atomic(
+            FRECENCY_PATH, json.dumps(data, separators=(",", ":")), durable=False
+        )
+        open(ACCESS_LOG_PATH, "w").close()
+
+
+def frecency(rank: float, accessed: float, now: float) -> float:
+    """Scores a project by how often it was opened, weighted by how recently."""
+    age = now - accessed
+    for limit, weight in RECENCY_WEIGHTS:
+        if age < limit:
+            return rank * weight
+    return rank * OLD_WEIGHT
+
+
+def load_scores() -> dict[str, float]:
+    """
+    Scores every project that was opened, like zoxide does.\n
+    ---
+    The table already holds the rank of each project, so only the accesses
+    logged since it was last compacted are added, and the log never holds more
+    than `COMPACT_SIZE` bytes of them.
+    Returns:
+        dict[str, float]: The score of each project, keyed by directory.
+    """
+    now = time.time()
+    return {
+        directory: frecency(rank, accessed, now)
+        for directory, (rank, accessed) in _fold_log(_read_table()).items()
+    }
+
+
+def jump_target(query: str):
+    """
+    Finds the project a query most likely means.\n
+    ---
+    A project matches when every word of the query is found in its name or
+    directory, ignoring case. The match with the highest score wins, then one
+    whose name starts with the query, then the shortest name.
+    Args:
+        query (str): The words to look for.
+    Returns:
+        RProjFile | None: The project, or None if none matched.
+    """
+    from rproj.utils.info import iter_projects
+
+    words = query.casefold().split()
+    scores = load_scores()
+    best, best_key = None, None
+    for project in iter_projects():
+        name = project.project_name.casefold()
+        haystack = f"{name}\n{project.directory.casefold()}"
+        if not all(word in haystack for word in words):
+            continue
+        key = (
+            scores.get(project.directory, 0),
+            bool(words) and name.startswith(words[0]),
+            -len(name),
+        )
+        if best_key is None or key > best_key:
+            best, best_key = project, key
+    return best
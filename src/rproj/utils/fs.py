@@ -0,0 +1,103 @@
+import os
+import threading
+from contextlib import contextmanager
+
+# How many times each lock file is held by each thread, so locks can nest
+_held: dict[tuple[int, str], int] = {}
+
+
+def write_atomic(path: str, text: str, durable: bool = True):
+    """
+    Writes a text file through a temporary file that replaces it, so readers and
+    crashes never leave half of it behind.
+
+    Args:
+        path (str): The file to write.
+        text (str): The new contents of the file.
+        durable (bool): Whether to flush the contents to disk before replacing the
+            file. Caches that can be rebuilt skip this. Defaults to True.
+    """
+    # Unique per thread, so concurrent writers never share a temporary file
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_path, "w") as file:
+            file.write(text)
+            if durable:
+                file.flush()
+                os.fsync(file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _lock(file):
+    """Blocks until the process holds an exclusive lock on the open file."""
+    if os.name == "nt":
+        import msvcrt
+
+        file.seek(0)
+        while True:
+            try:
+                # Retries for about 10 seconds before raising
+                msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                continue
+    else:
+        import fcntl
+
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+
+
+def _unlock(file):
+    """Releases the lock taken by `_lock`."""
+    if os.name == "nt":
+        import msvcrt
+
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+    else:
+        import fcntl
+
+        fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+
+
+@contextmanager
+def locked(lock_path: str):
+    """
+    Holds an exclusive advisory lock on a lock file for the duration of the block.\n
+    ---
+    Other rproj processes taking the same lock wait until it is released, which
+    makes read-modify-write cycles on shared files safe. The lock uses `flock`,
+    or `msvcrt.locking` on Windows, and is released by the OS if the process
+    dies. Taking a lock the thread already holds doesn't block, while other
+    threads wait for it like other processes do.
+    Args:
+        lock_path (str): The lock file, which is created if needed.
+    Usage:
+        with locked(f"{PROJECT_DATA_PATH}.lock"):
+            ...
+    """
+    key = (threading.get_ident(), os.path.abspath(lock_path))
+    if _held.get(key):
+        _held[key] += 1
+        try:
+            yield
+        finally:
+            _held[key] -= 1
+        return
+
+    # Each thread opens the file itself, and flock doesn't let two open files
+    # hold the lock at once
+    with open(key[1], "a+") as file:
+        _lock(file)
+        _held[key] = 1
+        try:
+            yield
+        finally:
+            del _held[key]
+            _unlock(file)
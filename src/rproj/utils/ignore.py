@@ -0,0 +1,211 @@
+import os
+import re
+
+GITIGNORE = ".gitignore"
+
+
+def translate_pattern(pattern: str) -> str:
+    """
+    Translates the glob part of a gitignore pattern into a regex.\n
+    ---
+    `*` and `?` don't match `/`, while `**` matches any number of directories
+    when it makes up a whole path component, e.g. "**/build", "logs/**" or
+    "a/**/b". A backslash escapes the next character.
+    Args:
+        pattern (str): The pattern, without its leading `!`, `/` and trailing `/`.
+    Returns:
+        str: The regex, without any capturing groups.
+    """
+    out = []
+    i, n = 0, len(pattern)
+    while i < n:
+        at_start = i == 0 or pattern[i - 1] == "/"
+        if at_start and pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif at_start and pattern[i:] == "**":
+            out.append(".*")
+            i += 2
+        elif pattern[i] == "*":
+            out.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            out.append("[^/]")
+            i += 1
+        elif pattern[i] == "[":
+            # A "]" right after "[" or "[!" is part of the class
+            j = i + 2 if pattern.startswith("[!", i) else i + 1
+            j = pattern.find("]", j + 1 if pattern[j : j + 1] == "]" else j)
+            if j == -1:
+                out.append(re.escape("["))
+                i += 1
+                continue
+            content = pattern[i + 1 : j].replace("\\", "\\\\")
+            if content.startswith("!"):
+                content = "^" + content[1:]
+            out.append(f"[{content}]")
+            i = j + 1
+        elif pattern[i] == "\\" and i + 1 < n:
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            out.append(re.escape(pattern[i]))
+            i += 1
+    return "".join(out)
+
+
+def compile_rule(line: str, base: str = "") -> tuple[str, bool, bool] | None:
+    """
+    Compiles one line of a .gitignore file.\n
+    ---
+    Patterns containing a `/` (apart from a trailing one) are relative to the
+    directory of the .gitignore file, other patterns match at any depth below it.
+    Args:
+        line (str): The line of the .gitignore file.
+        base (str): The directory of the .gitignore file relative to the root,
+            using `/` and ending with one, or "" for the root.
+    Returns:
+        tuple[str, bool, bool] | None: The regex matching paths relative to the
+            root, whether the rule is negated and whether it only matches
+            directories, or None for blank lines and comments.
+    """
+    line = line.rstrip("\n")
+    if line.endswith(" ") and not line.endswith("\\ "):
+        line = line.rstrip(" ")
+    if not line or line.startswith("#"):
+        return None
+
+    negated = line.startswith("!")
+    if negated or line.startswith("\\!") or line.startswith("\\#"):
+        line = line[1:]
+    dir_only = line.endswith("/")
+    line = line.rstrip("/")
+    if not line:
+        return None
+
+    anchored = "/" in line
+    pattern = translate_pattern(line.lstrip("/"))
+    return (
+        re.escape(base) + ("" if anchored else "(?:.*/)?") + pattern,
+        negated,
+        dir_only,
+    )
+
+
+def read_gitignore(path: str, base: str = "") -> list[tuple[str, bool, bool]]:
+    """Reads and compiles the rules of a .gitignore file, or none if it can't be read."""
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            rules = [compile_rule(line, base) for line in f]
+    except OSError:
+        return []
+    return [rule for rule in rules if rule]
+
+
+class IgnoreMatcher:
+    """
+    Decides which entries of a directory tree are ignored.\n
+    ---
+    The rules that apply in a directory are those of the .gitignore files in it
+    and its parents, followed by the `--ignore` overrides, and the last rule that
+    matches a path decides whether it is ignored. All of them are compiled into a
+    single regex, with the rules in reverse order so the first alternative that
+    matches is the one that decides. Directories without a .gitignore share the
+    matcher of their parent, so the regex is only compiled once per .gitignore.
+    Attributes:
+        rules (tuple): The gitignore rules, as returned by `compile_rule`.
+        overrides (tuple): Rules that take precedence over every .gitignore.
+        name_pattern (re.Pattern): A regex searched for in entry names, for
+            `--ignore` patterns given with `--use-regex`.
+    """
+
+    def __init__(
+        self, rules: tuple = (), overrides: tuple = (), name_pattern: re.Pattern = None
+    ):
+        self.rules = rules
+        self.overrides = overrides
+        self.name_pattern = name_pattern
+
+        ordered = list(reversed(rules + overrides))
+        self.dir_regex, self.dir_negated = self._combine(ordered)
+        self.file_regex, self.file_negated = self._combine(
+            [rule for rule in ordered if not rule[2]]
+        )
+
+    @staticmethod
+    def _combine(rules: list) -> tuple[re.Pattern | None, list[bool]]:
+        """Combines rules into one regex with a group per rule, and the negation of each group."""
+        if not rules:
+            return None, []
+        regex = re.compile("|".join(f"({pattern})" for pattern, _, _ in rules), re.S)
+        return regex, [None] + [negated for _, negated, _ in rules]
+
+    @staticmethod
+    def for_project(
+        patterns: list[str] = None, use_regex: bool = False
+    ) -> "IgnoreMatcher":
+        """
+        Creates the matcher for the root of a project.
+
+        Args:
+            patterns (list[str], optional): Extra gitignore style patterns, or
+                regexes searched for in entry names with `use_regex`.
+            use_regex (bool): Whether the patterns are regexes.
+        Returns:
+            IgnoreMatcher: The matcher, which always ignores `.git` directories.
+        """
+        patterns = list(patterns or [])
+        name_pattern = None
+        if use_regex and patterns:
+            name_pattern = re.compile(
+                "|".join(f"(?:{pattern})" for pattern in patterns)
+            )
+            patterns = []
+        overrides = [compile_rule(pattern) for pattern in patterns + [".git/"]]
+        return IgnoreMatcher(
+            (), tuple(rule for rule in overrides if rule), name_pattern
+        )
+
+    def for_directory(self, directory: str, relpath: str, names) -> "IgnoreMatcher":
+        """
+        Returns the matcher for the entries of a directory.
+
+        Args:
+            directory (str): The directory.
+            relpath (str): The directory relative to the root, using `/` and
+                ending with one, or "" for the root.
+            names: The names of the entries in the directory.
+        Returns:
+            IgnoreMatcher: This matcher, or a new one if the directory has a .gitignore.
+        """
+        if GITIGNORE not in names:
+            return self
+        rules = read_gitignore(os.path.join(directory, GITIGNORE), relpath)
+        if not rules:
+            return self
+        return IgnoreMatcher(
+            self.rules + tuple(rules), self.overrides, self.name_pattern
+        )
+
+    def is_ignored(self, relpath: str, name: str, is_dir: bool) -> bool:
+        """
+        Checks if an entry is ignored.
+
+        Args:
+            relpath (str): The path of the entry relative to the root, using `/`.
+            name (str): The name of the entry.
+            is_dir (bool): Whether the entry is a directory.
+        Returns:
+            bool: True if the entry is ignored.
+        """
+        if self.name_pattern and self.name_pattern.search(name):
+            return True
+        regex, negated = (
+            (self.dir_regex, self.dir_negated)
+            if is_dir
+            else (self.file_regex, self.file_negated)
+        )
+        if regex is None:
+            return False
+        match = regex.fullmatch(relpath)
+        return bool(match) and not negated[match.lastindex]
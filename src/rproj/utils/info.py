@@ -1,42 +1,388 @@
-import json
-from rich import print
+import os
+import heapq
+from bisect import bisect_left
+from itertools import islice
+from typing import Iterable, Iterator
+from rproj.utils import log
+from rproj.utils.console import print, print_records, get_output_format, escape
 from rproj.utils.file import RProjFile
-from rproj.utils.projects import PROJECT_DATA_PATH
+from rproj.utils.config import get_backend, get_workers
+from rproj.utils.tags import parse_tag_args, evaluate_tag_query, tags_match_query
+from rproj.utils.search import fuzzy_search, similarity, text_search
+from rproj.utils.catalog import Catalog, get_generation, is_resident, open_catalog
+from rproj.utils.projects import load_project_paths
+
+# Number of project files handed to the loader at once when streaming
+LOAD_CHUNK_SIZE = 256
+# Number of lines printed with a single write when listing projects
+LIST_BATCH_SIZE = 200
 
 
 def load_projects():
-    """Load all projects from the projects.json file"""
-    with open(PROJECT_DATA_PATH, "r") as file:
-        project_paths = json.loads(file.read())
+    """Load all projects, parsing only the project files the catalog can't serve"""
+    if get_backend() == "sqlite":
+        from rproj.utils.database import Database
+
+        return Database.open().projects
+
+    return list(_read_projects())
+
+
+def iter_projects() -> Iterator[RProjFile]:
+    """Yield all projects in registry order, loading them a chunk at a time"""
+    if is_resident():
+        return iter(get_project_index().projects)  # Already in memory
+    return _read_projects()
+
+
+def _read_projects() -> Iterator[RProjFile]:
+    """Yield all projects in registry order from disk, loading them a chunk at a time"""
+    if get_backend() == "sqlite":
+        from rproj.utils.database import Database
+
+        yield from Database.open().iter_projects()
+        return
+
+    project_paths = load_project_paths()
+    catalog = Catalog.open()
+    try:
+        for start in range(0, len(project_paths), LOAD_CHUNK_SIZE):
+            chunk = project_paths[start : start + LOAD_CHUNK_SIZE]
+            projects, unreadable = load_project_files(chunk, catalog)
+            for path, error in unreadable:
+                log.warn(f"Could not load {escape(path)}: {error}")
+            yield from projects
+    finally:
+        catalog.save()
 
-    projects: list[RProjFile] = []
-    for path in project_paths:
+
+def load_project_files(
+    project_paths: list[str], catalog: Catalog, workers: int = None
+) -> tuple[list[RProjFile], list[tuple[str, Exception]]]:
+    """
+    Load the projects at the given paths, keeping their order.\n
+    ---
+    Projects are served from the catalog when their file hasn't changed. The rest
+    are read and parsed on a thread pool, since on network filesystems the cost is
+    in waiting for each open, and then stored in the catalog.
+    Args:
+        project_paths (list[str]): The paths of the project files.
+        catalog (Catalog): The catalog to read from and update.
+        workers (int, optional): The size of the thread pool. Defaults to the
+            `workers` config value.
+    Returns:
+        tuple: The loaded projects, and a (path, error) pair for each project
+            that could not be loaded.
+    """
+    workers = workers or get_workers()
+    projects: list[RProjFile] = [None] * len(project_paths)
+    unreadable: list[tuple[str, Exception]] = []
+
+    misses = []
+    for i, path in enumerate(project_paths):
         try:
-            project = RProjFile.load(path)
-            projects.append(project)
-        except Exception as e:
+            stat = os.stat(path)
+        except OSError as e:
+            unreadable.append((path, e))
             continue
 
-    return projects
+        data = catalog.get(path, stat)
+        if data is not None:
+            projects[i] = RProjFile.from_dict(data)
+        else:
+            misses.append((i, path, stat))
 
+    def load(miss: tuple[int, str, os.stat_result]):
+        try:
+            return RProjFile.load(miss[1])
+        except Exception as e:
+            return e
 
-def list_projects(tags: list[str] = None):
-    """List all projects in the projects.json file"""
-    projects = load_projects()
-    for i, project in enumerate(projects, start=1):
-        if tags and not any(tag in project.tags for tag in tags):
-            continue
-        print(project.list_view(i))
+    if len(misses) > 1 and workers > 1:
+        from concurrent.futures import ThreadPoolExecutor
 
+        with ThreadPoolExecutor(max_workers=min(workers, len(misses))) as executor:
+            results = list(executor.map(load, misses))
+    else:
+        results = [load(miss) for miss in misses]
 
-def search_project(name: str = None):
-    """Search for a project by name"""
-    if not name:
-        raise ValueError("Please provide a name to search for")
+    for (i, path, stat), result in zip(misses, results):
+        if isinstance(result, Exception):
+            unreadable.append((path, result))
+        else:
+            projects[i] = result
+            catalog.put(result, stat, path)
 
-    projects = load_projects()
-    for project in projects:
-        if name == project.project_name:
+    return [project for project in projects if project is not None], unreadable
+
+
+class ProjectIndex:
+    """
+    ProjectIndex maps project names to their loaded projects so lookups don't
+    need to scan the whole registry.\n
+    ---
+    Besides exact names it supports case-insensitive and unique-prefix lookups,
+    using a sorted list of case-folded names that is searched with bisect.
+    Attributes:
+        projects (list[RProjFile]): The projects in registry order.
+        by_name (dict): Projects keyed by their exact name.
+        by_path (dict): Projects keyed by the path of their project file.
+        by_folded_name (dict): Lists of projects keyed by their case-folded name.
+        folded_names (list[str]): The sorted case-folded names.
+    """
+
+    def __init__(self, projects: list[RProjFile]) -> None:
+        self.projects = projects
+        self.by_name: dict[str, RProjFile] = {}
+        self.by_path: dict[str, RProjFile] = {}
+        self.by_folded_name: dict[str, list[RProjFile]] = {}
+        for project in projects:
+            self.by_name.setdefault(project.project_name, project)
+            self.by_path[project.path] = project
+            folded = project.project_name.casefold()
+            self.by_folded_name.setdefault(folded, []).append(project)
+        self.folded_names = sorted(self.by_folded_name)
+
+    def find(self, name: str, exact: bool = False) -> RProjFile | None:
+        """
+        Finds a project by name.\n
+        ---
+        Tries an exact match first, then a case-insensitive match, then a
+        case-insensitive prefix that matches exactly one project.
+        Args:
+            name (str): The name, or the start of the name, of the project.
+            exact (bool): Only accept an exact match. Defaults to False.
+        Returns:
+            RProjFile | None: The project, or None if there is no unambiguous match.
+        """
+        project = self.by_name.get(name)
+        if project or exact:
             return project
 
-    return False
+        folded = name.casefold()
+        matches = self.by_folded_name.get(folded, [])
+        if len(matches) == 1:
+            return matches[0]
+        elif matches:
+            return None  # Ambiguous, only differs by case
+
+        start = bisect_left(self.folded_names, folded)
+        prefixed = []
+        for folded_name in self.folded_names[start : start + 2]:
+            if folded_name.startswith(folded):
+                prefixed.extend(self.by_folded_name[folded_name])
+        return prefixed[0] if len(prefixed) == 1 else None
+
+    def projects_at(self, paths: list[str]) -> list[RProjFile]:
+        """Returns the projects with the given project file paths, in registry order."""
+        paths = set(paths)
+        return [project for project in self.projects if project.path in paths]
+
+
+_project_index: ProjectIndex = None
+_project_index_generation = -1
+
+
+def get_project_index() -> ProjectIndex:
+    """Get the project index, building it once per process and whenever the catalog changes"""
+    global _project_index, _project_index_generation
+    generation = get_generation()
+    if get_backend() == "sqlite":
+        from rproj.utils.database import Database
+
+        if (
+            not isinstance(_project_index, Database)
+            or _project_index_generation != generation
+        ):
+            _project_index = Database.open()  # Lookups are indexed queries
+            _project_index_generation = generation
+        return _project_index
+
+    if _project_index is None or _project_index_generation != generation:
+        _project_index = ProjectIndex(load_projects())
+        _project_index_generation = generation
+    return _project_index
+
+
+def filter_by_tags(
+    projects: Iterable[RProjFile], tags: list[str]
+) -> Iterator[RProjFile]:
+    """
+    Filter projects by tag queries using the tag index.\n
+    ---
+    The index is read before `projects` is consumed, so a project whose file
+    changed since it was cataloged is only parsed again afterwards. Those are
+    checked against the tags they were just parsed with instead.
+    Args:
+        projects (Iterable[RProjFile]): The projects to filter.
+        tags (list[str]): Tag queries, see `parse_tag_args`.
+    Raises:
+        ValueError: If a query is not valid.
+    Returns:
+        Iterator[RProjFile]: The matching projects.
+    """
+    query = parse_tag_args(tags)
+    catalog = open_catalog()
+    paths = evaluate_tag_query(query, catalog, load_project_paths)
+    catalog.save()  # In case the search index had to be rebuilt
+    return (
+        project
+        for project in projects
+        if (
+            tags_match_query(query, project.tags)
+            if project.read_from_file
+            else project.path in paths
+        )
+    )
+
+
+def list_projects(
+    tags: list[str] = None,
+    sort: str = None,
+    limit: int = None,
+    offset: int = 0,
+    lang: str = None,
+):
+    """
+    List all projects, or the projects matching the tag query.\n
+    ---
+    Projects are streamed from the registry and printed in batches, so output
+    starts right away and memory use doesn't grow with the registry. Sorting needs
+    to see every project, but with a limit only the first `offset + limit` are kept.
+    Sorting by size and filtering by language use the figures cached by `rproj stats`,
+    and sorting by frecency the projects opened through rproj (see `rproj jump`).
+    Args:
+        tags (list[str], optional): Tag queries, see `parse_tag_args`.
+        sort (str, optional): "name", "directory", "modified" (most recent first)
+            "size" (largest first) or "frecency" (most used first).
+        limit (int, optional): The maximum number of projects to print.
+        offset (int): The number of projects to skip. Defaults to 0.
+        lang (str, optional): Only list projects with code in this language.
+    """
+    projects = iter_projects()
+    if tags:
+        try:
+            projects = filter_by_tags(projects, tags)
+        except ValueError as e:
+            log.err(e)
+            return
+    if lang:
+        projects = (project for project in projects if uses_language(project, lang))
+
+    if sort:
+        key = frecency_key() if sort == "frecency" else SORT_KEYS[sort]
+        if limit is not None:
+            projects = heapq.nsmallest(offset + limit, projects, key=key)
+        else:
+            projects = sorted(projects, key=key)
+
+    stop = offset + limit if limit is not None else None
+    if get_output_format():
+        print_records(project.as_dict() for project in islice(projects, offset, stop))
+        return
+
+    batch = []
+    for i, project in enumerate(islice(projects, offset, stop), start=offset + 1):
+        batch.append(project.list_view(i))
+        if len(batch) >= LIST_BATCH_SIZE:
+            print("\n".join(batch))
+            batch = []
+    if batch:
+        print("\n".join(batch))
+
+
+def frecency_key():
+    """Get a sort key putting the most used projects first, scoring them all once"""
+    from rproj.utils.frecency import load_scores
+
+    scores = load_scores()
+    return lambda project: -scores.get(project.directory, 0)
+
+
+def modified_time(project: RProjFile) -> float:
+    """Get when the project file was last modified, or 0 if it can't be read"""
+    try:
+        return os.stat(project.path).st_mtime
+    except OSError:
+        return 0
+
+
+def project_size(project: RProjFile) -> int:
+    """Get the size of the project from the cached stats, or -1 if there are none"""
+    from rproj.utils.stats import get_stats
+
+    summary = get_stats(project.directory)
+    return summary["bytes"] if summary else -1
+
+
+def uses_language(project: RProjFile, lang: str) -> bool:
+    """Check if the cached stats of the project have files in the language, ignoring case"""
+    from rproj.utils.stats import get_stats
+
+    summary = get_stats(project.directory)
+    lang = lang.casefold()
+    return bool(summary) and any(
+        language.casefold() == lang for language in summary["languages"]
+    )
+
+
+SORT_KEYS = {
+    "name": lambda project: project.project_name.casefold(),
+    "directory": lambda project: project.directory,
+    "modified": lambda project: -modified_time(project),
+    "size": lambda project: -project_size(project),
+}
+
+
+def print_tag_stats():
+    """Print how many projects have each tag, most used first"""
+    get_project_index()  # Brings the catalog up to date
+    catalog = open_catalog()
+    counts = catalog.key_counts("tag")
+    catalog.save()
+
+    ranked = sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+    if get_output_format():
+        print_records({"tag": tag, "count": count} for tag, count in ranked)
+        return
+
+    if not counts:
+        print("[bright_blue]Tags:[/] None")
+        return
+
+    width = max(len(tag) for tag in counts)
+    for tag, count in ranked:
+        print(f"[bright_blue]{escape(tag.ljust(width))}[/] {count}")
+
+
+def fuzzy_search_projects(query: str, limit: int = 5) -> list[tuple[float, RProjFile]]:
+    """Rank projects by how closely their name or directory matches the query"""
+    index = get_project_index()  # Also brings the catalog up to date
+    catalog = open_catalog()
+    candidates = fuzzy_search(catalog, query)
+    catalog.save()  # In case the search index had to be rebuilt
+
+    projects = index.projects_at([path for _, path in candidates])
+    results = [(similarity(query, project), project) for project in projects]
+    results.sort(key=lambda result: (-result[0], result[1].project_name))
+    return results[:limit]
+
+
+def text_search_projects(query: str, limit: int = 20) -> list[tuple[float, RProjFile]]:
+    """Rank projects whose name, tags, description and notes contain every word of the query"""
+    index = get_project_index()  # Also brings the catalog up to date
+    catalog = open_catalog()
+    results = text_search(catalog, query, limit)
+    catalog.save()  # In case the search index had to be rebuilt
+
+    projects = index.projects_at([path for _, path in results])
+    by_path = {project.path: project for project in projects}
+    return [(score, by_path[path]) for score, path in results if path in by_path]
+
+
+def search_project(name: str = None, exact: bool = False):
+    """Search for a project by name, or by a unique prefix of it unless `exact` is set"""
+    if not name:
+        raise ValueError("Please provide a name to search for")
+
+    return get_project_index().find(name, exact) or False
@@ -1,4 +1,5 @@
-from rich import print
+import sys
+from rproj.utils.console import print, get_output_format
 
 ERR_PFX = "[red]ERR:[/red]"
 INFO_PFX = "[green]INFO:[/green]"
@@ -6,12 +7,16 @@ WARN_PFX = "[yellow]WARN:[/yellow]"
 
 
 def err(msg, *args, **kwargs):
+    kwargs.setdefault("file", sys.stderr)
     print(f"{ERR_PFX} {msg}", *args, **kwargs)
 
 
 def info(msg, *args, **kwargs):
+    if get_output_format():  # Keep stdout for the machine-readable output
+        kwargs.setdefault("file", sys.stderr)
     print(f"{INFO_PFX} {msg}", *args, **kwargs)
 
 
 def warn(msg, *args, **kwargs):
+    kwargs.setdefault("file", sys.stderr)
     print(f"{WARN_PFX} {msg}", *args, **kwargs)
@@ -0,0 +1,269 @@
+import os
+import sys
+import heapq
+from rproj.utils.file import RProjFile
+
+# The most projects shown below the prompt
+PICKER_HEIGHT = 10
+# Scores of a query word found in each field, lower ranks first
+NAME_PREFIX_SCORE = 0
+NAME_SCORE = 1
+TAG_SCORE = 2
+DESCRIPTION_SCORE = 4
+REVERSE = "\x1b[7m"
+DIM = "\x1b[2m"
+RESET = "\x1b[0m"
+
+
+class ProjectFilter:
+    """
+    Filters and ranks projects by a query, reusing the matches of earlier queries.\n
+    ---
+    A project matches when every word of the query is found in its name, tags
+    or description, ignoring case. Typing a character only narrows the query,
+    so it's matched against the projects that matched before it instead of the
+    whole registry, and the matches of each shorter query are kept so deleting
+    a character costs nothing. Only the projects that are shown get ranked.
+    Attributes:
+        projects (list[RProjFile]): The projects to pick from.
+        names (list[str]): The case-folded name of each project.
+        tags (list[str]): The case-folded tags of each project, one per line.
+        haystacks (list[str]): The case-folded name, tags and description of
+            each project on separate lines, so a word is looked for in all three
+            with a single search.
+    """
+
+    def __init__(self, projects: list[RProjFile]):
+        self.projects = projects
+        self.names = [project.project_name.casefold() for project in projects]
+        self.tags = ["\n".join(project.tags).casefold() for project in projects]
+        self.haystacks = [
+            f"{name}\n{tags}\n{(project.description or '').casefold()}"
+            for project, name, tags in zip(projects, self.names, self.tags)
+        ]
+        self._matches: dict[str, list[int]] = {"": list(range(len(projects)))}
+
+    def matches(self, query: str) -> list[int]:
+        """
+        Finds the projects matching a query.
+
+        Args:
+            query (str): The words to look for.
+        Returns:
+            list[int]: The indexes of the matching projects, in registry order.
+        """
+        query = query.casefold()
+        if query in self._matches:
+            return self._matches[query]
+
+        # Start from the longest query typed before this one
+        length = len(query) - 1
+        while query[:length] not in self._matches:
+            length -= 1
+        candidates = self._matches[query[:length]]
+        # Keep only the shorter queries, for when characters are deleted
+        self._matches = {
+            typed: matches
+            for typed, matches in self._matches.items()
+            if query.startswith(typed)
+        }
+
+        haystacks = self.haystacks
+        matches = candidates
+        for word in query.split():
+            matches = [i for i in matches if word in haystacks[i]]
+        self._matches[query] = matches
+        return matches
+
+    def score(self, i: int, words: list[str]) -> tuple:
+        """Ranks a matching project, by where the words were found and then by name length."""
+        name, tags = self.names[i], self.tags[i]
+        total = 0
+        for word in words:
+            if name.startswith(word):
+                total += NAME_PREFIX_SCORE
+            elif word in name:
+                total += NAME_SCORE
+            elif word in tags:
+                total += TAG_SCORE
+            else:
+                total += DESCRIPTION_SCORE
+        return total, len(name), i
+
+    def rank(
+        self, query: str, limit: int = PICKER_HEIGHT
+    ) -> tuple[list[RProjFile], int]:
+        """
+        Gets the best matches of a query.
+
+        Args:
+            query (str): The words to look for.
+            limit (int): The number of projects to return. Defaults to PICKER_HEIGHT.
+        Returns:
+            tuple[list[RProjFile], int]: The best matches, best first, and the
+                number of projects that matched.
+        """
+        matches = self.matches(query)
+        words = query.casefold().split()
+        if not words:
+            return [self.projects[i] for i in matches[:limit]], len(matches)
+
+        candidates = matches
+        key = lambda i: self.score(i, words)
+        if len(words) == 1:
+            # Names starting with the word rank first, so when enough of them
+            # match the rest don't need to be scored
+            names = self.names
+            prefixed = [i for i in matches if names[i].startswith(words[0])]
+            if len(prefixed) >= limit:
+                candidates, key = prefixed, lambda i: len(names[i])
+        best = heapq.nsmallest(limit, candidates, key=key)
+        return [self.projects[i] for i in best], len(matches)
+
+
+def render(
+    query: str,
+    shown: list[RProjFile],
+    count: int,
+    total: int,
+    selected: int,
+    width: int,
+) -> str:
+    """
+    Draws the prompt and the shown projects, leaving the cursor after the query.
+
+    Args:
+        query (str): The query typed so far.
+        shown (list[RProjFile]): The projects to show, best first.
+        count (int): The number of projects matching the query.
+        total (int): The number of projects.
+        selected (int): The index of the highlighted project in `shown`.
+        width (int): The width of the terminal.
+    Returns:
+        str: The text to write to the terminal.
+    """
+    prompt = f"> {query}"
+    lines = [f"{prompt}  {DIM}{count}/{total}{RESET}"]
+    for i, project in enumerate(shown):
+        line = project.project_name
+        if project.tags:
+            line += f"  #{' #'.join(project.tags)}"
+        if project.description:
+            line += f"  {project.description}"
+        line = line.replace("\n", " ")[: width - 1]
+        lines.append(f"{REVERSE}{line}{RESET}" if i == selected else line)
+
+    # Clear the previous frame, draw, then go back up to the end of the query
+    text = "\r\x1b[J" + "\r\n".join(lines)  # The terminal is in raw mode
+    if len(lines) > 1:
+        text += f"\x1b[{len(lines) - 1}A"
+    return text + f"\r\x1b[{len(prompt)}C"
+
+
+class _Terminal:
+    """
+    Reads single keys from the terminal without waiting for Enter.\n
+    ---
+    Uses `termios` on POSIX and `msvcrt` on Windows. Keys are returned as
+    characters, or as "up", "down", "enter", "backspace", "clear" or "cancel".
+    """
+
+    def __enter__(self):
+        if os.name != "nt":
+            import tty
+            import termios
+
+            self.fd = sys.stdin.fileno()
+            self.saved = termios.tcgetattr(self.fd)
+            tty.setraw(self.fd)
+        return self
+
+    def __exit__(self, *exc):
+        if os.name != "nt":
+            import termios
+
+            termios.tcsetattr(self.fd, termios.TCSADRAIN, self.saved)
+
+    def read_key(self) -> str:
+        if os.name == "nt":
+            import msvcrt
+
+            key = msvcrt.getwch()
+            if key in ("\x00", "\xe0"):  # Arrow keys come as two characters
+                return {"H": "up", "P": "down"}.get(msvcrt.getwch(), "")
+        else:
+            import select
+
+            key = os.read(self.fd, 4).decode("utf-8", "ignore")
+            if key == "\x1b":
+                # A lone Escape, or the start of a sequence that arrived in parts
+                if select.select([self.fd], [], [], 0.05)[0]:
+                    key += os.read(self.fd, 8).decode("utf-8", "ignore")
+            if key.startswith("\x1b[") or key.startswith("\x1bO"):
+                return {"A": "up", "B": "down"}.get(key[2:3], "")
+
+        if key in ("\r", "\n"):
+            return "enter"
+        if key in ("\x7f", "\b"):
+            return "backspace"
+        if key in ("\x1b", "\x03", "\x04"):  # Escape, Ctrl-C, Ctrl-D
+            return "cancel"
+        if key == "\x10":  # Ctrl-P
+            return "up"
+        if key == "\x0e":  # Ctrl-N
+            return "down"
+        if key == "\x15":  # Ctrl-U
+            return "clear"
+        return "".join(char for char in key if char.isprintable())
+
+
+def pick_project(projects: list[RProjFile], out=None) -> RProjFile | None:
+    """
+    Lets the user pick a project, filtering them as they type.\n
+    ---
+    The picker is drawn on stderr, so the output of the command the project is
+    picked for can still be captured, e.g. `cd "$(rproj pick --then dir)"`.
+    Up and Down (or Ctrl-P and Ctrl-N) move the selection, Enter picks and
+    Escape or Ctrl-C cancels.
+    Args:
+        projects (list[RProjFile]): The projects to pick from.
+        out: The terminal to draw on. Defaults to stderr.
+    Returns:
+        RProjFile | None: The picked project, or None if the picker was cancelled.
+    """
+    out = out or sys.stderr
+    try:
+        width = os.get_terminal_size(out.fileno()).columns
+    except (OSError, ValueError):
+        width = 80
+    project_filter = ProjectFilter(projects)
+    query = ""
+    selected = 0
+    picked = None
+    with _Terminal() as terminal:
+        while True:
+            shown, count = project_filter.rank(query)
+            selected = min(selected, max(len(shown) - 1, 0))
+            out.write(render(query, shown, count, len(projects), selected, width))
+            out.flush()
+
+            key = terminal.read_key()
+            if key == "enter":
+                picked = shown[selected] if shown else None
+                break
+            elif key == "cancel":
+                break
+            elif key == "up":
+                selected = max(selected - 1, 0)
+            elif key == "down":
+                selected += 1
+            elif key == "backspace":
+                query, selected = query[:-1], 0
+            elif key == "clear":
+                query, selected = "", 0
+            elif key:
+                query, selected = query + key, 0
+
+    out.write("\r\x1b[J")
+    out.flush()
+    return picked
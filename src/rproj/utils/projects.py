@@ -1,77 +1,134 @@
 import os
 import json
-from appdirs import user_data_dir
+import time
 from rproj.utils import log
+from rproj.utils.config import DATA_DIR, get_backend
+from rproj.utils.console import escape
+from rproj.utils.fs import locked, write_atomic
 
 
 def get_project_data_path():
-    """Get the path to the project data file using appdirs."""
-    data_dir = user_data_dir(appname="rproj", appauthor="JadenLabs")
-    os.makedirs(data_dir, exist_ok=True)
-    return os.path.join(data_dir, "projects.json")
+    """Get the path to the project data file in the rproj data directory."""
+    return os.path.join(DATA_DIR, "projects.json")
 
 
 PROJECT_DATA_PATH = get_project_data_path()
+# Held while the registry is read, changed and written back
+REGISTRY_LOCK_PATH = f"{PROJECT_DATA_PATH}.lock"
 
 
 def reset_project_data_file():
     """Reset the project data file."""
-    with open(PROJECT_DATA_PATH, "w") as file:
-        log.warn("Resetting project data file")
-        file.write(json.dumps([]))
-        return True
+    log.warn("Resetting project data file")
+    write_atomic(PROJECT_DATA_PATH, json.dumps([]))
+    return True
+
+
+def back_up_project_data_file() -> str:
+    """Move an unreadable project data file aside so resetting it loses nothing, returning its new path."""
+    backup_path = f"{PROJECT_DATA_PATH}.corrupt-{time.strftime('%Y%m%d-%H%M%S')}"
+    os.replace(PROJECT_DATA_PATH, backup_path)
+    log.warn(f"Moved the unreadable project data file to {backup_path}")
+    return backup_path
+
+
+def write_project_paths(project_paths: list[str]):
+    """Write the list of project file paths to the registry, dropping duplicates but keeping the order."""
+    write_atomic(PROJECT_DATA_PATH, json.dumps(list(dict.fromkeys(project_paths))))
 
 
 def validate_project_data_file():
-    """Validate the project data file."""
-    if not os.path.exists(PROJECT_DATA_PATH):
+    """
+    Validate the project data file.\n
+    ---
+    This only checks that the file exists and isn't empty, which costs a single
+    stat. Invalid JSON is handled when the file is actually read.
+    """
+    try:
+        size = os.path.getsize(PROJECT_DATA_PATH)
+    except OSError:
         log.warn("Project data file not found")
         reset_project_data_file()
         return True
-    elif os.path.getsize(PROJECT_DATA_PATH) == 0:
+
+    if size == 0:
         log.warn("No project data found")
         reset_project_data_file()
         return True
+    return False
+
+
+def load_project_paths() -> list[str]:
+    """Load the list of project file paths from the registry."""
+    if get_backend() == "sqlite":
+        from rproj.utils.database import Database
+
+        return Database.open().paths()
+    return load_project_data_file()
 
+
+def load_project_data_file() -> list[str]:
+    """
+    Load the list of project file paths from projects.json.\n
+    ---
+    projects.json is the registry on both backends, so it's what changes to the
+    registry are made to. A file that can't be parsed is backed up and reset.
+    """
+    try:
+        return read_project_paths()
+    except json.JSONDecodeError:
+        log.warn("Could not read project data file")
+
+    with locked(REGISTRY_LOCK_PATH):
+        try:
+            return read_project_paths()  # Another process may have replaced it
+        except json.JSONDecodeError:
+            back_up_project_data_file()
+            reset_project_data_file()
+    return []
+
+
+def read_project_paths() -> list[str]:
+    """Read the list of project file paths from projects.json, raising JSONDecodeError if it's invalid."""
     with open(PROJECT_DATA_PATH, "r") as file:
-        file = file.read()
-        if file != "[]":
-            try:
-                json.loads(file)
-            except json.JSONDecodeError:
-                log.warn("Could not read project data file")
-                reset_project_data_file()
-                return True
-            else:
-                return False
+        return json.loads(file.read()) or []
 
 
 def add_project_to_projects(project):
-    """Add a project to the projects.json file."""
-    # Get a list of all project paths
-    with open(PROJECT_DATA_PATH, "r") as file:
-        project_paths = json.loads(file.read()) or []
+    """Add a project to the projects.json file and the catalog (or database)."""
+    from rproj.utils.catalog import update_catalog
 
-    # Add the new project path to the list
-    project_paths.append(project.path)
-    project_paths = list(set(project_paths))
+    # Read, update and write the registry without another process in between
+    with locked(REGISTRY_LOCK_PATH):
+        project_paths = load_project_data_file()
+        if project.path not in project_paths:
+            project_paths.append(project.path)
+            write_project_paths(project_paths)
+        update_catalog(project)  # Cache the parsed project
+    log.info(f"Added project {escape(project.project_name)} to projects")
 
-    # Update the project data file
-    with open(PROJECT_DATA_PATH, "w") as file:
-        file.write(json.dumps(project_paths))
 
-    log.info(f"Added project {project.project_name} to projects")
+def add_projects_to_projects(projects: list):
+    """Add several projects to the projects.json file and the catalog (or database), writing each once."""
+    from rproj.utils.catalog import update_catalog
 
+    if not projects:
+        return
 
-def remove_project_from_projects(project):
-    """Remove a project from the projects.json file."""
-    # Get a list of all project paths
-    with open(PROJECT_DATA_PATH, "r") as file:
-        project_paths: list = json.loads(file.read())
-        project_paths.remove(project.path)
+    with locked(REGISTRY_LOCK_PATH):
+        project_paths = load_project_data_file()
+        write_project_paths(project_paths + [project.path for project in projects])
+        update_catalog(*projects)
 
-    # Update the project data file
-    with open(PROJECT_DATA_PATH, "w") as file:
-        file.write(json.dumps(project_paths))
 
-    log.info(f"Removed project {project.project_name} from projects")
+def remove_project_from_projects(project):
+    """Remove a project from the projects.json file and the catalog (or database)."""
+    from rproj.utils.catalog import remove_from_catalog
+
+    with locked(REGISTRY_LOCK_PATH):
+        project_paths = load_project_data_file()
+        if project.path in project_paths:
+            project_paths.remove(project.path)
+            write_project_paths(project_paths)
+        remove_from_catalog(project)
+    log.info(f"Removed project {escape(project.project_name)} from projects")
@@ -0,0 +1,208 @@
+import os
+import sys
+import time
+import queue
+import signal
+import threading
+import subprocess
+from rproj.utils import log
+from rproj.utils.console import escape
+from rproj.utils.file import RProjFile
+
+# The most projects running at once unless told otherwise. Run commands are
+# mostly servers and watchers that wait on I/O, so this isn't the CPU count
+DEFAULT_JOBS = 8
+# Seconds the projects get to exit after Ctrl-C before they're killed
+SHUTDOWN_GRACE = 5.0
+# Seconds between checks for Ctrl-C while waiting for output, which Windows needs
+WAIT_INTERVAL = 0.2
+
+
+def _read_lines(pipe, index: int, stream: str, events: queue.Queue):
+    """Sends each line of a pipe to the main thread, which prints it."""
+    with pipe:
+        for line in iter(pipe.readline, ""):
+            events.put(("line", index, stream, line))
+
+
+def _supervise(
+    process: subprocess.Popen, index: int, events: queue.Queue, started: float
+):
+    """Forwards the output of a project, then reports its exit code once both pipes are closed."""
+    stderr = threading.Thread(
+        target=_read_lines, args=(process.stderr, index, "stderr", events), daemon=True
+    )
+    stderr.start()
+    _read_lines(process.stdout, index, "stdout", events)
+    stderr.join()
+    code = process.wait()
+    events.put(("exit", index, code, time.monotonic() - started))
+
+
+def _start(project: RProjFile) -> subprocess.Popen:
+    """
+    Starts the run command of a project in its own process group, so it and
+    everything it starts can be stopped together.
+    """
+    options = {}
+    if os.name == "nt":
+        options["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        options["start_new_session"] = True
+    return subprocess.Popen(
+        project.run_cmd,
+        shell=True,
+        cwd=project.directory,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        errors="replace",
+        env=dict(os.environ, PYTHONUNBUFFERED="1"),  # Python projects print as they go
+        **options,
+    )
+
+
+def _signal_group(process: subprocess.Popen, kill: bool = False):
+    """Asks the process group of a project to exit, or kills it."""
+    try:
+        if os.name == "nt":
+            if kill:
+                process.kill()
+            else:
+                process.send_signal(signal.CTRL_BREAK_EVENT)
+        else:
+            os.killpg(process.pid, signal.SIGKILL if kill else signal.SIGTERM)
+    except OSError:
+        pass  # It already exited
+
+
+def run_projects(projects: list[RProjFile], jobs: int = None, out=None) -> list[dict]:
+    """
+    Runs the run commands of several projects at once, without terminal windows.\n
+    ---
+    At most `jobs` projects run at the same time, and the next one starts as soon
+    as one exits. Every line a project prints is written to stdout or stderr,
+    like the project wrote it, prefixed with its name. Lines are only written by
+    the calling thread, so lines of different projects never get mixed up.
+    On Ctrl-C or SIGTERM no more projects are started, and the process group of
+    each running project gets SIGTERM (CTRL_BREAK on Windows), then is killed if
+    it's still running after `SHUTDOWN_GRACE` seconds. The same happens when
+    anything else ends the run early, e.g. stdout being closed by
+    `rproj run --headless | head`, so no project outlives it.
+    Args:
+        projects (list[RProjFile]): The projects, each with a run command.
+        jobs (int, optional): The most projects running at once. Defaults to
+            `DEFAULT_JOBS`.
+        out: The file the stdout of the projects goes to. Defaults to stdout.
+    Returns:
+        list[dict]: A record for every project, in the same order, with
+            "project_name", "directory", "status" ("ok", "failed", "stopped" or
+            "not started"), "code" and "seconds".
+    """
+    jobs = max(1, jobs or DEFAULT_JOBS)
+    out = out or sys.stdout
+    width = max(len(project.project_name) for project in projects)
+    prefixes = [f"{project.project_name.ljust(width)} | " for project in projects]
+    records = [
+        {
+            "project_name": project.project_name,
+            "directory": project.directory,
+            "status": "not started",
+            "code": None,
+            "seconds": None,
+        }
+        for project in projects
+    ]
+
+    events = queue.Queue()
+    running: dict[int, subprocess.Popen] = {}
+    waiting = list(range(len(projects)))
+    stopping_at = None
+
+    def start_next():
+        while waiting and len(running) < jobs:
+            index = waiting.pop(0)
+            started = time.monotonic()
+            try:
+                process = _start(projects[index])
+            except OSError as e:
+                log.err(f"Could not start {escape(projects[index].project_name)}: {e}")
+                records[index].update(status="failed", seconds=0.0)
+                continue
+            running[index] = process
+            threading.Thread(
+                target=_supervise, args=(process, index, events, started), daemon=True
+            ).start()
+
+    def stop():
+        """Starts no more projects and asks the running ones to exit."""
+        nonlocal stopping_at
+        if stopping_at is not None:
+            return  # Already stopping, the grace period still applies
+        stopping_at = time.monotonic()
+        waiting.clear()
+        log.warn(f"Stopping {len(running)} project(s)...")
+        for process in running.values():
+            _signal_group(process)
+
+    def interrupt(*_):
+        raise KeyboardInterrupt
+
+    # Stopping rproj, e.g. from a service manager, stops the projects like Ctrl-C
+    saved_handler = signal.signal(signal.SIGTERM, interrupt)
+    try:
+        try:
+            start_next()
+        except KeyboardInterrupt:
+            stop()
+        while running:
+            try:
+                try:
+                    event = events.get(timeout=WAIT_INTERVAL)
+                except queue.Empty:
+                    if (
+                        stopping_at is not None
+                        and time.monotonic() > stopping_at + SHUTDOWN_GRACE
+                    ):
+                        for process in running.values():
+                            _signal_group(process, kill=True)
+                    continue
+
+                if event[0] == "line":
+                    _, index, stream, line = event
+                    file = out if stream == "stdout" else sys.stderr
+                    file.write(
+                        prefixes[index] + (line if line.endswith("\n") else line + "\n")
+                    )
+                    file.flush()
+                else:
+                    _, index, code, seconds = event
+                    del running[index]
+                    if stopping_at is not None:
+                        status = "stopped"
+                    else:
+                        status = "ok" if code == 0 else "failed"
+                    records[index].update(
+                        status=status, code=code, seconds=round(seconds, 3)
+                    )
+                    start_next()
+            except KeyboardInterrupt:
+                stop()
+    finally:
+        # Only reached with projects running when the loop was left by an
+        # error, so their output can't be written anymore and is dropped
+        if running:
+            stop()
+            deadline = stopping_at + SHUTDOWN_GRACE
+            while running and time.monotonic() < deadline:
+                try:
+                    event = events.get(timeout=WAIT_INTERVAL)
+                    if event[0] == "exit":
+                        del running[event[1]]
+                except (queue.Empty, KeyboardInterrupt):
+                    continue
+            for process in running.values():
+                _signal_group(process, kill=True)
+        signal.signal(signal.SIGTERM, saved_handler)
+    return records
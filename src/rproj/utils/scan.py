@@ -0,0 +1,157 @@
+import os
+from rproj import FILE_EXTENSION
+from rproj.utils import log
+from rproj.utils.config import get_workers
+from rproj.utils.console import escape
+from rproj.utils.file import RProjFile
+from rproj.utils.fs import locked
+from rproj.utils.projects import REGISTRY_LOCK_PATH, add_projects_to_projects
+
+# Directories that never contain projects worth registering, on top of .gitignore rules
+SCAN_IGNORE = [
+    "node_modules/",
+    "__pycache__/",
+    ".venv/",
+    "venv/",
+    ".tox/",
+    ".cache/",
+    ".Trash/",
+]
+
+
+def find_project_files(
+    root_dir: str, max_depth: int = 6, ignore: list[str] = None, jobs: int = None
+) -> list[str]:
+    """
+    Finds the project files below a directory.\n
+    ---
+    The directory is walked like `rproj tree`, so ignored directories (from
+    .gitignore files, `SCAN_IGNORE` and `ignore`) are never listed and
+    directories are listed ahead of the walk on a thread pool.
+    Args:
+        root_dir (str): The directory to search.
+        max_depth (int): The maximum depth of a project directory below the root.
+            Defaults to 6.
+        ignore (list[str], optional): Extra gitignore style patterns to skip.
+        jobs (int, optional): The number of directories listed at the same time.
+            Defaults to the `workers` config value.
+    Returns:
+        list[str]: The paths of the project files, in tree order.
+    """
+    from rproj.utils.ignore import IgnoreMatcher
+    from rproj.utils.tree import walk_project_structure
+
+    matcher = IgnoreMatcher.for_project(SCAN_IGNORE + list(ignore or []))
+    entries = walk_project_structure(
+        os.path.abspath(root_dir), max_depth, matcher, jobs=jobs or get_workers()
+    )
+    paths = []
+    for entry in entries:
+        if entry.error:
+            log.warn(f"Could not read {escape(entry.path)}: {entry.error}")
+        elif entry.name == FILE_EXTENSION and not entry.is_dir:
+            paths.append(entry.path)
+    return paths
+
+
+def parse_project_files(
+    paths: list[str], jobs: int = None
+) -> list[tuple[str, RProjFile | Exception]]:
+    """
+    Parses project files on a thread pool, keeping their order.
+
+    Args:
+        paths (list[str]): The paths of the project files.
+        jobs (int, optional): The size of the thread pool. Defaults to the
+            `workers` config value.
+    Returns:
+        list[tuple[str, RProjFile | Exception]]: Each path with its project, or
+            the error it couldn't be loaded with.
+    """
+    jobs = jobs or get_workers()
+
+    def load(path: str) -> RProjFile | Exception:
+        try:
+            return RProjFile.load(path)
+        except Exception as e:
+            return e
+
+    if len(paths) > 1 and jobs > 1:
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=min(jobs, len(paths))) as executor:
+            return list(zip(paths, executor.map(load, paths)))
+    return [(path, load(path)) for path in paths]
+
+
+def scan_projects(
+    root_dir: str, max_depth: int = 6, ignore: list[str] = None, jobs: int = None
+) -> list[dict]:
+    """
+    Registers every project found below a directory.\n
+    ---
+    Project files are found and parsed concurrently, then checked against the
+    registry in memory: files that are already registered are left alone, and
+    a project whose name is already taken, by a registered project or one found
+    earlier in the scan, is skipped like `rproj add` would. Projects whose file
+    lives outside the directory it names (e.g. a copied checkout) are skipped
+    too, since registering them would point at the other directory. The rest
+    are added with a single write of the registry and the catalog.
+    Args:
+        root_dir (str): The directory to search.
+        max_depth (int): The maximum depth of a project directory below the root.
+            Defaults to 6.
+        ignore (list[str], optional): Extra gitignore style patterns to skip.
+        jobs (int, optional): The number of threads used to list directories
+            and parse project files. Defaults to the `workers` config value.
+    Returns:
+        list[dict]: A record for every project file found, with "path",
+            "project_name" and "status", which is one of "added", "registered",
+            "duplicate", "moved" or "unreadable".
+    """
+    from rproj.utils.info import load_projects
+
+    found = parse_project_files(
+        find_project_files(root_dir, max_depth, ignore, jobs), jobs
+    )
+
+    records = []
+    added = []
+    # Checked and written under the lock, so a concurrent `rproj add` can't take a name in between
+    with locked(REGISTRY_LOCK_PATH):
+        registered = load_projects()
+        paths = {project.path for project in registered}
+        names = {project.project_name: project.path for project in registered}
+
+        for path, project in found:
+            if isinstance(project, Exception):
+                log.warn(f"Could not load {escape(path)}: {project}")
+                records.append(
+                    {"path": path, "project_name": None, "status": "unreadable"}
+                )
+                continue
+
+            if project.path != path:
+                log.warn(
+                    f"Skipping {escape(path)}, it belongs to {escape(project.directory)}"
+                )
+                status = "moved"
+            elif project.path in paths:
+                status = "registered"
+            elif project.project_name in names:
+                log.warn(
+                    f"Skipping {escape(path)}, the name {escape(project.project_name)} is"
+                    f" already used by {escape(names[project.project_name])}"
+                )
+                status = "duplicate"
+            else:
+                paths.add(project.path)
+                names[project.project_name] = project.path
+                added.append(project)
+                status = "added"
+            records.append(
+                {"path": path, "project_name": project.project_name, "status": status}
+            )
+
+        add_projects_to_projects(added)
+    return records
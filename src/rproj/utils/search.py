@@ -0,0 +1,160 @@
+import os
+import re
+import math
+from difflib import SequenceMatcher
+
+# Bumped whenever index_keys changes, so saved indexes get rebuilt
+INDEX_VERSION = 3
+# Number of trigram matches that get ranked by `similarity`
+FUZZY_CANDIDATES = 20
+# Minimum similarity for a fuzzy match to be used in place of the given name
+FUZZY_THRESHOLD = 0.6
+# How much better the best fuzzy match must be than the next one to be used
+FUZZY_MARGIN = 0.1
+# How much a word counts towards a text search match, depending on where it is
+TEXT_FIELD_WEIGHTS = {
+    "project_name": 3.0,
+    "tags": 2.0,
+    "description": 1.5,
+    "notes": 1.0,
+}
+TOKEN = re.compile(r"\w+")
+
+
+def trigrams(text: str) -> set[str]:
+    """
+    Splits text into the set of its trigrams, e.g. "api" -> {"  a", " ap", "api", "pi "}.\n
+    ---
+    The text is case-folded and padded so that short names and the start of a
+    name still produce trigrams, which favours matches on the same prefix.
+    """
+    text = f"  {text.casefold()} "
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+def tokenize(text: str) -> list[str]:
+    """Splits text into case-folded words, e.g. "Hello, World" -> ["hello", "world"]."""
+    return TOKEN.findall(text.casefold())
+
+
+def index_keys(data: dict) -> dict[str, dict[str, float]]:
+    """
+    Returns the index keys of a project, grouped by kind of index.\n
+    ---
+    Every key has a weight. For "trigram" keys it is 1 divided by the number of
+    trigrams, which lets `fuzzy_search` recover the size of the trigram set. For
+    "text" keys it is the sum of the TEXT_FIELD_WEIGHTS of each occurrence, and
+    "tag" keys are the exact tags of the project.
+    Args:
+        data (dict): The project data, shaped like `RProjFile.as_dict`.
+    Returns:
+        dict[str, dict[str, float]]: The weight of each key, keyed by kind and key.
+    """
+    info = data.get("info", {})
+    grams = trigrams(info.get("project_name", ""))
+    basename = os.path.basename(info.get("directory", "").rstrip("/\\"))
+    if basename:
+        grams |= trigrams(basename)
+
+    words: dict[str, float] = {}
+    for field, weight in TEXT_FIELD_WEIGHTS.items():
+        value = info.get(field) or ""
+        text = " ".join(value) if isinstance(value, list) else str(value)
+        for word in tokenize(text):
+            words[word] = words.get(word, 0) + weight
+
+    return {
+        "trigram": {gram: 1 / len(grams) for gram in grams},
+        "text": words,
+        "tag": {tag: 1.0 for tag in info.get("tags", [])},
+    }
+
+
+def fuzzy_search(
+    index, query: str, limit: int = FUZZY_CANDIDATES
+) -> list[tuple[float, str]]:
+    """
+    Ranks projects by the trigram similarity of their name and directory to the query.\n
+    ---
+    This only touches the projects that share a trigram with the query, so it is
+    used to find candidates which are then ranked more precisely by `similarity`.
+    Args:
+        index (Catalog | Database): The catalog to look the trigrams up in.
+        query (str): The text to search for.
+        limit (int): The maximum number of results. Defaults to FUZZY_CANDIDATES.
+    Returns:
+        list[tuple[float, str]]: (similarity, project file path) pairs, best first.
+    """
+    query_grams = trigrams(query)
+    shared: dict[str, int] = {}
+    sizes: dict[str, int] = {}
+    for _, path, weight in index.lookup("trigram", list(query_grams)):
+        shared[path] = shared.get(path, 0) + 1
+        sizes[path] = round(1 / weight)
+
+    # Jaccard similarity of the two trigram sets
+    results = [
+        (count / (len(query_grams) + sizes[path] - count), path)
+        for path, count in shared.items()
+    ]
+    results.sort(key=lambda result: (-result[0], result[1]))
+    return results[:limit]
+
+
+def similarity(query: str, project) -> float:
+    """Scores how closely the query matches a project's name or directory, from 0 to 1."""
+    query = query.casefold()
+    basename = os.path.basename(project.directory.rstrip("/\\"))
+    return max(
+        SequenceMatcher(None, query, text.casefold()).ratio()
+        for text in (project.project_name, basename)
+    )
+
+
+def closest_match(results: list[tuple[float, object]]):
+    """Returns the item of the best fuzzy result if it's similar enough and clearly the best."""
+    if not results or results[0][0] < FUZZY_THRESHOLD:
+        return None
+    if len(results) > 1 and results[0][0] - results[1][0] < FUZZY_MARGIN:
+        return None
+    return results[0][1]
+
+
+def text_search(index, query: str, limit: int = 20) -> list[tuple[float, str]]:
+    """
+    Ranks projects containing every word of the query in their name, tags,
+    description or notes.\n
+    ---
+    Each word scores its field weight, scaled down for words that many projects
+    contain (tf-idf).
+    Args:
+        index (Catalog | Database): The catalog to look the words up in.
+        query (str): The words to search for.
+        limit (int): The maximum number of results. Defaults to 20.
+    Returns:
+        list[tuple[float, str]]: (score, project file path) pairs, best first.
+    """
+    words = set(tokenize(query))
+    if not words:
+        return []
+
+    matches: dict[str, dict[str, float]] = {}
+    for word, path, weight in index.lookup("text", list(words)):
+        matches.setdefault(word, {})[path] = weight
+    if len(matches) < len(words):
+        return []  # Some word isn't in any project
+
+    total = len(index)
+    scores: dict[str, float] = {}
+    matched: dict[str, int] = {}
+    for paths in matches.values():
+        idf = math.log(1 + total / len(paths))
+        for path, weight in paths.items():
+            scores[path] = scores.get(path, 0) + weight * idf
+            matched[path] = matched.get(path, 0) + 1
+
+    results = [
+        (score, path) for path, score in scores.items() if matched[path] == len(words)
+    ]
+    results.sort(key=lambda result: (-result[0], result[1]))
+    return results[:limit]
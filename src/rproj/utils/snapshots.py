@@ -0,0 +1,210 @@
+import os
+import json
+import time
+import hashlib
+from typing import NamedTuple
+from rproj.utils import log
+from rproj.utils.config import DATA_DIR, get_tree_cache_size
+from rproj.utils.fs import write_atomic
+
+# Bumped whenever the snapshot format changes, so old snapshots get ignored
+SNAPSHOT_VERSION = 1
+SNAPSHOT_DIR = os.path.join(DATA_DIR, "trees")
+# Directories modified this close to being listed might change again within the
+# same mtime tick, so their listing is not reused
+RACY_WINDOW_NS = 2_000_000_000
+
+
+class CachedEntry(NamedTuple):
+    """
+    A directory entry from a snapshot, standing in for an `os.DirEntry`.
+    Attributes:
+        name (str): The name of the entry.
+        path (str): The full path of the entry.
+        directory (bool): Whether the entry is a directory, following symlinks.
+        symlink (bool): Whether the entry is a symlink.
+        inode_number (int): The inode of the entry, only kept for directories.
+    """
+
+    name: str
+    path: str
+    directory: bool
+    symlink: bool
+    inode_number: int
+
+    def is_dir(self) -> bool:
+        return self.directory
+
+    def is_symlink(self) -> bool:
+        return self.symlink
+
+    def inode(self) -> int:
+        return self.inode_number
+
+    def stat(self, follow_symlinks: bool = True) -> os.stat_result:
+        return os.stat(self.path, follow_symlinks=follow_symlinks)
+
+
+class TreeSnapshot:
+    """
+    The directory listings of a project from previous tree walks.\n
+    ---
+    Each listing is stored with the mtime of its directory, and is reused for as
+    long as the mtime stays the same, since adding, removing or renaming an entry
+    updates it. A directory is then stat-ed instead of listed. The listings are
+    unfiltered, so changing the ignore rules doesn't need a new snapshot.
+    Attributes:
+        root_dir (str): The directory the snapshot is of.
+        path (str): The snapshot file.
+        directories (dict): [mtime_ns, entries] listings, keyed by the path of
+            the directory relative to the root. The mtime is None for listings
+            that shouldn't be reused.
+        dirty (bool): Whether a directory had to be listed again.
+    """
+
+    def __init__(self, root_dir: str, path: str, directories: dict = None):
+        self.root_dir = root_dir
+        self.path = path
+        self.directories = directories or {}
+        self.dirty = False
+
+    @staticmethod
+    def open(root_dir: str, refresh: bool = False) -> "TreeSnapshot":
+        """
+        Opens the snapshot of a directory, starting an empty one if there is none.
+
+        Args:
+            root_dir (str): The directory.
+            refresh (bool): Whether to ignore the existing snapshot. Defaults to False.
+        Returns:
+            TreeSnapshot: The snapshot.
+        """
+        root_dir = os.path.abspath(root_dir)
+        name = hashlib.sha1(root_dir.encode("utf-8")).hexdigest()[:16]
+        path = os.path.join(SNAPSHOT_DIR, f"{name}.json")
+        if refresh or not os.path.exists(path):
+            return TreeSnapshot(root_dir, path)
+
+        try:
+            with open(path, "r") as file:
+                data = json.loads(file.read())
+            os.utime(path)  # Marks the snapshot as recently used
+        except (OSError, json.JSONDecodeError):
+            log.warn("Could not read tree snapshot, rebuilding it")
+            return TreeSnapshot(root_dir, path)
+
+        if (
+            not isinstance(data, dict)
+            or data.get("version") != SNAPSHOT_VERSION
+            or data.get("root") != root_dir
+        ):
+            return TreeSnapshot(root_dir, path)
+        return TreeSnapshot(root_dir, path, data.get("directories"))
+
+    def listdir(self, path: str, relpath: str) -> list:
+        """
+        Lists a directory, reusing its snapshot if it hasn't changed.
+
+        Args:
+            path (str): The directory.
+            relpath (str): The directory relative to the root, using `/` and
+                ending with one, or "" for the root.
+        Returns:
+            list: The entries of the directory, as `os.DirEntry` or `CachedEntry`.
+        """
+        mtime_ns = os.stat(path).st_mtime_ns
+        cached = self.directories.get(relpath)
+        if cached and cached[0] is not None and cached[0] == mtime_ns:
+            prefix = path if path.endswith(os.sep) else path + os.sep
+            make = CachedEntry._make
+            return [
+                make((name, prefix + name, is_dir, is_symlink, inode))
+                for name, is_dir, is_symlink, inode in cached[1]
+            ]
+
+        listed_ns = time.time_ns()
+        with os.scandir(path) as entries:
+            entries = list(entries)
+
+        items = []
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            items.append(
+                [entry.name, is_dir, entry.is_symlink(), entry.inode() if is_dir else 0]
+            )
+        racy = mtime_ns >= listed_ns - RACY_WINDOW_NS
+        self.directories[relpath] = [None if racy else mtime_ns, items]
+        self.dirty = True
+        return entries
+
+    def prune(self):
+        """Drops the listings of directories that are no longer in their parent's listing."""
+        kept = {}
+        subdirectories = {}  # The names of the subdirectories of each kept directory
+        for relpath in sorted(self.directories, key=lambda relpath: relpath.count("/")):
+            if relpath:
+                parent, _, name = relpath[:-1].rpartition("/")
+                parent = f"{parent}/" if parent else ""
+                if name not in subdirectories.get(parent, ()):
+                    continue
+            kept[relpath] = self.directories[relpath]
+            subdirectories[relpath] = {item[0] for item in kept[relpath][1] if item[1]}
+        self.directories = kept
+
+    def save(self, max_size: int = None):
+        """
+        Writes the snapshot if a directory had to be listed again, then evicts
+        old snapshots.
+
+        Args:
+            max_size (int, optional): The maximum total size of the snapshots in
+                bytes. Defaults to the `tree_cache_mb` config value.
+        """
+        if not self.dirty:
+            return
+
+        self.prune()
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        data = {
+            "version": SNAPSHOT_VERSION,
+            "root": self.root_dir,
+            "directories": self.directories,
+        }
+        write_atomic(self.path, json.dumps(data, separators=(",", ":")), durable=False)
+        evict_snapshots(get_tree_cache_size() if max_size is None else max_size)
+
+
+def evict_snapshots(max_size: int) -> int:
+    """
+    Deletes the least recently used snapshots until they fit in `max_size` bytes.
+
+    Args:
+        max_size (int): The maximum total size of the snapshots in bytes.
+    Returns:
+        int: The number of snapshots deleted.
+    """
+    snapshots = []
+    try:
+        with os.scandir(SNAPSHOT_DIR) as entries:
+            for entry in entries:
+                if entry.name.endswith(".json"):
+                    stat = entry.stat()
+                    snapshots.append((stat.st_mtime_ns, stat.st_size, entry.path))
+    except OSError:
+        return 0
+
+    total = sum(size for _, size, _ in snapshots)
+    deleted = 0
+    for _, size, path in sorted(snapshots):
+        if total <= max_size:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        deleted += 1
+    return deleted
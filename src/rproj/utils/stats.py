@@ -0,0 +1,297 @@
+import os
+import sys
+import json
+import time
+import hashlib
+from rproj.utils.config import DATA_DIR, get_tree_cache_size
+from rproj.utils.fs import write_atomic
+
+# Bumped whenever the stats format changes, so old results get recomputed
+STATS_VERSION = 1
+# The summary of every project, keyed by directory
+STATS_PATH = os.path.join(DATA_DIR, "stats.json")
+# The size, mtime and line count of every file of a project, one file per project
+STATS_DIR = os.path.join(DATA_DIR, "stats")
+# Number of directories listed as the largest
+LARGEST_DIRECTORIES = 5
+# Bytes read at once when counting lines
+LINE_CHUNK_SIZE = 1 << 20
+# Languages whose lines get counted, by extension
+LANGUAGES = {
+    ".py": "Python",
+    ".pyi": "Python",
+    ".js": "JavaScript",
+    ".mjs": "JavaScript",
+    ".cjs": "JavaScript",
+    ".jsx": "JavaScript",
+    ".ts": "TypeScript",
+    ".tsx": "TypeScript",
+    ".java": "Java",
+    ".kt": "Kotlin",
+    ".scala": "Scala",
+    ".c": "C",
+    ".h": "C",
+    ".cpp": "C++",
+    ".cc": "C++",
+    ".cxx": "C++",
+    ".hpp": "C++",
+    ".cs": "C#",
+    ".go": "Go",
+    ".rs": "Rust",
+    ".rb": "Ruby",
+    ".php": "PHP",
+    ".swift": "Swift",
+    ".dart": "Dart",
+    ".lua": "Lua",
+    ".r": "R",
+    ".sh": "Shell",
+    ".bash": "Shell",
+    ".zsh": "Shell",
+    ".ps1": "PowerShell",
+    ".sql": "SQL",
+    ".html": "HTML",
+    ".css": "CSS",
+    ".scss": "CSS",
+    ".vue": "Vue",
+    ".md": "Markdown",
+    ".json": "JSON",
+    ".yaml": "YAML",
+    ".yml": "YAML",
+    ".toml": "TOML",
+}
+
+_summaries: dict = None
+
+
+def language_of(name: str) -> str | None:
+    """Gets the language of a file from its extension, or None if it isn't code or markup."""
+    dot = name.rfind(".")
+    return LANGUAGES.get(name[dot:].lower()) if dot > 0 else None
+
+
+def count_lines(path: str) -> int:
+    """Counts the lines of a file, including a last line without a newline."""
+    lines = 0
+    last = b"\n"
+    with open(path, "rb") as file:
+        while chunk := file.read(LINE_CHUNK_SIZE):
+            lines += chunk.count(b"\n")
+            last = chunk[-1:]
+    return lines + (last != b"\n")
+
+
+def _files_path(directory: str) -> str:
+    """Gets the path of the file table of a project."""
+    name = hashlib.sha1(directory.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(STATS_DIR, f"{name}.json")
+
+
+def _write(path: str, data: dict):
+    """Writes data as JSON through a temporary file, so readers never see half of it."""
+    write_atomic(path, json.dumps(data, separators=(",", ":")), durable=False)
+
+
+def compute_stats(directory: str, refresh: bool = False) -> dict:
+    """
+    Computes the file count, size, line counts per language and largest
+    directories of a project.\n
+    ---
+    The project is walked like `rproj tree`, with the same ignore rules and,
+    when `tree_cache_mb` is set, tree snapshot, so unchanged directories aren't
+    listed again. Lines are only
+    counted again for files whose size or mtime changed since the last run.
+    This runs in the worker processes of `collect_stats`.
+    Args:
+        directory (str): The project directory.
+        refresh (bool): Whether to ignore the previous results. Defaults to False.
+    Returns:
+        dict: The summary, with "directory", "files", "bytes", "languages" (files,
+            lines and bytes per language), "largest_directories" (top-level
+            directories by size) and "updated", or "directory" and "error".
+    """
+    from rproj.utils.ignore import IgnoreMatcher
+    from rproj.utils.snapshots import TreeSnapshot
+    from rproj.utils.tree import walk_project_structure
+
+    directory = os.path.abspath(directory)
+    if not os.path.isdir(directory):
+        return {"directory": directory, "error": "Directory not found"}
+
+    files_path = _files_path(directory)
+    previous = {}
+    if not refresh:
+        try:
+            with open(files_path, "r") as file:
+                data = json.loads(file.read())
+            if (
+                data.get("version") == STATS_VERSION
+                and data.get("directory") == directory
+            ):
+                previous = data["files"]
+        except (OSError, json.JSONDecodeError, KeyError):
+            pass
+
+    snapshot = None
+    if get_tree_cache_size():
+        snapshot = TreeSnapshot.open(directory, refresh)
+    entries = walk_project_structure(
+        directory, sys.maxsize, IgnoreMatcher.for_project(), snapshot=snapshot
+    )
+    root_length = len(os.path.join(directory, ""))
+    files = {}
+    languages = {}
+    top_level = {}
+    total = 0
+    for entry in entries:
+        if entry.error or entry.is_dir:
+            continue
+        relpath = entry.path[root_length:]
+        if os.sep != "/":
+            relpath = relpath.replace(os.sep, "/")
+        try:
+            stat = os.stat(entry.path, follow_symlinks=False)
+        except OSError:
+            continue
+
+        language = language_of(entry.name)
+        lines = None
+        cached = previous.get(relpath)
+        if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            lines = cached[2]
+        elif language:
+            try:
+                lines = count_lines(entry.path)
+            except OSError:
+                language = None
+        files[relpath] = [stat.st_size, stat.st_mtime_ns, lines]
+
+        total += stat.st_size
+        if "/" in relpath:
+            top = relpath.split("/", 1)[0]
+            top_level[top] = top_level.get(top, 0) + stat.st_size
+        if language and lines is not None:
+            figures = languages.setdefault(
+                language, {"files": 0, "lines": 0, "bytes": 0}
+            )
+            figures["files"] += 1
+            figures["lines"] += lines
+            figures["bytes"] += stat.st_size
+
+    try:
+        if snapshot:
+            snapshot.save()
+        os.makedirs(STATS_DIR, exist_ok=True)
+        _write(
+            files_path,
+            {"version": STATS_VERSION, "directory": directory, "files": files},
+        )
+    except OSError:
+        pass  # The results are still correct, just not cached
+
+    largest = sorted(top_level.items(), key=lambda item: (-item[1], item[0]))
+    return {
+        "directory": directory,
+        "files": len(files),
+        "bytes": total,
+        "languages": dict(
+            sorted(languages.items(), key=lambda item: -item[1]["lines"])
+        ),
+        "largest_directories": [
+            {"path": path, "bytes": size}
+            for path, size in largest[:LARGEST_DIRECTORIES]
+        ],
+        "updated": time.time(),
+    }
+
+
+def collect_stats(
+    directories: list[str], refresh: bool = False, jobs: int = None
+) -> list[dict]:
+    """
+    Computes the stats of several projects and caches their summaries.\n
+    ---
+    Projects are spread across a process pool, since counting lines is CPU bound
+    and threads would share one interpreter lock.
+    Args:
+        directories (list[str]): The project directories.
+        refresh (bool): Whether to ignore the previous results. Defaults to False.
+        jobs (int, optional): The number of processes. Defaults to the CPU count.
+    Returns:
+        list[dict]: The summaries from `compute_stats`, in the same order.
+    """
+    jobs = min(jobs or os.cpu_count() or 1, len(directories))
+    if jobs > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = list(
+                executor.map(compute_stats, directories, [refresh] * len(directories))
+            )
+    else:
+        results = [compute_stats(directory, refresh) for directory in directories]
+
+    summaries = load_stats()
+    for result in results:
+        if "error" not in result:
+            summaries[result["directory"]] = result
+    try:
+        _write(STATS_PATH, {"version": STATS_VERSION, "projects": summaries})
+    except OSError:
+        pass
+    return results
+
+
+def load_stats() -> dict[str, dict]:
+    """Loads the cached summaries of every project, keyed by directory."""
+    global _summaries
+    if _summaries is not None:
+        return _summaries
+
+    _summaries = {}
+    try:
+        with open(STATS_PATH, "r") as file:
+            data = json.loads(file.read())
+        if data.get("version") == STATS_VERSION:
+            _summaries = data["projects"]
+    except (OSError, json.JSONDecodeError, KeyError, AttributeError):
+        pass
+    return _summaries
+
+
+def clear_stats_cache():
+    """Forgets the summaries loaded by `load_stats`, so they're read again."""
+    global _summaries
+    _summaries = None
+
+
+def get_stats(directory: str) -> dict | None:
+    """Gets the cached summary of a project, or None if it hasn't been computed."""
+    return load_stats().get(os.path.abspath(directory))
+
+
+def format_stats(project_name: str, summary: dict) -> str:
+    """Formats a summary as rich text for `rproj stats`."""
+    from rproj.utils.console import escape
+    from rproj.utils.tree import format_size
+
+    lines = [f"[bright_blue]{escape(project_name)}[/] @ {escape(summary['directory'])}"]
+    if "error" in summary:
+        lines.append(f"  [red]{summary['error']}[/]")
+        return "\n".join(lines)
+
+    lines.append(f"  Files: {summary['files']:,} ({format_size(summary['bytes'])})")
+    if summary["languages"]:
+        width = max(len(language) for language in summary["languages"])
+        lines.append("  Languages:")
+        for language, figures in summary["languages"].items():
+            lines.append(
+                f"    {language.ljust(width)}  {figures['files']:>7,} files"
+                f"  {figures['lines']:>10,} lines"
+            )
+    if summary["largest_directories"]:
+        lines.append("  Largest directories:")
+        for item in summary["largest_directories"]:
+            lines.append(
+                f"    {format_size(item['bytes']):>9}  {escape(item['path'])}/"
+            )
+    return "\n".join(lines)
@@ -0,0 +1,122 @@
+import re
+
+# A tag is anything up to whitespace, a parenthesis or an operator
+TAG_QUERY_TOKEN = re.compile(r"\s*([()&|!]|[^\s()&|!]+)")
+
+
+def parse_tag_query(query: str) -> tuple:
+    """
+    Parses a boolean tag query, e.g. "backend & !archived" or "(web | api) & prod".\n
+    ---
+    `!` binds tightest, then `&`, then `|`. Parentheses group sub-queries.
+    Args:
+        query (str): The tag query.
+    Raises:
+        ValueError: If the query is not valid.
+    Returns:
+        tuple: The syntax tree, made of ("tag", name), ("not", node),
+            ("and", left, right) and ("or", left, right) nodes.
+    """
+    tokens = TAG_QUERY_TOKEN.findall(query)
+    position = 0
+
+    def peek():
+        return tokens[position] if position < len(tokens) else None
+
+    def take(expected: str = None):
+        nonlocal position
+        token = peek()
+        if token is None or (expected and token != expected):
+            raise ValueError(f"Invalid tag query: {query}")
+        position += 1
+        return token
+
+    def parse_or():
+        node = parse_and()
+        while peek() == "|":
+            take()
+            node = ("or", node, parse_and())
+        return node
+
+    def parse_and():
+        node = parse_not()
+        while peek() == "&":
+            take()
+            node = ("and", node, parse_not())
+        return node
+
+    def parse_not():
+        if peek() == "!":
+            take()
+            return ("not", parse_not())
+        if peek() == "(":
+            take()
+            node = parse_or()
+            take(")")
+            return node
+        token = take()
+        if token in ("&", "|", ")"):
+            raise ValueError(f"Invalid tag query: {query}")
+        return ("tag", token)
+
+    node = parse_or()
+    if peek() is not None:
+        raise ValueError(f"Invalid tag query: {query}")
+    return node
+
+
+def parse_tag_args(tags: list[str]) -> tuple:
+    """Parses the `--tags` arguments, where separate arguments are OR-ed together."""
+    node = parse_tag_query(tags[0])
+    for tag in tags[1:]:
+        node = ("or", node, parse_tag_query(tag))
+    return node
+
+
+def evaluate_tag_query(node: tuple, index, all_paths) -> set[str]:
+    """
+    Finds the projects matching a parsed tag query using the tag index.
+
+    Args:
+        node (tuple): The syntax tree from `parse_tag_query`.
+        index (Catalog | Database): The catalog to look the tags up in.
+        all_paths (Callable): Returns the paths of every project, which is only
+            needed for `!`.
+    Returns:
+        set[str]: The project file paths of the matching projects.
+    """
+    match node:
+        case ("tag", tag):
+            return {path for _, path, _ in index.lookup("tag", [tag])}
+        case ("not", child):
+            return set(all_paths()) - evaluate_tag_query(child, index, all_paths)
+        case ("and", left, right):
+            matches = evaluate_tag_query(left, index, all_paths)
+            if not matches:
+                return matches
+            return matches & evaluate_tag_query(right, index, all_paths)
+        case ("or", left, right):
+            return evaluate_tag_query(left, index, all_paths) | evaluate_tag_query(
+                right, index, all_paths
+            )
+
+
+def tags_match_query(node: tuple, tags: list[str]) -> bool:
+    """
+    Checks a project's own tags against a parsed tag query.
+
+    Args:
+        node (tuple): The syntax tree from `parse_tag_query`.
+        tags (list[str]): The tags of the project.
+    Returns:
+        bool: Whether the tags match the query.
+    """
+    match node:
+        case ("tag", tag):
+            return tag in tags
+        case ("not", child):
+            return not tags_match_query(child, tags)
+        case ("and", left, right):
+            return tags_match_query(left, tags) and tags_match_query(right, tags)
+        case ("or", left, right):
+            return tags_match_query(left, tags) or tags_match_query(right, tags)
@@ -1,73 +1,565 @@
 import os
-import re
-from rich import print
+import sys
+import threading
+from typing import Iterator, NamedTuple
+from rproj.utils.console import print_records, get_output_format, is_terminal
+from rproj.utils.ignore import IgnoreMatcher
+from rproj.utils.snapshots import TreeSnapshot
 
+# Number of characters of the tree that get written at once
+RENDER_BUFFER_SIZE = 64 * 1024
+# Directories read ahead of the walk and not yet printed, per job
+READ_AHEAD_PER_JOB = 4
+# ANSI escape codes for the color of entries in the tree, by extension
+EXTENSION_STYLES = {
+    ".py": "\x1b[32m",  # Green
+    ".txt": "\x1b[34m",  # Blue
+    ".md": "\x1b[33m",  # Yellow
+    ".json": "\x1b[36m",  # Cyan
+    ".csv": "\x1b[35m",  # Magenta
+    ".yaml": "\x1b[31m",  # Red
+    ".yml": "\x1b[31m",
+}
+DIRECTORY_STYLE = "\x1b[90m"  # Bright black
+FILE_STYLE = "\x1b[37m"  # White
+RESET = "\x1b[0m"
 
-def print_project_structure(
+
+class TreeEntry(NamedTuple):
+    """
+    An entry found while walking a project directory.
+    Attributes:
+        name (str): The name of the file or directory.
+        path (str): The full path of the file or directory.
+        depth (int): The depth below the root directory, starting at 0.
+        is_dir (bool): Whether the entry is a directory.
+        is_last (bool): Whether the entry is the last one in its directory.
+        prefix (str): The indentation of the entry in the tree.
+        error (str): Set instead of the other fields if a directory couldn't be read.
+        omitted (dict): Set instead of the other fields for a summary of the entries
+            left out of a directory, see `summarize`, or of the whole walk once
+            it reaches its entry budget, as {"max_entries": budget}.
+    """
+
+    name: str
+    path: str
+    depth: int
+    is_dir: bool
+    is_last: bool
+    prefix: str
+    error: str = None
+    omitted: dict = None
+
+    def as_dict(self, root_dir: str) -> dict:
+        """Converts the entry into a record, with its path relative to the root directory."""
+        if self.error:
+            return {"path": os.path.relpath(self.path, root_dir), "error": self.error}
+        if self.omitted:
+            return {
+                "path": os.path.relpath(self.path, root_dir),
+                "omitted": self.omitted,
+            }
+        return {
+            "path": os.path.relpath(self.path, root_dir),
+            "name": self.name,
+            "type": "directory" if self.is_dir else "file",
+            "depth": self.depth,
+        }
+
+
+class _Frame(NamedTuple):
+    """A directory being walked by `walk_project_structure`."""
+
+    entries: (
+        Iterator  # The remaining (index, (entry, is_dir)) pairs, see `_DirectoryReader`
+    )
+    count: int
+    prefix: str
+    depth: int
+    relpath: str
+    ignore: IgnoreMatcher
+    inode: int
+    path: str
+
+
+def _is_dir(entry: os.DirEntry) -> bool:
+    """Checks if an entry is a directory, following symlinks like `os.path.isdir`."""
+    try:
+        return entry.is_dir()
+    except OSError:
+        return False
+
+
+def _scan_directory(
+    path: str, relpath: str, ignore: IgnoreMatcher = None, snapshot: TreeSnapshot = None
+) -> tuple[list[tuple[os.DirEntry, bool]], IgnoreMatcher]:
+    """
+    Lists a directory's entries that aren't ignored, sorted by name.
+
+    Args:
+        path (str): The directory.
+        relpath (str): The directory relative to the root, using `/` and ending
+            with one, or "" for the root.
+        ignore (IgnoreMatcher, optional): The matcher of the parent directory.
+        snapshot (TreeSnapshot, optional): Listings to reuse if they're unchanged.
+    Returns:
+        tuple: (entry, is directory) pairs, and the matcher of the directory,
+            which includes its own .gitignore.
+    """
+    if snapshot:
+        entries = snapshot.listdir(path, relpath)
+    else:
+        with os.scandir(path) as entries:
+            entries = list(entries)
+    if ignore:
+        ignore = ignore.for_directory(path, relpath, {entry.name for entry in entries})
+
+    items = []
+    for entry in entries:
+        is_dir = _is_dir(entry)
+        if ignore and ignore.is_ignored(relpath + entry.name, entry.name, is_dir):
+            continue
+        items.append((entry, is_dir))
+    items.sort(key=lambda item: item[0].name)
+    return items, ignore
+
+
+def summarize(omitted: list[tuple[os.DirEntry, bool]]) -> dict:
+    """
+    Summarizes the entries left out of a directory.
+
+    Args:
+        omitted (list[tuple[os.DirEntry, bool]]): (entry, is directory) pairs.
+    Returns:
+        dict: The number of "files" and "directories", and the "size" of the
+            files in bytes.
+    """
+    files = size = 0
+    for entry, is_dir in omitted:
+        if is_dir:
+            continue
+        files += 1
+        try:
+            size += entry.stat(follow_symlinks=False).st_size
+        except OSError:
+            pass
+    return {"files": files, "directories": len(omitted) - files, "size": size}
+
+
+def format_size(size: int) -> str:
+    """Formats a size in bytes, e.g. 4100000000 -> "4.1 GB"."""
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1000:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1000
+    return f"{size:.1f} TB"
+
+
+def format_summary(omitted: dict) -> str:
+    """Describes a summary entry, e.g. "… 98,312 more files (4.1 GB)"."""
+    if "max_entries" in omitted:
+        return f"… stopped after {omitted['max_entries']:,} entries"
+
+    parts = []
+    if omitted["files"]:
+        noun = "file" if omitted["files"] == 1 else "files"
+        parts.append(
+            f"{omitted['files']:,} more {noun} ({format_size(omitted['size'])})"
+        )
+    if omitted["directories"]:
+        noun = "directory" if omitted["directories"] == 1 else "directories"
+        more = "" if parts else " more"
+        parts.append(f"{omitted['directories']:,}{more} {noun}")
+    return "… " + " and ".join(parts)
+
+
+class _DirectoryReader:
+    """
+    Lists directories for `walk_project_structure`, optionally reading ahead.\n
+    ---
+    With more than one job, listing a directory queues its subdirectories to be
+    listed on a thread pool, and they queue theirs in turn, so the listings
+    further down the tree are already being fetched while the walk prints the
+    ones before them. This overlaps the round-trips of slow filesystems like
+    network mounts. At most `READ_AHEAD_PER_JOB` listings per job are fetched
+    and not yet taken by the walk, so a huge tree can't fill memory with them,
+    and more are started as the walk takes them. The most recently queued
+    directories start first, like the walk reaches them.
+    Symlinked directories aren't read ahead, so a symlink loop can't make the
+    pool run away before the walk gets to check it.
+    With `max_per_dir`, a listing keeps its first `max_per_dir` entries and
+    ends with a (None, omitted entries) pair standing for the rest, whose
+    subdirectories are never listed.
+    """
+
+    def __init__(
+        self,
+        jobs: int = 1,
+        max_depth: int = 4,
+        max_per_dir: int = None,
+        snapshot: TreeSnapshot = None,
+    ):
+        self.max_depth = max_depth
+        self.max_per_dir = max_per_dir
+        self.snapshot = snapshot
+        self.limit = jobs * READ_AHEAD_PER_JOB
+        self.lock = threading.Lock()
+        self.queued = {}  # Not started yet, in the order they were queued
+        self.pending = {}  # Started and not taken by the walk yet
+        self.pool = None
+        if jobs > 1:
+            from concurrent.futures import ThreadPoolExecutor
+
+            self.pool = ThreadPoolExecutor(
+                max_workers=jobs, thread_name_prefix="rproj-tree"
+            )
+
+    def _list(self, path: str, relpath: str, ignore: IgnoreMatcher, depth: int):
+        """Lists a directory whose entries are at `depth`, queueing its subdirectories."""
+        items, matcher = _scan_directory(path, relpath, ignore, self.snapshot)
+        if self.max_per_dir is not None and len(items) > self.max_per_dir:
+            items = items[: self.max_per_dir] + [(None, items[self.max_per_dir :])]
+        if self.pool and depth + 1 <= self.max_depth:
+            children = [
+                entry
+                for entry, is_dir in items
+                if entry is not None and is_dir and not entry.is_symlink()
+            ]
+            with self.lock:
+                # Reversed, so the first one is started first
+                for entry in reversed(children):
+                    child_relpath = f"{relpath}{entry.name}/"
+                    self.queued[entry.path] = (child_relpath, matcher, depth + 1)
+            self._start()
+        return items, matcher
+
+    def _start(self):
+        """Starts listing queued directories while fewer than `limit` are pending."""
+        with self.lock:
+            while self.queued and len(self.pending) < self.limit:
+                path, args = self.queued.popitem()
+                try:
+                    self.pending[path] = self.pool.submit(self._list, path, *args)
+                except RuntimeError:  # The walk has finished
+                    self.queued.clear()
+                    return
+
+    def scan(self, path: str, relpath: str, ignore: IgnoreMatcher, depth: int):
+        """Returns the listing of a directory like `_scan_directory`, waiting if it's pending."""
+        with self.lock:
+            future = self.pending.pop(path, None)
+            self.queued.pop(path, None)
+        if future is None:
+            return self._list(path, relpath, ignore, depth)
+        self._start()
+        return future.result()
+
+    def close(self):
+        """
+        Stops reading ahead. With a snapshot, waits for the listings that already
+        started, which would otherwise still be adding to it while it's saved.
+        """
+        if self.pool:
+            self.pool.shutdown(wait=self.snapshot is not None, cancel_futures=True)
+
+
+def walk_project_structure(
     root_dir: str,
-    prefix: str = "",
     max_depth: int = 4,
+    ignore: IgnoreMatcher = None,
+    prefix: str = "",
     current_depth: int = 0,
-    ignore: list = None,
-    use_regex: bool = False,
-) -> None:
+    jobs: int = 1,
+    max_entries: int = None,
+    max_per_dir: int = None,
+    snapshot: TreeSnapshot = None,
+) -> Iterator[TreeEntry]:
     """
-    Prints the directory structure of a given directory in a tree format.
-
+    Yields the entries of a directory in tree order.\n
+    ---
+    The walk uses an explicit stack instead of recursion, so deeply nested trees
+    don't hit the recursion limit, and reads each directory with `os.scandir`,
+    whose entries already know whether they are directories. Only symlinked
+    directories are stat-ed, to stop at links that point back to a directory
+    that is already being walked. Ignored directories are never listed. With
+    more than one job, directories are listed ahead of the walk on a thread pool,
+    without changing the order of the entries.
+    Directories with more than `max_per_dir` entries end with a summary entry
+    for the rest, and the walk stops with a summary entry once it has yielded
+    `max_entries` entries. Neither lists anything it won't yield. With a
+    snapshot, directories that haven't changed since it was taken aren't listed
+    again.
     Args:
         root_dir (str): The root directory.
+        max_depth (int): The maximum depth to walk.
+        ignore (IgnoreMatcher, optional): Decides which entries are left out,
+            reading the .gitignore files found along the way.
         prefix (str): The prefix used for indentation.
-        max_depth (int): The maximum depth to print.
-        current_depth (int): The current depth in the recursion.
-        ignore (list): List of directories or files to ignore.
+        current_depth (int): The depth of the root directory.
+        jobs (int): The number of directories listed at the same time. Defaults to 1.
+        max_entries (int, optional): The maximum number of entries to yield.
+        max_per_dir (int, optional): The maximum number of entries to yield
+            from each directory.
+        snapshot (TreeSnapshot, optional): Listings to reuse if they're unchanged,
+            which is updated with the new ones.
     """
 
     if current_depth > max_depth:
         return
 
+    reader = _DirectoryReader(jobs, max_depth, max_per_dir, snapshot)
+    try:
+        walk = _walk(root_dir, max_depth, ignore, prefix, current_depth, reader)
+        if max_entries is None:
+            yield from walk
+            return
+
+        count = 0
+        for entry in walk:
+            if not (entry.error or entry.omitted):
+                if count == max_entries:
+                    omitted = {"max_entries": max_entries}
+                    yield TreeEntry(
+                        "", root_dir, current_depth, False, True, prefix, None, omitted
+                    )
+                    return
+                count += 1
+            yield entry
+    finally:
+        reader.close()
+
+
+def _walk(
+    root_dir: str,
+    max_depth: int,
+    ignore: IgnoreMatcher,
+    prefix: str,
+    current_depth: int,
+    reader: _DirectoryReader,
+) -> Iterator[TreeEntry]:
+    """Walks a directory for `walk_project_structure`, listing directories with the reader."""
     try:
-        items = []
-        for item in os.listdir(root_dir):
-            if ignore:
-                if use_regex:
-                    if any(re.search(pattern, item) for pattern in ignore):
-                        continue
-                else:
-                    if item in ignore:
-                        continue
-            items.append(item)
-        items.sort()
-    except PermissionError:
-        print(f"{prefix}Permission denied: {root_dir}")
+        items, matcher = reader.scan(root_dir, "", ignore, current_depth)
+        root_inode = os.stat(root_dir).st_ino
+    except OSError as error:
+        yield TreeEntry("", root_dir, current_depth, True, True, prefix, error.strerror)
         return
 
-    for index, item in enumerate(items):
-        item_path = os.path.join(root_dir, item)
-        is_dir = os.path.isdir(item_path)
-        is_last = index == len(items) - 1
-        connector = "└── " if is_last else "├── "
-
-        if item.endswith(".py"):
-            color = "green"
-        elif item.endswith(".txt"):
-            color = "blue"
-        elif item.endswith(".md"):
-            color = "yellow"
-        elif item.endswith(".json"):
-            color = "cyan"
-        elif item.endswith(".csv"):
-            color = "magenta"
-        elif item.endswith(".yaml") or item.endswith(".yml"):
-            color = "red"
-        elif is_dir:
-            color = "bright_black"
-        else:
-            color = "white"
+    stack = [
+        _Frame(
+            enumerate(items),
+            len(items),
+            prefix,
+            current_depth,
+            "",
+            matcher,
+            root_inode,
+            root_dir,
+        )
+    ]
+    while stack:
+        frame = stack[-1]
+        index, item = next(frame.entries, (None, None))
+        if item is None:
+            stack.pop()
+            continue
 
-        print(f"{prefix}{connector}[{color}]{item}[/]")
+        entry, is_dir = item
+        prefix, depth = frame.prefix, frame.depth
+        if entry is None:  # The rest of the directory, see `_DirectoryReader`
+            omitted = summarize(is_dir)
+            yield TreeEntry("", frame.path, depth, False, True, prefix, None, omitted)
+            continue
 
-        if is_dir:
-            new_prefix = prefix + ("    " if is_last else "│   ")
-            print_project_structure(
-                item_path, new_prefix, max_depth, current_depth + 1, ignore, use_regex
+        is_last = index == frame.count - 1
+        yield TreeEntry(entry.name, entry.path, depth, is_dir, is_last, prefix)
+
+        if not is_dir or depth + 1 > max_depth:
+            continue
+
+        new_prefix = prefix + ("    " if is_last else "│   ")
+        try:
+            if entry.is_symlink():
+                inode = os.stat(entry.path).st_ino
+                if any(
+                    inode == parent.inode and os.path.samefile(entry.path, parent.path)
+                    for parent in stack
+                ):
+                    yield TreeEntry(
+                        "",
+                        entry.path,
+                        depth + 1,
+                        True,
+                        True,
+                        new_prefix,
+                        "Symlink loop",
+                    )
+                    continue
+            else:
+                inode = entry.inode()
+            relpath = f"{frame.relpath}{entry.name}/"
+            children, matcher = reader.scan(
+                entry.path, relpath, frame.ignore, depth + 1
+            )
+        except OSError as error:
+            yield TreeEntry(
+                "", entry.path, depth + 1, True, True, new_prefix, error.strerror
+            )
+            continue
+
+        stack.append(
+            _Frame(
+                enumerate(children),
+                len(children),
+                new_prefix,
+                depth + 1,
+                relpath,
+                matcher,
+                inode,
+                entry.path,
             )
+        )
+
+
+class _Buffer:
+    """Collects output and writes it to a file in large chunks."""
+
+    def __init__(self, file, size: int = RENDER_BUFFER_SIZE):
+        self.file = file
+        self.size = size
+        self.parts = []
+        self.length = 0
+
+    def write(self, text: str):
+        self.parts.append(text)
+        self.length += len(text)
+        if self.length >= self.size:
+            self.flush()
+
+    def flush(self):
+        if self.parts:
+            self.file.write("".join(self.parts))
+            self.parts.clear()
+            self.length = 0
+
+
+def entry_style(entry: TreeEntry) -> str:
+    """Returns the ANSI escape code that colors an entry in the tree."""
+    style = EXTENSION_STYLES.get(os.path.splitext(entry.name)[1])
+    return style or (DIRECTORY_STYLE if entry.is_dir else FILE_STYLE)
+
+
+def render_text(entries: Iterator[TreeEntry], out: _Buffer, color: bool) -> None:
+    """Writes the entries as a text tree, colored by `entry_style` if `color` is set."""
+    for entry in entries:
+        if entry.error:
+            out.write(f"{entry.prefix}{entry.error}: {entry.path}\n")
+            continue
+        if entry.omitted:
+            summary = format_summary(entry.omitted)
+            if color:
+                summary = f"{DIRECTORY_STYLE}{summary}{RESET}"
+            out.write(f"{entry.prefix}└── {summary}\n")
+            continue
+
+        connector = "└── " if entry.is_last else "├── "
+        if color:
+            out.write(
+                f"{entry.prefix}{connector}{entry_style(entry)}{entry.name}{RESET}\n"
+            )
+        else:
+            out.write(f"{entry.prefix}{connector}{entry.name}\n")
+
+
+def render_json(entries: Iterator[TreeEntry], out: _Buffer, root_dir: str) -> None:
+    """
+    Writes the entries as one nested JSON object.\n
+    ---
+    Each directory record gets a "children" list, which is written as the walk
+    goes, so the tree is streamed rather than built in memory first.
+    Args:
+        entries (Iterator[TreeEntry]): The entries, in tree order.
+        out (_Buffer): The buffer to write to.
+        root_dir (str): The root directory.
+    """
+    import json
+
+    root = {"path": ".", "name": os.path.basename(os.path.abspath(root_dir))}
+    out.write(json.dumps({**root, "type": "directory"})[:-1] + ', "children": [')
+    # Whether each open "children" list has items yet, from the root down
+    open_lists = [False]
+    base_depth = None
+    for entry in entries:
+        if base_depth is None:
+            base_depth = entry.depth
+        while len(open_lists) > entry.depth - base_depth + 1:
+            out.write("]}")
+            open_lists.pop()
+        if open_lists[-1]:
+            out.write(", ")
+        open_lists[-1] = True
+
+        record = json.dumps(entry.as_dict(root_dir))
+        if entry.is_dir and not entry.error:
+            out.write(record[:-1] + ', "children": [')
+            open_lists.append(False)
+        else:
+            out.write(record)
+    out.write("]}" * len(open_lists) + "\n")
+
+
+def print_project_structure(
+    root_dir: str,
+    prefix: str = "",
+    max_depth: int = 4,
+    current_depth: int = 0,
+    ignore: IgnoreMatcher = None,
+    jobs: int = 1,
+    max_entries: int = None,
+    max_per_dir: int = None,
+    snapshot: TreeSnapshot = None,
+) -> None:
+    """
+    Prints the directory structure of a given directory in a tree format.\n
+    ---
+    Lines are written in large chunks. They are colored with ANSI codes picked
+    from EXTENSION_STYLES when stdout is a terminal, and plain otherwise. With
+    the "json" output format the tree is printed as one nested object, and with
+    "ndjson" as one record per entry.
+    Args:
+        root_dir (str): The root directory.
+        prefix (str): The prefix used for indentation.
+        max_depth (int): The maximum depth to print.
+        current_depth (int): The depth of the root directory.
+        ignore (IgnoreMatcher, optional): Decides which entries are left out.
+        jobs (int): The number of directories listed at the same time. Defaults to 1.
+        max_entries (int, optional): The maximum number of entries to print.
+        max_per_dir (int, optional): The maximum number of entries to print
+            from each directory, the rest are summarized.
+        snapshot (TreeSnapshot, optional): Listings to reuse if they're unchanged.
+    """
+    entries = walk_project_structure(
+        root_dir,
+        max_depth,
+        ignore,
+        prefix,
+        current_depth,
+        jobs,
+        max_entries,
+        max_per_dir,
+        snapshot,
+    )
+    output_format = get_output_format()
+    if output_format == "ndjson":
+        print_records(entry.as_dict(root_dir) for entry in entries)
+        return
+
+    out = _Buffer(sys.stdout)
+    try:
+        if output_format == "json":
+            render_json(entries, out, root_dir)
+        else:
+            color = is_terminal() and "NO_COLOR" not in os.environ
+            render_text(entries, out, color)
+    finally:
+        out.flush()
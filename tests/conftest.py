@@ -0,0 +1,49 @@
+import os
+import shutil
+import tempfile
+import pytest
+
+# rproj finds its data directory when it's imported, so every test shares one,
+# emptied before each test
+DATA_DIR = tempfile.mkdtemp(prefix="rproj-tests-")
+os.environ["RPROJ_DATA_DIR"] = DATA_DIR
+os.environ["RPROJ_USE_DAEMON"] = "false"
+
+
+@pytest.fixture(autouse=True)
+def data_dir():
+    """Empties the data directory and forgets everything rproj keeps in memory."""
+    from rproj.utils import catalog, console, stats
+
+    for name in os.listdir(DATA_DIR):
+        path = os.path.join(DATA_DIR, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+    with open(os.path.join(DATA_DIR, "projects.json"), "w") as file:
+        file.write("[]")
+    catalog.set_resident(False)
+    catalog.invalidate()
+    stats.clear_stats_cache()
+    yield DATA_DIR
+    console.set_output_format(None)
+
+
+@pytest.fixture
+def make_project(tmp_path):
+    """Creates and registers a project in a new directory below `tmp_path`."""
+    from rproj.utils.file import RProjFile
+
+    def make(name: str, **fields) -> RProjFile:
+        directory = tmp_path / name
+        directory.mkdir()
+        project = RProjFile(name, str(directory), **fields)
+        project.create()
+        return project
+
+    return make
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(DATA_DIR, ignore_errors=True)
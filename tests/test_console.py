@@ -0,0 +1,41 @@
+import io
+import pytest
+from rich.console import Console
+from rproj.main import run
+from rproj.utils.console import escape, strip_markup
+
+TEXTS = [
+    "see [docs]",
+    "[wip] [/] [bold red]",
+    "pages/[id].tsx",
+    "C:\\projects\\",
+    "a \\[b] c",
+    "plain text",
+]
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_escaped_text_is_printed_as_is(text):
+    assert strip_markup(f"[bright_blue]{escape(text)}[/]") == text
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_plain_output_matches_rich(text):
+    markup = f"[dim]{escape(text)}[/] [bright_blue]name[/]"
+    out = io.StringIO()
+    Console(file=out, no_color=True, highlight=False, width=200).print(markup)
+
+    assert strip_markup(markup) == out.getvalue().rstrip("\n")
+
+
+def test_user_fields_keep_their_brackets(make_project, capsys):
+    make_project("api", description="see [docs]", tags=["[wip]"])
+    run(["note", "api", "--add", "[todo]", "later"])
+    capsys.readouterr()
+
+    run(["search", "api"])
+
+    out = capsys.readouterr().out
+    assert "see [docs]" in out
+    assert "[wip]" in out
+    assert "[todo] later" in out
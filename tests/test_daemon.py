@@ -0,0 +1,116 @@
+import os
+import sys
+import time
+import socket
+import subprocess
+import toml
+import pytest
+from rproj.main import run
+from rproj.utils.daemon import POLL_INTERVAL, daemon_status, forward
+
+pytestmark = pytest.mark.skipif(
+    not hasattr(socket, "AF_UNIX"), reason="The daemon needs Unix domain sockets"
+)
+
+SRC_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"
+)
+COMMANDS = [
+    ["dir", "backend-api"],
+    ["dir", "ba"],
+    ["list"],
+    ["list", "--tags", "be"],
+    ["list", "--json"],
+    ["search", "service"],
+    ["search", "nothing-like-it"],
+    ["info", "web"],
+]
+
+
+@pytest.fixture
+def projects(make_project):
+    return [
+        make_project("backend-api", description="A service", tags=["be"]),
+        make_project("web", description="The site", tags=["fe"]),
+    ]
+
+
+@pytest.fixture
+def socket_path(data_dir, projects, monkeypatch):
+    """Runs `rproj daemon` on a socket in the data directory during the test."""
+    path = os.path.join(data_dir, "daemon.sock")
+    daemon = subprocess.Popen(
+        [sys.executable, "-m", "rproj.main", "daemon"],
+        env=dict(os.environ, PYTHONPATH=SRC_DIR),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while not daemon_status(path):
+        assert daemon.poll() is None, "The daemon exited"
+        assert time.monotonic() < deadline, "The daemon didn't start"
+        time.sleep(0.05)
+    monkeypatch.setenv("RPROJ_USE_DAEMON", "true")
+    yield path
+
+    daemon.terminate()
+    assert daemon.wait(timeout=10) == 0
+    assert not os.path.exists(path)
+
+
+def forwarded(argv: list[str], socket_path: str, capsys) -> tuple[str, str]:
+    """Runs a command in the daemon, returning its stdout and stderr."""
+    capsys.readouterr()
+    assert forward(argv, socket_path) is not None
+    return capsys.readouterr()
+
+
+def in_process(argv: list[str], capsys) -> tuple[str, str]:
+    """Runs a command in this process, returning its stdout and stderr."""
+    capsys.readouterr()
+    run(argv)
+    return capsys.readouterr()
+
+
+@pytest.mark.parametrize("argv", COMMANDS, ids=" ".join)
+def test_forwarded_output_matches_in_process(argv, socket_path, capsys):
+    assert forwarded(argv, socket_path, capsys) == in_process(argv, capsys)
+
+
+def test_runs_in_process_without_a_daemon(data_dir, projects, monkeypatch):
+    monkeypatch.setenv("RPROJ_USE_DAEMON", "true")
+
+    assert forward(["list"], os.path.join(data_dir, "daemon.sock")) is None
+
+
+def test_runs_in_process_with_other_settings(socket_path, monkeypatch):
+    monkeypatch.setenv("RPROJ_WORKERS", "3")
+
+    assert forward(["list"], socket_path) is None
+
+
+def test_changes_run_in_process(socket_path):
+    assert forward(["tag", "web", "--add", "x"], socket_path) is None
+
+
+def test_sees_registry_writes(socket_path, make_project, capsys):
+    project = make_project("worker")
+
+    assert forwarded(["dir", "worker"], socket_path, capsys).out.strip() == (
+        project.directory
+    )
+
+
+def test_sees_hand_edits_while_busy(socket_path, projects, capsys):
+    with open(projects[1].path, "r") as file:
+        data = toml.load(file)
+    data["info"]["tags"].append("edited")
+    with open(projects[1].path, "w") as file:
+        toml.dump(data, file)
+
+    # Requests keep coming faster than the idle check, so only the check
+    # before each command can see the edit
+    deadline = time.monotonic() + 3 * POLL_INTERVAL
+    while "web" not in forwarded(["list", "--tags", "edited"], socket_path, capsys).out:
+        assert time.monotonic() < deadline, "The hand edit was never seen"
+        time.sleep(0.05)
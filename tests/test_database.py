@@ -0,0 +1,95 @@
+import os
+import pytest
+from rproj.main import run
+from rproj.utils.database import Database
+from rproj.utils.file import RProjFile
+
+
+@pytest.fixture
+def sqlite(monkeypatch):
+    """Switches to the sqlite backend, counting how often the schema is set up."""
+    monkeypatch.setenv("RPROJ_BACKEND", "sqlite")
+    opened = []
+    init = Database.__init__
+
+    def counting_init(self, *args, **kwargs):
+        opened.append(self)
+        init(self, *args, **kwargs)
+
+    monkeypatch.setattr(Database, "__init__", counting_init)
+    return opened
+
+
+@pytest.mark.parametrize(
+    "argv",
+    [
+        ["dir", "api"],
+        ["search", "api"],
+        ["list", "--tags", "backend"],
+        ["tag", "api", "--add", "new"],
+        ["update", "api", "--description", "changed"],
+    ],
+    ids=" ".join,
+)
+def test_command_opens_the_database_once(argv, sqlite, make_project, capsys):
+    make_project("api", tags=["backend"])
+    make_project("web")
+    sqlite.clear()
+
+    run(argv)
+
+    assert "ERR" not in capsys.readouterr().err
+    assert len(sqlite) <= 1
+
+
+def test_writes_are_seen_by_the_cached_connection(sqlite, make_project, capsys):
+    make_project("api")
+    run(["tag", "api", "--add", "new"])
+    capsys.readouterr()
+
+    run(["list", "--tags", "new"])
+
+    assert "api" in capsys.readouterr().out
+
+
+def test_projects_added_with_sqlite_are_kept_with_json(
+    sqlite, make_project, monkeypatch, capsys
+):
+    make_project("api")
+    monkeypatch.setenv("RPROJ_BACKEND", "json")
+    capsys.readouterr()
+
+    run(["list"])
+
+    assert "api" in capsys.readouterr().out
+
+
+def test_registry_changes_with_json_are_seen_with_sqlite(
+    sqlite, make_project, monkeypatch, capsys
+):
+    make_project("api")
+    monkeypatch.setenv("RPROJ_BACKEND", "json")
+    make_project("web")
+    run(["delete", "api"])
+    monkeypatch.setenv("RPROJ_BACKEND", "sqlite")
+    capsys.readouterr()
+
+    run(["list"])
+
+    out = capsys.readouterr().out
+    assert "web" in out
+    assert "api" not in out
+
+
+@pytest.mark.parametrize("count", [1, 501], ids=["few", "many"])
+def test_tags_keep_their_order(count, sqlite, tmp_path):
+    database = Database.open()
+    stat = os.stat(tmp_path)
+    for i in range(count):
+        project = RProjFile(f"p{i}", str(tmp_path), tags=["zeta", "alpha", "mid"])
+        database.put(project, stat, path=str(tmp_path / f"p{i}.rproj"))
+
+    projects = database.projects
+
+    assert len(projects) == count
+    assert all(project.tags == ["zeta", "alpha", "mid"] for project in projects)
@@ -0,0 +1,27 @@
+import os
+import threading
+from rproj.utils.fs import write_atomic
+
+
+def test_threads_write_the_same_file(tmp_path):
+    path = str(tmp_path / "shared.json")
+    texts = [f"{i}" * 10_000 for i in range(8)]
+    errors = []
+
+    def write(text: str):
+        try:
+            for _ in range(20):
+                write_atomic(path, text, durable=False)
+        except OSError as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=write, args=(text,)) for text in texts]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    with open(path, "r") as file:
+        assert file.read() in texts
+    assert os.listdir(tmp_path) == ["shared.json"]
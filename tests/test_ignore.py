@@ -0,0 +1,95 @@
+import re
+import pytest
+from rproj.utils.ignore import IgnoreMatcher, compile_rule
+
+
+def matcher(*lines: str, base: str = "") -> IgnoreMatcher:
+    rules = [compile_rule(line, base) for line in lines]
+    return IgnoreMatcher(tuple(rule for rule in rules if rule))
+
+
+@pytest.mark.parametrize(
+    "lines, relpath, is_dir, ignored",
+    [
+        # Unanchored patterns match at any depth
+        (["*.log"], "debug.log", False, True),
+        (["*.log"], "src/debug.log", False, True),
+        (["*.log"], "debug.log.txt", False, False),
+        (["build"], "build", True, True),
+        (["build"], "src/build", False, True),
+        # A `/` anchors the pattern to the directory of the .gitignore
+        (["/build"], "build", True, True),
+        (["/build"], "src/build", True, False),
+        (["src/*.py"], "src/main.py", False, True),
+        (["src/*.py"], "lib/src/main.py", False, False),
+        # A trailing `/` only matches directories
+        (["dist/"], "dist", True, True),
+        (["dist/"], "dist", False, False),
+        # `*` and `?` stop at `/`, `**` doesn't
+        (["src/*"], "src/a/b", False, False),
+        (["a?c"], "abc", False, True),
+        (["a?c"], "a/c", False, False),
+        (["**/cache"], "cache", True, True),
+        (["**/cache"], "a/b/cache", True, True),
+        (["logs/**"], "logs/a/b.txt", False, True),
+        (["logs/**"], "logs", True, False),
+        (["a/**/b"], "a/b", False, True),
+        (["a/**/b"], "a/x/y/b", False, True),
+        # Character classes, negated with `!`
+        (["file[0-9]"], "file7", False, True),
+        (["file[!a]"], "fileb", False, True),
+        (["file[!a]"], "filea", False, False),
+        (["[]]x"], "]x", False, True),
+        # The last matching rule wins, so `!` can re-include
+        (["*.log", "!keep.log"], "keep.log", False, False),
+        (["*.log", "!keep.log"], "other.log", False, True),
+        (["!keep.log", "*.log"], "keep.log", False, True),
+        # Comments, blank lines and escapes
+        (["# comment"], "# comment", False, False),
+        (["\\#hash"], "#hash", False, True),
+        (["\\!bang"], "!bang", False, True),
+        (["a\\*"], "a*", False, True),
+        (["a\\*"], "ab", False, False),
+        (["trailing   "], "trailing", False, True),
+        (["space\\ "], "space ", False, True),
+        ([""], "", False, False),
+    ],
+)
+def test_is_ignored(lines, relpath, is_dir, ignored):
+    name = relpath.rsplit("/", 1)[-1]
+
+    assert matcher(*lines).is_ignored(relpath, name, is_dir) is ignored
+
+
+def test_rules_are_relative_to_their_gitignore():
+    nested = matcher("/out", "*.tmp", base="pkg/")
+
+    assert nested.is_ignored("pkg/out", "out", True)
+    assert not nested.is_ignored("out", "out", True)
+    assert nested.is_ignored("pkg/a/b.tmp", "b.tmp", False)
+    assert not nested.is_ignored("b.tmp", "b.tmp", False)
+
+
+def test_compile_rule_skips_blank_lines_and_comments():
+    assert compile_rule("\n") is None
+    assert compile_rule("# comment\n") is None
+    assert compile_rule("/") is None
+    pattern, negated, dir_only = compile_rule("!dist/\n")
+    assert (negated, dir_only) == (True, True)
+    assert re.fullmatch(pattern, "a/dist")
+
+
+def test_overrides_win_over_gitignore_rules(tmp_path):
+    (tmp_path / ".gitignore").write_text("!*.log\n")
+    root = IgnoreMatcher.for_project(["*.log"])
+    project = root.for_directory(str(tmp_path), "", [".gitignore"])
+
+    assert project.is_ignored("a.log", "a.log", False)
+    assert project.is_ignored(".git", ".git", True)
+
+
+def test_regex_overrides_search_names():
+    root = IgnoreMatcher.for_project([r"\.txt$"], use_regex=True)
+
+    assert root.is_ignored("docs/a.txt", "a.txt", False)
+    assert not root.is_ignored("docs/a.md", "a.md", False)
@@ -0,0 +1,88 @@
+import os
+from collections import Counter
+import pytest
+from rproj.main import run
+from rproj.utils.file import RProjFile
+
+COMMANDS = [
+    ["dir", "backend-api"],
+    ["dir", "ba"],
+    ["run", "backend-api"],
+    ["search", "backend-api"],
+    ["search", "--text", "service"],
+    ["update", "backend-api", "--description", "new description"],
+    ["tag", "backend-api", "--add", "a", "b"],
+    ["list", "--tags", "api"],
+]
+
+
+@pytest.fixture
+def parses(monkeypatch):
+    """Counts how often each project file is parsed."""
+    counts = Counter()
+    load = RProjFile.load
+
+    def counting_load(path: str) -> RProjFile:
+        counts[os.path.abspath(path)] += 1
+        return load(path)
+
+    monkeypatch.setattr(RProjFile, "load", staticmethod(counting_load))
+    monkeypatch.setattr(
+        "rproj.utils.launching.launch_terminal", lambda *args, **kwargs: None
+    )
+    return counts
+
+
+@pytest.fixture
+def projects(make_project):
+    return [
+        make_project(
+            "backend-api", description="A service", tags=["api"], run_cmd="true"
+        ),
+        make_project("web", description="The site", tags=["frontend"]),
+        make_project("worker", description="Another service"),
+    ]
+
+
+@pytest.mark.parametrize("argv", COMMANDS, ids=" ".join)
+def test_command_parses_each_file_at_most_once(argv, projects, parses, capsys):
+    run(argv)
+
+    assert "ERR" not in capsys.readouterr().err
+    assert all(count <= 1 for count in parses.values()), parses
+
+
+@pytest.mark.parametrize("argv", COMMANDS, ids=" ".join)
+def test_command_parses_a_hand_edited_file_once(argv, projects, parses, capsys):
+    project = projects[0]
+    with open(project.path, "a") as file:
+        file.write("\n# Edited by hand\n")
+    os.utime(project.path, ns=(0, 0))  # Some filesystems keep the mtime within a tick
+
+    run(argv)
+
+    assert "ERR" not in capsys.readouterr().err
+    assert all(count <= 1 for count in parses.values()), parses
+
+
+@pytest.mark.parametrize("command", ["delete", "update", "tag", "note"])
+def test_changes_need_the_exact_name(command, projects, capsys):
+    args = {
+        "delete": [],
+        "update": ["--description", "changed"],
+        "tag": ["--add", "changed"],
+        "note": ["--add", "changed"],
+    }[command]
+
+    run([command, "ba", *args])
+
+    assert "did you mean backend-api?" in capsys.readouterr().err
+    project = RProjFile.load(projects[0].path)
+    assert project.description == "A service"
+    assert "changed" not in project.tags and not project.notes
+
+
+def test_prefix_still_opens_projects(projects, capsys):
+    run(["dir", "ba"])
+
+    assert capsys.readouterr().out.strip() == projects[0].directory
@@ -0,0 +1,90 @@
+import os
+import sys
+import json
+import subprocess
+import threading
+import pytest
+from rproj.utils.catalog import Catalog
+from rproj.utils.file import RProjFile
+from rproj.utils.projects import PROJECT_DATA_PATH
+
+# Run by each process of `test_concurrent_registrations_are_kept`
+REGISTRY_WORKER = """
+import os, sys
+from rproj.utils.file import RProjFile
+from rproj.utils.info import search_project
+
+root, worker, count = sys.argv[1], int(sys.argv[2]), int(sys.argv[3])
+shared = search_project("shared", exact=True)
+for i in range(count):
+    name = f"worker-{worker}-{i}"
+    directory = os.path.join(root, name)
+    os.makedirs(directory)
+    RProjFile(name, directory).create()
+    with shared.transaction():
+        shared.add_tag(name)
+"""
+
+
+@pytest.fixture
+def shared(make_project):
+    return make_project("shared")
+
+
+def test_concurrent_registrations_are_kept(shared, tmp_path, data_dir):
+    """
+    Registers projects from many processes at once, tagging a shared project
+    once per registration, so the registry, the catalog and the project file
+    all see concurrent read-modify-write cycles.
+    """
+    processes, count = 16, 10
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(
+        os.environ,
+        PYTHONPATH=os.path.join(package_root, "src"),
+        RPROJ_DATA_DIR=data_dir,
+        RPROJ_BACKEND="json",
+    )
+    workers = [
+        subprocess.Popen(
+            [sys.executable, "-c", REGISTRY_WORKER, str(tmp_path), str(i), str(count)],
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        for i in range(processes)
+    ]
+    for worker in workers:
+        _, stderr = worker.communicate()
+        assert worker.returncode == 0, stderr
+
+    with open(PROJECT_DATA_PATH, "r") as file:
+        project_paths = json.loads(file.read())
+    names = {
+        f"worker-{worker}-{i}" for worker in range(processes) for i in range(count)
+    }
+    assert len(project_paths) == len(set(project_paths)) == len(names) + 1
+    assert set(RProjFile.load(shared.path).tags) == names
+    assert Catalog.open().check(project_paths) == []
+
+
+def test_threads_take_turns_holding_a_lock(shared):
+    names = [f"thread-{i}" for i in range(16)]
+
+    def tag(name: str):
+        project = RProjFile.load(shared.path)
+        for i in range(5):
+            with project.transaction():
+                project.add_tag(f"{name}-{i}")
+
+    threads = [
+        threading.Thread(target=tag, args=(name,), daemon=True) for name in names
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=30)
+        assert not thread.is_alive(), "Deadlocked"
+
+    assert len(RProjFile.load(shared.path).tags) == len(names) * 5
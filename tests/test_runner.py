@@ -0,0 +1,91 @@
+import os
+import time
+import pytest
+from rproj.utils import runner
+from rproj.utils.file import RProjFile
+
+pytestmark = pytest.mark.skipif(os.name == "nt", reason="Checks POSIX process groups")
+
+TICK = "while true; do echo tick; sleep 0.05; done"
+
+
+class ClosedAfter:
+    """Stands in for a stdout whose reader goes away after a few lines, like `head`."""
+
+    def __init__(self, lines: int):
+        self.lines = lines
+
+    def write(self, text: str):
+        if not self.lines:
+            raise BrokenPipeError
+        self.lines -= 1
+
+    def flush(self):
+        pass
+
+
+@pytest.fixture
+def started(monkeypatch):
+    """Records the processes started by `run_projects`."""
+    processes = []
+    start = runner._start
+
+    def recording_start(project):
+        process = start(project)
+        processes.append(process)
+        return process
+
+    monkeypatch.setattr(runner, "_start", recording_start)
+    return processes
+
+
+def assert_stopped(processes):
+    for process in processes:
+        process.wait(timeout=10)
+    deadline = time.monotonic() + 5
+    for process in processes:
+        while True:
+            try:
+                os.killpg(process.pid, 0)
+            except ProcessLookupError:
+                break
+            assert time.monotonic() < deadline, "A process group is still running"
+            time.sleep(0.05)
+
+
+def make_projects(tmp_path, *run_cmds) -> list[RProjFile]:
+    projects = []
+    for i, run_cmd in enumerate(run_cmds):
+        directory = tmp_path / f"project-{i}"
+        directory.mkdir()
+        projects.append(RProjFile(f"project-{i}", str(directory), run_cmd=run_cmd))
+    return projects
+
+
+def test_closed_stdout_stops_every_project(tmp_path, started):
+    projects = make_projects(tmp_path, TICK, TICK, TICK)
+
+    with pytest.raises(BrokenPipeError):
+        runner.run_projects(projects, out=ClosedAfter(3))
+
+    assert len(started) == 3
+    assert_stopped(started)
+
+
+def test_projects_ignoring_sigterm_are_killed(tmp_path, started, monkeypatch):
+    monkeypatch.setattr(runner, "SHUTDOWN_GRACE", 0.5)
+    projects = make_projects(tmp_path, f"trap '' TERM; {TICK}")
+
+    with pytest.raises(BrokenPipeError):
+        runner.run_projects(projects, out=ClosedAfter(1))
+
+    assert_stopped(started)
+
+
+def test_records_the_exit_of_each_project(tmp_path):
+    projects = make_projects(tmp_path, "echo done", "exit 3")
+
+    records = runner.run_projects(projects, jobs=1, out=ClosedAfter(10))
+
+    assert [record["status"] for record in records] == ["ok", "failed"]
+    assert records[1]["code"] == 3
@@ -0,0 +1,51 @@
+import os
+import json
+import toml
+import pytest
+from rproj.main import run
+
+
+@pytest.fixture
+def projects(make_project):
+    projects = [
+        make_project("api", tags=["be"]),
+        make_project("web", tags=["fe"]),
+    ]
+    run(["list"])  # Catalog both
+    return projects
+
+
+def edit_tags(project, tags: list[str]):
+    """Changes the tags in a project file like a text editor would."""
+    with open(project.path, "r") as file:
+        data = toml.load(file)
+    data["info"]["tags"] = tags
+    with open(project.path, "w") as file:
+        toml.dump(data, file)
+    os.utime(project.path, ns=(0, 0))  # Some filesystems keep the mtime within a tick
+
+
+def listed(capsys, *tags: str) -> set[str]:
+    capsys.readouterr()
+    run(["list", "--json", "--tags", *tags])
+    return {
+        record["info"]["project_name"] for record in json.loads(capsys.readouterr().out)
+    }
+
+
+def test_hand_added_tag_is_found_at_once(projects, capsys):
+    edit_tags(projects[0], ["be", "fe"])
+
+    assert listed(capsys, "fe") == {"api", "web"}
+
+
+def test_hand_removed_tag_is_dropped_at_once(projects, capsys):
+    edit_tags(projects[1], [])
+
+    assert listed(capsys, "fe") == set()
+
+
+def test_query_is_checked_against_hand_edited_tags(projects, capsys):
+    edit_tags(projects[0], ["fe"])
+
+    assert listed(capsys, "fe & !be") == {"api", "web"}
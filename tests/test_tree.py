@@ -0,0 +1,64 @@
+import time
+import pytest
+from rproj.utils import tree
+from rproj.utils.snapshots import TreeSnapshot
+from rproj.utils.tree import walk_project_structure
+
+
+@pytest.fixture
+def wide_tree(tmp_path):
+    """A tree of 20 x 20 directories with a few files each."""
+    for i in range(20):
+        for j in range(20):
+            directory = tmp_path / f"dir-{i}" / f"dir-{j}"
+            directory.mkdir(parents=True)
+            for k in range(3):
+                (directory / f"file-{k}.txt").touch()
+    return tmp_path
+
+
+def test_reading_ahead_keeps_the_order(wide_tree):
+    walked = [entry.path for entry in walk_project_structure(str(wide_tree))]
+    read_ahead = [
+        entry.path for entry in walk_project_structure(str(wide_tree), jobs=4)
+    ]
+
+    assert read_ahead == walked
+
+
+def test_reading_ahead_is_bounded(wide_tree, monkeypatch):
+    most_pending = 0
+    scan = tree._DirectoryReader.scan
+
+    def counting_scan(reader, *args):
+        nonlocal most_pending
+        most_pending = max(most_pending, len(reader.pending))
+        return scan(reader, *args)
+
+    monkeypatch.setattr(tree._DirectoryReader, "scan", counting_scan)
+
+    for _ in walk_project_structure(str(wide_tree), jobs=2):
+        pass
+
+    assert 0 < most_pending <= 2 * tree.READ_AHEAD_PER_JOB
+
+
+def test_stopping_early_leaves_the_snapshot_alone(wide_tree, monkeypatch):
+    listdir = TreeSnapshot.listdir
+
+    def slow_listdir(snapshot, path: str, relpath: str):
+        time.sleep(0.02)  # Like a network mount
+        return listdir(snapshot, path, relpath)
+
+    monkeypatch.setattr(TreeSnapshot, "listdir", slow_listdir)
+    snapshot = TreeSnapshot.open(str(wide_tree))
+
+    for _ in walk_project_structure(
+        str(wide_tree), jobs=8, max_entries=50, snapshot=snapshot
+    ):
+        pass
+    listed = dict(snapshot.directories)
+    time.sleep(0.2)
+
+    assert snapshot.directories == listed
+    snapshot.save()